@@ -1,8 +1,14 @@
 import os
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
-from services.matcher import UniversityMatcher
+from services.batch import BATCH_MAX_PROFILES, stream_batch_results
+from services.matcher import (REQUIRED_PROFILE_FIELDS, UniversityMatcher, get_catalog, non_finite_fields,
+                              parse_ranking_options)
+from services.result_cache import rank_programs_cached
+from services.sessions import parse_profile_changes, ranking_sessions
+from services.whatif import parse_sweep_options, sweep_profile
+from services import encoding, metrics, profiling
 
 # Load environment variables from .env file
 load_dotenv()
@@ -13,11 +19,73 @@ app = Flask(__name__)
 cors_origins = os.getenv("CORS_ORIGINS", "http://localhost:8080,http://localhost:3000").split(",")
 CORS(app, origins=cors_origins)
 
+
+@app.before_request
+def start_request_timing():
+    g.timings, g.timings_token = metrics.begin_request()
+    if request.endpoint != "prometheus_metrics":
+        g.profile_sample = profiling.start(request.endpoint or "unknown")
+
+
+@app.after_request
+def finish_request_timing(response):
+    """
+    Record the request's metrics and expose its stage timings as Server-Timing.
+    For streamed responses this covers the time until the first byte.
+    """
+    timings = g.pop("timings", None)
+    if timings is not None:
+        response.headers["Server-Timing"] = timings.server_timing()
+        metrics.observe_request(request.endpoint or "unknown", response.status_code, timings.elapsed())
+    return response
+
+
+@app.teardown_request
+def end_request_timing(error=None):
+    token = g.pop("timings_token", None)
+    if token is not None:
+        metrics.end_request(token)
+    profiling.finish(g.pop("profile_sample", None))
+
+def encoded_response(payload, status=200):
+    """
+    JSON response encoded with the fast encoder and compressed when the
+    client's Accept-Encoding allows it.
+    """
+    body = encoding.dumps(payload)
+    with metrics.stage("compress"):
+        body, content_encoding = encoding.compress(body, request.headers.get("Accept-Encoding"))
+    response = Response(body, status=status, mimetype="application/json")
+    response.headers["Vary"] = "Accept-Encoding"
+    if content_encoding:
+        response.headers["Content-Encoding"] = content_encoding
+    return response
+
+
 @app.route("/")
 def home():
     return "<p>Hello from Flask via uv!</p>"
 
 
+def stream_rankings(student_profile, options):
+    """
+    NDJSON response for /api/recommend?format=ndjson. The catalog is scored
+    and ordered up front; rows are built and encoded while streaming.
+    """
+    with metrics.stage("catalog"):
+        catalog = get_catalog()
+    matcher = UniversityMatcher(student_profile, catalog=catalog)
+    total, normalization_factor, rows = matcher.iter_ranking(**options)
+    header = {
+        "success": True,
+        "total_programs": total,
+        "offset": options["offset"],
+        "limit": options["limit"],
+        "normalization_factor": normalization_factor,
+    }
+    return Response(stream_with_context(encoding.ndjson_lines(header, rows)), mimetype="application/x-ndjson")
+
+
 @app.route("/api/recommend", methods=["POST"])
 def recommend():
     """
@@ -30,33 +98,307 @@ def recommend():
         "wants_coop": bool,
         "extra_curriculars": [("name", level), ...],
         "major_interests": ["interest1", "interest2", ...],
-        "courses_taken": [("course_code", grade), ...]
+        "courses_taken": [("course_code", grade), ...],
+        "limit": int,        # optional, page size (default: all programs)
+        "offset": int,       # optional, rows to skip (default: 0)
+        "min_score": float,  # optional, drop programs scoring below this
+        "prefilter": {       # optional, only score programs that pass these
+            "reachable": bool,   # min average - 5 <= student's average
+            "interests": bool    # shares a tag with major_interests
+        },
+        "filters": {         # optional, only score programs that pass these
+            "universities": [str, ...],  # only these universities
+            "coop": bool,                # universities offering (non-)co-op study
+            "interests": [str, ...],     # tagged with at least one of these
+            "average_band": float,       # average range overlaps average +/- band
+            "min_score": float           # same as min_score
+        }
     }
+    
+    Prefiltered and filtered rankings are normalized over the programs that
+    pass (see services/filters.py).
+    
+    Query parameters:
+        format=rows      # default, one object per ranked program
+        format=columnar  # parallel arrays with names sent once (see services/encoding.py)
+        format=ndjson    # streamed, also selected by "Accept: application/x-ndjson"
+    
+    The ndjson format streams newline-delimited JSON: a header line
+    {"success": true, "total_programs": int, "offset": int, "limit": int,
+     "normalization_factor": float or null}
+    followed by one ranking row per line in rank order. Streamed rankings
+    are built as they are sent and bypass the result cache.
+    
+    Other responses are gzip/brotli compressed when Accept-Encoding allows it.
     """
     try:
-        # Get JSON payload
-        student_profile = request.get_json()
+        with metrics.stage("validate"):
+            # Get JSON payload
+            student_profile = request.get_json()
+            
+            # Validate required fields
+            missing_fields = [field for field in REQUIRED_PROFILE_FIELDS if field not in student_profile]
+            
+            if missing_fields:
+                return jsonify({
+                    "error": "Missing required fields",
+                    "missing": missing_fields
+                }), 400
+            
+            invalid_fields = non_finite_fields(student_profile)
+            if invalid_fields:
+                return jsonify({
+                    "error": "Non-finite numbers in profile",
+                    "invalid": invalid_fields
+                }), 400
+            
+            try:
+                options = parse_ranking_options(student_profile)
+            except ValueError as e:
+                return jsonify({
+                    "error": "Invalid ranking options",
+                    "message": str(e)
+                }), 400
+            
+            response_format = request.args.get("format")
+            if response_format is None:
+                wants_ndjson = request.accept_mimetypes.best_match(
+                    ["application/json", "application/x-ndjson"]) == "application/x-ndjson"
+                response_format = "ndjson" if wants_ndjson else "rows"
+            if response_format not in encoding.RESPONSE_FORMATS:
+                return jsonify({
+                    "error": "Invalid response format",
+                    "message": f"'format' must be one of {', '.join(encoding.RESPONSE_FORMATS)}"
+                }), 400
         
-        # Validate required fields
-        required_fields = ['grade_level', 'average', 'wants_coop', 'extra_curriculars', 
-                          'major_interests', 'courses_taken']
-        missing_fields = [field for field in required_fields if field not in student_profile]
+        if response_format == "ndjson":
+            return stream_rankings(student_profile, options)
         
-        if missing_fields:
+        # Get rankings (repeated profiles are served from the result cache)
+        rankings, total = rank_programs_cached(student_profile, options)
+        
+        with metrics.stage("serialize"):
+            if response_format == "columnar":
+                rankings = encoding.columnar_rankings(rankings)
+            return encoded_response({
+                "success": True,
+                "rankings": rankings,
+                "total_programs": total,
+                "offset": options["offset"],
+                "limit": options["limit"]
+            })
+        
+    except Exception as e:
+        return jsonify({
+            "error": "Internal server error",
+            "message": str(e)
+        }), 500
+
+
+@app.route("/api/recommend/batch", methods=["POST"])
+def recommend_batch():
+    """
+    POST endpoint to rank programs for a whole cohort of student profiles.
+    
+    Expected JSON payload:
+    {
+        "profiles": [{...student profile, same fields as /api/recommend...}, ...],
+        "limit": int,        # optional, applied to every profile
+        "offset": int,       # optional
+        "min_score": float,  # optional
+        "filters": {...}     # optional, see /api/recommend
+    }
+    
+    Streams newline-delimited JSON, one line per profile in input order:
+    {"index": int, "success": true, "rankings": [...], "total_programs": int}
+    or {"index": int, "error": "...", ...} for a profile that couldn't be scored.
+    """
+    try:
+        payload = request.get_json()
+        profiles = payload.get("profiles") if isinstance(payload, dict) else None
+        
+        if not isinstance(profiles, list):
+            return jsonify({
+                "error": "Invalid batch payload",
+                "message": "'profiles' must be a list of student profiles"
+            }), 400
+        
+        if len(profiles) > BATCH_MAX_PROFILES:
             return jsonify({
-                "error": "Missing required fields",
-                "missing": missing_fields
+                "error": "Batch too large",
+                "message": f"At most {BATCH_MAX_PROFILES} profiles per batch, got {len(profiles)}"
             }), 400
         
-        # Instantiate matcher and get rankings
-        matcher = UniversityMatcher(student_profile)
-        rankings = matcher.get_ranked_programs()
+        try:
+            options = parse_ranking_options(payload)
+        except ValueError as e:
+            return jsonify({
+                "error": "Invalid ranking options",
+                "message": str(e)
+            }), 400
+        
+        # Load (and compile) the catalog once for the whole batch
+        catalog = get_catalog()
+        
+        lines = (encoding.dumps(result) + b"\n" for result in stream_batch_results(profiles, options, catalog))
+        return Response(stream_with_context(lines), mimetype="application/x-ndjson")
+        
+    except Exception as e:
+        return jsonify({
+            "error": "Internal server error",
+            "message": str(e)
+        }), 500
+
+
+@app.route("/api/recommend/whatif", methods=["POST"])
+def recommend_whatif():
+    """
+    POST endpoint for what-if score curves: one profile re-scored across a
+    sweep of averages and/or grade levels in a single call.
+    
+    Expected JSON payload:
+    {
+        ...student profile, same fields as /api/recommend...,
+        "sweep": {
+            "average": {"start": 70, "stop": 100, "step": 0.5},  # or a list of averages
+            "grade_level": [11, 12]                              # optional
+        },
+        "limit": int         # optional, only the top programs for the profile as given
+    }
+    
+    Returns:
+    {
+        "success": true,
+        "points": [{"grade_level": int, "average": float}, ...],
+        "base": {"grade_level": int, "average": float},
+        "programs": [{"university", "program", "base_score", "base_rank",
+                      "scores": [...], "ranks": [...], "rank_changes": [...]}, ...],
+        "total_programs": int
+    }
+    scores/ranks/rank_changes are parallel to points; a positive rank change
+    means the program moves up compared with the profile as given.
+    """
+    try:
+        with metrics.stage("validate"):
+            payload = request.get_json()
+            if not isinstance(payload, dict):
+                return jsonify({
+                    "error": "Invalid what-if payload",
+                    "message": "Expected a JSON object"
+                }), 400
+            
+            missing_fields = [field for field in REQUIRED_PROFILE_FIELDS if field not in payload]
+            if missing_fields:
+                return jsonify({
+                    "error": "Missing required fields",
+                    "missing": missing_fields
+                }), 400
+            
+            invalid_fields = non_finite_fields(payload)
+            if invalid_fields:
+                return jsonify({
+                    "error": "Non-finite numbers in profile",
+                    "invalid": invalid_fields
+                }), 400
+            
+            try:
+                options = parse_sweep_options(payload)
+            except ValueError as e:
+                return jsonify({
+                    "error": "Invalid sweep",
+                    "message": str(e)
+                }), 400
+        
+        with metrics.stage("catalog"):
+            catalog = get_catalog()
+        with metrics.stage("score"):
+            result = sweep_profile(payload, options["averages"], options["grade_levels"],
+                                   limit=options["limit"], catalog=catalog)
+        
+        with metrics.stage("serialize"):
+            return encoded_response(dict(result, success=True))
         
+    except Exception as e:
         return jsonify({
-            "success": True,
-            "rankings": rankings,
-            "total_programs": len(rankings)
-        }), 200
+            "error": "Internal server error",
+            "message": str(e)
+        }), 500
+
+
+def session_response(session, options, status=200, recomputed=None):
+    """
+    Current ranking page of a re-ranking session.
+    """
+    rankings, total = session.rank(options["limit"], options["offset"], options["min_score"])
+    payload = {
+        "success": True,
+        "session_id": session.session_id,
+        "rankings": rankings,
+        "total_programs": total,
+        "offset": options["offset"],
+        "limit": options["limit"],
+        "expires_in": ranking_sessions.ttl,
+    }
+    if recomputed is not None:
+        payload["recomputed"] = recomputed
+    with metrics.stage("serialize"):
+        return encoded_response(payload, status=status)
+
+
+def parse_session_options(payload):
+    """
+    Paging options for a session request; prefilters and catalog filters
+    aren't supported because a session keeps components for the whole catalog.
+    """
+    options = parse_ranking_options(payload)
+    if options["prefilter"]:
+        raise ValueError("'prefilter' is not supported for sessions")
+    if options["filters"]:
+        raise ValueError("'filters' other than min_score are not supported for sessions")
+    return options
+
+
+@app.route("/api/sessions", methods=["POST"])
+def create_session():
+    """
+    POST endpoint to start a re-ranking session for a student profile.
+    
+    Takes the same payload as /api/recommend (without prefilter or catalog filters) and returns
+    its ranking plus a session_id. Later edits go to PATCH
+    /api/sessions/<session_id> and only recompute the scores they affect.
+    """
+    try:
+        with metrics.stage("validate"):
+            student_profile = request.get_json()
+            if not isinstance(student_profile, dict):
+                student_profile = {}
+            
+            missing_fields = [field for field in REQUIRED_PROFILE_FIELDS if field not in student_profile]
+            if missing_fields:
+                return jsonify({
+                    "error": "Missing required fields",
+                    "missing": missing_fields
+                }), 400
+            
+            invalid_fields = non_finite_fields(student_profile)
+            if invalid_fields:
+                return jsonify({
+                    "error": "Non-finite numbers in profile",
+                    "invalid": invalid_fields
+                }), 400
+            
+            try:
+                options = parse_session_options(student_profile)
+            except ValueError as e:
+                return jsonify({
+                    "error": "Invalid ranking options",
+                    "message": str(e)
+                }), 400
+        
+        profile = {field: student_profile[field] for field in REQUIRED_PROFILE_FIELDS}
+        session = ranking_sessions.create(profile)
+        with session.lock:
+            return session_response(session, options, status=201)
         
     except Exception as e:
         return jsonify({
@@ -65,6 +407,73 @@ def recommend():
         }), 500
 
 
+@app.route("/api/sessions/<session_id>", methods=["PATCH"])
+def update_session(session_id):
+    """
+    PATCH endpoint to edit a session's profile and get the new ranking.
+    
+    Expected JSON payload: any subset of the profile fields, plus optional
+    limit/offset/min_score, e.g. {"wants_coop": false, "limit": 20}.
+    A payload with only paging options re-ranks the current profile.
+    The response lists the recomputed components in "recomputed".
+    """
+    try:
+        session = ranking_sessions.get(session_id)
+        if session is None:
+            return jsonify({
+                "error": "Session not found",
+                "message": "The session does not exist or has expired"
+            }), 404
+        
+        with metrics.stage("validate"):
+            payload = request.get_json()
+            if not isinstance(payload, dict):
+                payload = {}
+            try:
+                changes = parse_profile_changes(payload)
+                options = parse_session_options(payload)
+            except ValueError as e:
+                return jsonify({
+                    "error": "Invalid session update",
+                    "message": str(e)
+                }), 400
+        
+        with metrics.stage("catalog"):
+            catalog = get_catalog()
+        with session.lock:
+            with metrics.stage("score"):
+                recomputed = session.update(changes, catalog)
+            return session_response(session, options, recomputed=recomputed)
+        
+    except Exception as e:
+        return jsonify({
+            "error": "Internal server error",
+            "message": str(e)
+        }), 500
+
+
+@app.route("/api/sessions/<session_id>", methods=["DELETE"])
+def delete_session(session_id):
+    """
+    DELETE endpoint to end a re-ranking session early.
+    """
+    if not ranking_sessions.delete(session_id):
+        return jsonify({
+            "error": "Session not found",
+            "message": "The session does not exist or has expired"
+        }), 404
+    return jsonify({"success": True}), 200
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """
+    Request latency histograms, per-stage timings, cache and catalog metrics
+    in the Prometheus text format.
+    """
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     port = int(os.getenv("FLASK_PORT", 5001))
     host = os.getenv("API_HOST", "0.0.0.0")
@@ -0,0 +1,218 @@
+"""
+ASGI entry point - serves the Flask app (app.py) from an asyncio event loop.
+
+    pip install "backend[async]"
+    uvicorn asgi:app --host 0.0.0.0 --port 5001
+
+Requests go to the same Flask views as app.py, with three differences:
+- before a POST/PATCH /api/ request is dispatched, the catalog is read
+  through services.async_database, so waiting on MongoDB doesn't hold a
+  thread (views then find the cached catalog fresh);
+- the view itself (validation, scoring, encoding) runs on a bounded pool of
+  ASYNC_WORKERS threads;
+- at most ASYNC_MAX_CONCURRENCY requests are handled at once. Past that,
+  new requests get an immediate 503 with Retry-After instead of queueing.
+Streamed responses (NDJSON) are sent chunk by chunk as the view yields them.
+"""
+
+import asyncio
+import contextvars
+import io
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app as flask_app
+from services import async_database, batch, encoding, metrics
+
+# Threads running Flask views (scoring is CPU-bound, so more threads than
+# cores mostly adds queueing)
+ASYNC_WORKERS = int(os.getenv("ASYNC_WORKERS", str(os.cpu_count() or 1)))
+# Requests handled at once; further requests are rejected with a 503
+ASYNC_MAX_CONCURRENCY = int(os.getenv("ASYNC_MAX_CONCURRENCY", "64"))
+# Retry-After header (seconds) sent with those 503s
+ASYNC_RETRY_AFTER = os.getenv("ASYNC_RETRY_AFTER", "1")
+
+# Requests that score against the catalog, so it's loaded before dispatch
+CATALOG_METHODS = ("POST", "PATCH")
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(max_workers=ASYNC_WORKERS, thread_name_prefix="asgi-view")
+
+REJECTED = metrics.register(metrics.Counter(
+    "asgi_requests_rejected_total", "Requests rejected with 503 by the ASGI concurrency limit"))
+
+# Requests currently being handled (only touched on the event loop)
+_in_flight = 0
+
+
+@metrics.register_collector
+def _asgi_metrics():
+    return [
+        ("asgi_requests_in_flight", "gauge", "Requests being handled by the ASGI entry point", _in_flight),
+        ("asgi_max_concurrency", "gauge", "Concurrency limit of the ASGI entry point", ASYNC_MAX_CONCURRENCY),
+    ]
+
+
+def wsgi_environ(scope, body):
+    """
+    PEP 3333 environ for an ASGI HTTP scope and its request body.
+    """
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", ()):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_LENGTH":
+            continue
+        key = name if name == "CONTENT_TYPE" else f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _start_view(environ):
+    """
+    Call the Flask app and produce the first body chunk (start_response may
+    be deferred until then). Returns (status, headers, body, iterator, chunk).
+    """
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = headers
+
+    body = flask_app(environ, start_response)
+    iterator = iter(body)
+    chunk = next(iterator, None)
+    return started["status"], started["headers"], body, iterator, chunk
+
+
+async def _read_body(receive):
+    """
+    The full request body, or None if the client disconnected.
+    """
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def _send_json(send, status, payload, headers=()):
+    body = encoding.dumps(payload)
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+                   + list(headers),
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _handle_http(scope, receive, send):
+    loop = asyncio.get_running_loop()
+    body = await _read_body(receive)
+    if body is None:
+        return
+
+    if scope["method"] in CATALOG_METHODS and scope["path"].startswith("/api/"):
+        try:
+            await async_database.get_catalog_async(executor)
+        except Exception as e:
+            await _send_json(send, 500, {"error": "Internal server error", "message": str(e)})
+            return
+
+    # One context per request, so the view's context variables (request
+    # timings, streamed request context) carry over between worker threads
+    context = contextvars.copy_context()
+    status, headers, response, iterator, chunk = await loop.run_in_executor(
+        executor, context.run, _start_view, wsgi_environ(scope, body))
+    try:
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+        })
+        while chunk is not None:
+            if chunk:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            chunk = await loop.run_in_executor(executor, context.run, next, iterator, None)
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        if hasattr(response, "close"):
+            await loop.run_in_executor(executor, context.run, response.close)
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                await async_database.get_catalog_async(executor)
+            except Exception:
+                logger.exception("Catalog warm-up failed; it will be loaded on the first request")
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await async_database.close_async_connection()
+            batch.shutdown_pool()
+            executor.shutdown(wait=False, cancel_futures=True)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """
+    The ASGI application.
+    """
+    global _in_flight
+
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+    if _in_flight >= ASYNC_MAX_CONCURRENCY:
+        REJECTED.inc()
+        await _send_json(send, 503, {
+            "error": "Server busy",
+            "message": "Too many concurrent requests, retry shortly"
+        }, headers=[(b"retry-after", ASYNC_RETRY_AFTER.encode())])
+        return
+
+    _in_flight += 1
+    try:
+        await _handle_http(scope, receive, send)
+    finally:
+        _in_flight -= 1
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    port = int(os.getenv("FLASK_PORT", 5001))
+    host = os.getenv("API_HOST", "0.0.0.0")
+    uvicorn.run("asgi:app", host=host, port=port)
@@ -0,0 +1,9 @@
+"""
+Scoring benchmarks - synthetic catalogs and profiles, and repeatable timings.
+
+Usage (from the backend directory):
+    python -m benchmarks.run --sizes 100 1000 10000 --output bench.json
+    python -m benchmarks.run --compare bench.json --output bench-new.json
+
+See benchmarks/synthetic.py for the seeded catalog and profile generators.
+"""
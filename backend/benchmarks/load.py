@@ -0,0 +1,367 @@
+"""
+Load test for POST /api/recommend against a locally started server.
+
+Usage (from the backend directory, needs mongomock):
+    python -m benchmarks.load [--programs 1000] [--workers 1] [--duration 30]
+                              [--concurrency 16] [--rps 200] [--limit 20]
+                              [--profiles 200] [--no-result-cache]
+                              [--output load.json]
+
+The server is app.py run in a child process on Werkzeug's threaded server,
+with MongoDB replaced by an in-memory stand-in (mongomock) seeded from a
+synthetic catalog of --programs programs. --workers forks that many server
+processes sharing one listening socket (POSIX only), each with its own
+catalog cache.
+
+The client sends mixed Grade 9-12 profiles from --concurrency threads.
+With --rps requests are started on a fixed schedule (open loop) and their
+latency is measured from the scheduled start, so a backed-up server shows
+up in the percentiles instead of silently lowering the send rate. Without
+it every thread sends its next request as soon as the last one finishes
+(closed loop).
+
+The report is JSON: the settings, overall throughput, latency percentiles,
+error rate and status counts, and a timeline with the same figures and the
+server's resident memory (summed over its worker processes) for every
+--interval seconds.
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from benchmarks.run import _git_commit, local_database
+from benchmarks.synthetic import generate_catalog, generate_profiles
+
+SERVER_START_TIMEOUT = 120
+
+
+# --- Server ---
+
+def serve(programs, port, workers, seed, result_cache=True):
+    """
+    Run app.py on 127.0.0.1:port against a seeded in-memory MongoDB, in
+    workers threaded server processes sharing the listening socket.
+    Blocks until the process is stopped.
+    """
+    if not result_cache:
+        os.environ["RESULT_CACHE_SIZE"] = "0"
+    if workers > 1 and not hasattr(os, "fork"):
+        raise ValueError("--workers above 1 needs os.fork()")
+    from werkzeug.serving import make_server
+
+    university_db = generate_catalog(programs, seed=seed)
+    with local_database(university_db):
+        import app as app_module
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        server = make_server("127.0.0.1", port, app_module.app, threaded=True)
+
+        # Pre-fork the other workers; each loads the catalog on its first request
+        children = []
+        for _ in range(workers - 1):
+            pid = os.fork()
+            if pid == 0:
+                server.serve_forever()
+                os._exit(0)
+            children.append(pid)
+
+        def stop(signum, frame):
+            for pid in children:
+                os.kill(pid, signal.SIGTERM)
+            sys.exit(0)
+
+        signal.signal(signal.SIGTERM, stop)
+        server.serve_forever()
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(programs, workers, seed, result_cache=True):
+    """
+    Start serve() in a child process. Returns (process, port, log file)
+    once the server accepts requests. Raises RuntimeError if it doesn't.
+    """
+    port = _free_port()
+    log = tempfile.TemporaryFile()
+    command = [sys.executable, "-m", "benchmarks.load", "--serve", "--port", str(port),
+               "--programs", str(programs), "--workers", str(workers), "--seed", str(seed)]
+    if not result_cache:
+        command.append("--no-result-cache")
+    process = subprocess.Popen(command, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               stdout=log, stderr=subprocess.STDOUT)
+
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            break
+        try:
+            status, _ = request("127.0.0.1", port, "GET", "/", None, timeout=1)
+            if status == 200:
+                return process, port, log
+        except OSError:
+            pass
+        time.sleep(0.2)
+
+    stop_server(process)
+    log.seek(0)
+    output = log.read().decode("utf-8", "replace")[-2000:]
+    raise RuntimeError(f"Server didn't start within {SERVER_START_TIMEOUT}s:\n{output}")
+
+
+def stop_server(process):
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def process_tree_rss(pid):
+    """
+    Resident memory in bytes of a process and its descendants, or None where
+    /proc isn't available.
+    """
+    try:
+        total = 0
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    total += int(line.split()[1]) * 1024
+                    break
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                for child in f.read().split():
+                    total += process_tree_rss(int(child)) or 0
+        return total
+    except (OSError, ValueError):
+        return None
+
+
+# --- Client ---
+
+def request(host, port, method, path, body, timeout=60):
+    """
+    Send one request. Returns (status, response size in bytes).
+    """
+    connection = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        return response.status, len(response.read())
+    finally:
+        connection.close()
+
+
+def percentile(sorted_values, q):
+    """
+    Nearest-rank percentile of an ascending list (None if it's empty).
+    """
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, max(0, int(round(q / 100 * len(sorted_values))) - 1))]
+
+
+def summarize(samples, seconds):
+    """
+    Throughput, error rate and latency percentiles (ms) for (latency seconds,
+    status) samples collected over the given number of seconds.
+    """
+    latencies = sorted(latency * 1000 for latency, _ in samples)
+    errors = sum(1 for _, status in samples if status is None or status >= 400)
+    statuses = {}
+    for _, status in samples:
+        key = str(status) if status is not None else "failed"
+        statuses[key] = statuses.get(key, 0) + 1
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 6) if samples else 0.0,
+        "throughput_rps": round(len(samples) / seconds, 3) if seconds > 0 else None,
+        "p50_ms": _round(percentile(latencies, 50)),
+        "p95_ms": _round(percentile(latencies, 95)),
+        "p99_ms": _round(percentile(latencies, 99)),
+        "mean_ms": _round(sum(latencies) / len(latencies)) if latencies else None,
+        "max_ms": _round(latencies[-1]) if latencies else None,
+        "status_counts": statuses,
+    }
+
+
+def _round(value):
+    return round(value, 3) if value is not None else None
+
+
+def run_load(port, bodies, duration, concurrency, rps=None, interval=1.0, server_pid=None):
+    """
+    Send requests for duration seconds. Returns (samples, timeline), where
+    samples are (completed at, latency seconds, status or None) tuples and
+    timeline holds a {"t", "rss_bytes"} entry per interval.
+    """
+    samples = []
+    samples_lock = threading.Lock()
+    stop = threading.Event()
+    started = time.perf_counter()
+    deadline = started + duration
+
+    def send(scheduled):
+        body = random.choice(bodies)
+        try:
+            status, _ = request("127.0.0.1", port, "POST", "/api/recommend", body)
+        except OSError:
+            status = None
+        finished = time.perf_counter()
+        with samples_lock:
+            samples.append((finished - started, finished - scheduled, status))
+
+    def closed_loop():
+        while not stop.is_set() and time.perf_counter() < deadline:
+            send(time.perf_counter())
+
+    memory = []
+
+    def sample_memory():
+        while not stop.wait(interval):
+            memory.append({"t": round(time.perf_counter() - started, 3),
+                           "rss_bytes": process_tree_rss(server_pid) if server_pid else None})
+
+    sampler = threading.Thread(target=sample_memory, daemon=True)
+    sampler.start()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        if rps:
+            # Open loop: start requests on schedule whether or not earlier ones finished
+            count = int(duration * rps)
+            for i in range(count):
+                scheduled = started + i / rps
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(send, scheduled)
+        else:
+            for _ in range(concurrency):
+                pool.submit(closed_loop)
+    stop.set()
+    sampler.join()
+    return samples, memory
+
+
+def build_timeline(samples, memory, interval):
+    """
+    Per-interval summaries (by completion time) joined with the memory samples.
+    """
+    buckets = {}
+    for completed, latency, status in samples:
+        buckets.setdefault(int(completed // interval), []).append((latency, status))
+    rss = {int(round(entry["t"] / interval)) - 1: entry["rss_bytes"] for entry in memory}
+
+    timeline = []
+    for index in range(max(list(buckets) + list(rss), default=-1) + 1):
+        summary = summarize(buckets.get(index, []), interval)
+        summary.pop("status_counts")
+        timeline.append(dict({"t": round((index + 1) * interval, 3)}, **summary, rss_bytes=rss.get(index)))
+    return timeline
+
+
+def run_load_test(programs=1000, workers=1, duration=30.0, concurrency=16, rps=None, limit=None,
+                  profile_count=200, seed=0, result_cache=True, interval=1.0, log=None):
+    """
+    Start a server, load it and return the report dictionary.
+    """
+    profiles = generate_profiles(profile_count, seed=seed, grades=(9, 10, 11, 12))
+    bodies = [json.dumps(dict(p, limit=limit) if limit is not None else p).encode("utf-8") for p in profiles]
+
+    if log:
+        log(f"starting server: {programs} programs, {workers} worker(s)")
+    process, port, server_log = start_server(programs, workers, seed, result_cache=result_cache)
+    try:
+        # Load the catalog (in every worker, as far as a few requests reach them)
+        for body in bodies[:max(1, workers) * 2]:
+            request("127.0.0.1", port, "POST", "/api/recommend", body)
+        rss_before = process_tree_rss(process.pid)
+
+        if log:
+            log(f"loading for {duration}s: concurrency {concurrency}, " + (f"{rps} rps" if rps else "closed loop"))
+        samples, memory = run_load(port, bodies, duration, concurrency, rps=rps, interval=interval,
+                                   server_pid=process.pid)
+        rss_after = process_tree_rss(process.pid)
+    finally:
+        stop_server(process)
+        server_log.close()
+
+    elapsed = max([completed for completed, _, _ in samples], default=duration)
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "settings": {
+            "programs": programs, "workers": workers, "duration": duration, "concurrency": concurrency,
+            "rps": rps, "limit": limit, "profiles": profile_count, "seed": seed,
+            "result_cache": result_cache, "interval": interval,
+        },
+        "summary": dict(summarize([(latency, status) for _, latency, status in samples], elapsed),
+                        rss_bytes_start=rss_before, rss_bytes_end=rss_after),
+        "timeline": build_timeline(samples, memory, interval),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--programs", type=int, default=1000, help="synthetic catalog size")
+    parser.add_argument("--workers", type=int, default=1, help="threaded server processes")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load")
+    parser.add_argument("--concurrency", type=int, default=16, help="client threads")
+    parser.add_argument("--rps", type=float, help="target request rate (default: closed loop)")
+    parser.add_argument("--limit", type=int, help="page size sent with every request (default: full ranking)")
+    parser.add_argument("--profiles", type=int, default=200, help="distinct profiles to cycle through")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-result-cache", action="store_true", help="disable the server's result cache")
+    parser.add_argument("--interval", type=float, default=1.0, help="timeline resolution in seconds")
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        serve(args.programs, args.port, args.workers, args.seed, result_cache=not args.no_result_cache)
+        return
+
+    def log(message):
+        print(message, file=sys.stderr)
+
+    report = run_load_test(
+        programs=args.programs, workers=args.workers, duration=args.duration, concurrency=args.concurrency,
+        rps=args.rps, limit=args.limit, profile_count=args.profiles, seed=args.seed,
+        result_cache=not args.no_result_cache, interval=args.interval, log=log,
+    )
+    encoded = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(encoded + "\n")
+    else:
+        print(encoded)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+"""
+Timing and memory benchmarks for the scoring engine, catalog fetch and API.
+
+Usage (from the backend directory):
+    python -m benchmarks.run [--sizes 100 1000 10000] [--profiles 20] [--repeat 3]
+                             [--suites matcher tables fetch api] [--output results.json]
+                             [--compare baseline.json]
+
+Suites:
+    matcher  UniversityMatcher.get_ranked_programs (full ranking and top 20)
+             on each engine, plus catalog compile time and size
+    tables   scoring profiles on the band table grid from precomputed tables
+             (services.band_tables) against the live path, per engine, plus
+             table build time and size
+    fetch    database.fetch_university_data against a local in-memory
+             MongoDB stand-in (mongomock), in both catalog layouts
+    api      POST /api/recommend through Flask's test client, with the result
+             cache cleared before each request and with cache hits
+
+Timings are in milliseconds per call. Results are written as JSON together
+with the commit and environment they were measured on; --compare prints the
+change of every median against an earlier results file. Load tests under
+concurrency are in benchmarks/load.py.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from benchmarks.synthetic import generate_catalog, generate_profiles
+from services import band_tables, database, loader
+from services.catalog import compile_catalog
+from services.matcher import UniversityMatcher
+
+DEFAULT_SIZES = [100, 1000, 10000]
+SUITES = ("matcher", "tables", "fetch", "api")
+
+
+# --- Measurement helpers ---
+
+def summarize(samples):
+    """
+    Summary statistics (in milliseconds) for a list of durations in seconds.
+    """
+    ms = sorted(s * 1000 for s in samples)
+    return {
+        "runs": len(ms),
+        "min_ms": round(ms[0], 4),
+        "median_ms": round(statistics.median(ms), 4),
+        "mean_ms": round(statistics.fmean(ms), 4),
+        "p95_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 4),
+        "max_ms": round(ms[-1], 4),
+    }
+
+
+def time_calls(fn, args_list, repeat):
+    """
+    Call fn(*args) for every args tuple, repeat times, after one warm-up pass.
+    Returns the summary of the per-call durations.
+    """
+    for args in args_list[:1]:
+        fn(*args)
+    samples = []
+    gc.collect()
+    for _ in range(repeat):
+        for args in args_list:
+            start = time.perf_counter()
+            fn(*args)
+            samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def peak_memory(fn, *args):
+    """
+    (result, peak bytes allocated by Python while running fn(*args)).
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = fn(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak
+
+
+def retained_memory(fn, *args):
+    """
+    (result, bytes still allocated after fn(*args) returns), e.g. the size of
+    a compiled catalog.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        result = fn(*args)
+        gc.collect()
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, after - before
+
+
+def _max_rss_bytes():
+    try:
+        import resource
+    except ImportError:  # Not available on Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+# --- Local MongoDB stand-in ---
+
+@contextmanager
+def local_database(university_db, layout="university"):
+    """
+    Point services.database at a fresh in-memory MongoDB (mongomock) holding
+    university_db in the given layout, restoring the real settings afterwards.
+    Raises RuntimeError if mongomock isn't installed.
+    """
+    try:
+        import mongomock  # noqa: F401
+    except ImportError:
+        raise RuntimeError("the local MongoDB stand-in needs mongomock (pip install mongomock)")
+
+    saved = (database.MONGODB_URI, database.CATALOG_LAYOUT, database.CATALOG_SNAPSHOT_PATH)
+    database.close_connection()
+    database.MONGODB_URI = "mongomock://benchmarks"
+    database.CATALOG_LAYOUT = layout
+    database.CATALOG_SNAPSHOT_PATH = None
+    try:
+        loader.write_catalog(university_db, layout=layout)
+        loader.bump_catalog_version()
+        yield
+    finally:
+        database.close_connection()
+        database.MONGODB_URI, database.CATALOG_LAYOUT, database.CATALOG_SNAPSHOT_PATH = saved
+
+
+# --- Suites ---
+
+def bench_matcher(university_db, profiles, repeat):
+    """
+    Catalog compile cost and get_ranked_programs timings for each engine.
+    """
+    results = {}
+    compile_stats = time_calls(compile_catalog, [(university_db,)], repeat)
+    catalog, catalog_bytes = retained_memory(compile_catalog, university_db)
+    results["compile"] = dict(compile_stats, catalog_bytes=catalog_bytes)
+
+    engines = ["python"]
+    from services import vectorized
+    if vectorized.is_available():
+        engines.append("numpy")
+
+    for engine in engines:
+        def full(profile):
+            return UniversityMatcher(profile, catalog=catalog, engine=engine).get_ranked_programs()
+
+        def top20(profile):
+            return UniversityMatcher(profile, catalog=catalog, engine=engine).get_ranked_programs(limit=20)
+
+        args = [(p,) for p in profiles]
+        _, full_peak = peak_memory(full, profiles[0])
+        _, top20_peak = peak_memory(top20, profiles[0])
+        results[f"rank_full_{engine}"] = dict(time_calls(full, args, repeat), peak_bytes=full_peak)
+        results[f"rank_top20_{engine}"] = dict(time_calls(top20, args, repeat), peak_bytes=top20_peak)
+    return results
+
+
+def bench_tables(university_db, profiles, repeat):
+    """
+    Band table build cost and top-20 rankings from the tables vs live scoring,
+    for profiles moved onto the table grid.
+    """
+    results = {}
+    catalog = compile_catalog(university_db, version="benchmark")
+    step = band_tables.BAND_AVERAGE_STEP
+    grid = [(dict(p, average=round(p['average'] / step) * step),) for p in profiles]
+
+    engines = [("python", False)]
+    from services import vectorized
+    if vectorized.is_available():
+        engines.append(("numpy", True))
+
+    saved = band_tables.BAND_TABLES
+    try:
+        for engine, use_vectorized in engines:
+            build = time_calls(band_tables.build_tables, [(catalog, use_vectorized)], 1)
+            tables = band_tables.build_tables(catalog, use_vectorized)
+            band_tables.install_tables(tables)
+            results[f"tables_build_{engine}"] = dict(build, table_bytes=tables.nbytes)
+
+            def top20(profile):
+                return UniversityMatcher(profile, catalog=catalog, engine=engine).get_ranked_programs(limit=20)
+
+            band_tables.BAND_TABLES = False
+            results[f"tables_live_top20_{engine}"] = time_calls(top20, grid, repeat)
+            band_tables.BAND_TABLES = True
+            results[f"tables_top20_{engine}"] = time_calls(top20, grid, repeat)
+    finally:
+        band_tables.BAND_TABLES = saved
+        band_tables.clear()
+    return results
+
+
+def bench_fetch(university_db, repeat):
+    """
+    fetch_university_data against the local stand-in, per catalog layout.
+    """
+    results = {}
+    for layout in ("university", "program"):
+        with local_database(university_db, layout=layout):
+            fetched, peak = peak_memory(database.fetch_university_data)
+            if sum(len(u["programs"]) for u in fetched.values()) != sum(len(u["programs"]) for u in university_db.values()):
+                raise RuntimeError(f"fetch_university_data returned an incomplete catalog ({layout} layout)")
+            results[f"fetch_{layout}"] = dict(time_calls(database.fetch_university_data, [()], repeat), peak_bytes=peak)
+    return results
+
+
+def bench_api(university_db, profiles, repeat):
+    """
+    POST /api/recommend round trips through Flask's test client.
+    """
+    import app as app_module
+    from services.result_cache import recommendation_cache
+
+    client = app_module.app.test_client()
+
+    def post(profile):
+        response = client.post("/api/recommend", json=profile)
+        if response.status_code != 200:
+            raise RuntimeError(f"/api/recommend returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        return response
+
+    def post_uncached(profile):
+        recommendation_cache.clear()
+        return post(profile)
+
+    results = {}
+    with local_database(university_db):
+        post(profiles[0])  # Load the catalog into the process cache
+        args = [(p,) for p in profiles]
+        paged = [(dict(p, limit=20),) for p in profiles]
+        results["api_full"] = time_calls(post_uncached, args, repeat)
+        results["api_top20"] = time_calls(post_uncached, paged, repeat)
+        results["api_top20_cached"] = time_calls(post, paged, repeat)
+        results["response_bytes_full"] = len(post_uncached(profiles[0]).get_data())
+    recommendation_cache.clear()
+    return results
+
+
+# --- Runner ---
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, profile_count=20, repeat=3, seed=0, suites=SUITES, log=None):
+    """
+    Run the selected suites for every catalog size. Returns the results dictionary.
+    """
+    try:
+        import numpy
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = None
+
+    results = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": numpy_version,
+            "cpu_count": os.cpu_count(),
+        },
+        "settings": {"sizes": list(sizes), "profiles": profile_count, "repeat": repeat, "seed": seed,
+                     "suites": list(suites)},
+        "sizes": {},
+    }
+
+    profiles = generate_profiles(profile_count, seed=seed)
+    for size in sizes:
+        university_db = generate_catalog(size, seed=seed)
+        entry = results["sizes"][str(size)] = {"universities": len(university_db)}
+        for suite in suites:
+            if log:
+                log(f"{suite} @ {size} programs")
+            try:
+                if suite == "matcher":
+                    entry.update(bench_matcher(university_db, profiles, repeat))
+                elif suite == "tables":
+                    entry.update(bench_tables(university_db, profiles, repeat))
+                elif suite == "fetch":
+                    entry.update(bench_fetch(university_db, repeat))
+                elif suite == "api":
+                    entry.update(bench_api(university_db, profiles, repeat))
+            except RuntimeError as e:
+                entry.setdefault("skipped", {})[suite] = str(e)
+
+    results["max_rss_bytes"] = _max_rss_bytes()
+    return results
+
+
+def compare_results(baseline, current):
+    """
+    (size, benchmark, baseline median, current median, ratio) for every
+    benchmark present in both results files.
+    """
+    rows = []
+    for size, entry in current["sizes"].items():
+        old_entry = baseline.get("sizes", {}).get(size, {})
+        for name, stats in entry.items():
+            old = old_entry.get(name)
+            if isinstance(stats, dict) and isinstance(old, dict) and "median_ms" in stats and "median_ms" in old:
+                ratio = stats["median_ms"] / old["median_ms"] if old["median_ms"] else None
+                rows.append((size, name, old["median_ms"], stats["median_ms"], ratio))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark scoring, catalog fetch and the recommend API.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="catalog sizes (programs)")
+    parser.add_argument("--profiles", type=int, default=20, help="student profiles per benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="timed passes over the profiles")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic catalog and profiles")
+    parser.add_argument("--suites", nargs="+", choices=SUITES, default=list(SUITES))
+    parser.add_argument("--output", help="write the results JSON here (default: stdout)")
+    parser.add_argument("--compare", help="earlier results JSON to compare medians against")
+    args = parser.parse_args(argv)
+
+    if args.profiles < 1 or args.repeat < 1:
+        parser.error("--profiles and --repeat must be at least 1")
+
+    results = run_benchmarks(
+        sizes=args.sizes,
+        profile_count=args.profiles,
+        repeat=args.repeat,
+        seed=args.seed,
+        suites=args.suites,
+        log=lambda message: print(message, file=sys.stderr),
+    )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        for size, name, old, new, ratio in compare_results(baseline, results):
+            change = f"{(ratio - 1) * 100:+.1f}%" if ratio is not None else "n/a"
+            print(f"{size:>8} {name:<24} {old:>10.3f} ms -> {new:>10.3f} ms  {change}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+Seeded synthetic catalogs and student profiles for benchmarks and load tests.
+
+generate_catalog() scales the shape of data/mock_universities.py to any
+number of programs: realistic average bands (some given as a single value),
+interest tags drawn from related fields, and required-course strings with
+"/" alternatives and generic "one more U course" clauses. The same seed
+always produces the same catalog and profiles.
+"""
+
+import random
+
+# Interest tags grouped by field, so programs get related tags
+INTEREST_FIELDS = {
+    "computing": ["software", "programming", "algorithms", "systems", "ai", "data", "theory", "security"],
+    "engineering": ["circuits", "hardware", "robotics", "machines", "structures", "electronics", "power", "signals"],
+    "science": ["physics", "chemistry", "biology", "math", "statistics", "environment", "astronomy"],
+    "health": ["health", "medicine", "nursing", "kinesiology", "nutrition", "psychology"],
+    "business": ["business", "management", "finance", "accounting", "marketing", "economics"],
+    "arts": ["writing", "culture", "history", "philosophy", "languages", "music", "design", "film"],
+    "social": ["law", "politics", "sociology", "education", "geography", "communications"],
+}
+
+PROGRAM_NAMES = {
+    "computing": ["Computer Science", "Software Engineering", "Data Science", "Computing", "Cybersecurity"],
+    "engineering": ["Computer Engineering", "Electrical Engineering", "Mechanical Engineering",
+                    "Mechatronics Engineering", "Civil Engineering"],
+    "science": ["Physics", "Chemistry", "Life Sciences", "Mathematics", "Environmental Science"],
+    "health": ["Health Sciences", "Nursing", "Kinesiology", "Psychology", "Nutrition"],
+    "business": ["Commerce", "Business Administration", "Accounting", "Economics", "Finance"],
+    "arts": ["English", "History", "Philosophy", "Music", "Fine Arts", "Media Studies"],
+    "social": ["Political Science", "Sociology", "Education", "Geography", "Criminology"],
+}
+
+# Required-course strings per field; "/" separates alternatives
+REQUIRED_COURSES = {
+    "computing": ["ENG4U", "MHF4U", "MCV4U", "MDM4U / MCV4U", "ICS4U"],
+    "engineering": ["ENG4U", "MHF4U", "MCV4U", "SPH4U", "SCH4U"],
+    "science": ["ENG4U", "MHF4U", "MCV4U / MDM4U", "SCH4U", "SBI4U / SPH4U"],
+    "health": ["ENG4U", "SBI4U", "SCH4U", "MHF4U / MDM4U / MCV4U"],
+    "business": ["ENG4U", "MHF4U", "MCV4U / MDM4U", "BAT4M / BOH4M"],
+    "arts": ["ENG4U / EAE4U", "CHY4U / CHI4U", "AMU4M / AVI4M"],
+    "social": ["ENG4U / EAE4U", "CPW4U / CLN4U", "HSB4U / HZT4U"],
+}
+
+# Generic clauses never count as missing (see catalog.GENERIC_REQUIREMENT_PHRASES)
+GENERIC_REQUIREMENTS = ["One more U course", "One more U or M course", "Any U or M course",
+                        "Two additional U or M courses", "Another 4U math course"]
+
+COURSE_CODES = sorted({
+    alt.strip()
+    for courses in REQUIRED_COURSES.values()
+    for requirement in courses
+    for alt in requirement.split("/")
+} | {"ENG3U", "MCR3U", "SPH3U", "SCH3U", "SBI3U", "ENG2D", "MPM2D", "SNC2D", "ENG1D", "MPM1D", "SNC1D"})
+
+COOP_OPTIONS = [["yes"], ["no"], ["yes", "no"]]
+
+
+def _average_band(rng):
+    """
+    A [min, max] recommended average, or a single value for ~10% of programs.
+    """
+    low = min(97.0, max(65.0, round(rng.gauss(84, 6) * 2) / 2))
+    if rng.random() < 0.1:
+        return [low]
+    return [low, min(100.0, low + rng.choice([2, 3, 4, 5, 6, 7]))]
+
+
+def _program(rng, field):
+    tags = rng.sample(INTEREST_FIELDS[field], rng.randint(2, 5))
+    if rng.random() < 0.3:  # Some cross-field tags
+        other = rng.choice(list(INTEREST_FIELDS))
+        tags.append(rng.choice(INTEREST_FIELDS[other]))
+
+    required = rng.sample(REQUIRED_COURSES[field], rng.randint(0, len(REQUIRED_COURSES[field])))
+    if rng.random() < 0.35:
+        required.append(rng.choice(GENERIC_REQUIREMENTS))
+
+    return {
+        "recommended_average": _average_band(rng),
+        "interest_fields": list(dict.fromkeys(tags)),
+        "required_courses": required,
+    }
+
+
+def generate_catalog(program_count, seed=0, programs_per_university=40):
+    """
+    Raw university catalog (the shape of UNIVERSITY_DB) with program_count
+    programs spread over universities of up to programs_per_university each.
+    """
+    rng = random.Random(seed)
+    university_db = {}
+    remaining = program_count
+    uni_index = 0
+    while remaining > 0:
+        count = min(remaining, programs_per_university)
+        programs = {}
+        while len(programs) < count:
+            field = rng.choice(list(PROGRAM_NAMES))
+            name = rng.choice(PROGRAM_NAMES[field])
+            if name in programs:
+                name = f"{name} ({len(programs)})"
+            programs[name] = _program(rng, field)
+
+        university_db[f"Synthetic University {uni_index:05d}"] = {
+            "ec_quality": rng.choice([1, 2, 2, 3, 3, 4]),
+            "co-op": list(rng.choice(COOP_OPTIONS)),
+            "programs": programs,
+        }
+        remaining -= count
+        uni_index += 1
+    return university_db
+
+
+def generate_profile(rng, grade_level=None):
+    """
+    One student profile in the /api/recommend payload shape.
+    """
+    grade = grade_level if grade_level is not None else rng.choice([9, 10, 11, 12])
+    average = min(100.0, max(55.0, rng.gauss(83, 8)))
+    if rng.random() < 0.7:
+        average = round(average * 2) / 2
+
+    extra_curriculars = [[f"activity-{i}", rng.randint(1, 5)] for i in range(rng.choice([0, 1, 1, 2, 3]))]
+
+    field = rng.choice(list(INTEREST_FIELDS))
+    interests = rng.sample(INTEREST_FIELDS[field], rng.randint(1, 4))
+    if rng.random() < 0.4:
+        interests.append(rng.choice(INTEREST_FIELDS[rng.choice(list(INTEREST_FIELDS))]))
+
+    # Only courses up to the student's grade (the digit in ENG4U is grade - 8)
+    available = [code for code in COURSE_CODES if int(code[3]) <= grade - 8]
+    course_count = {9: 2, 10: 3, 11: 5, 12: 8}[grade]
+    courses = rng.sample(available, min(len(available), rng.randint(0, course_count)))
+    courses_taken = [[code, rng.randint(60, 100)] for code in courses]
+
+    return {
+        "grade_level": grade,
+        "average": average,
+        "wants_coop": rng.random() < 0.5,
+        "extra_curriculars": extra_curriculars,
+        "major_interests": list(dict.fromkeys(interests)),
+        "courses_taken": courses_taken,
+    }
+
+
+def generate_profiles(count, seed=0, grades=(9, 10, 11, 12)):
+    """
+    count student profiles, cycling through the given grade levels.
+    """
+    rng = random.Random(seed)
+    return [generate_profile(rng, grades[i % len(grades)]) for i in range(count)]
@@ -0,0 +1,216 @@
+"""
+Async catalog access for the ASGI entry point (asgi.py).
+
+The version probe and the catalog fetch use pymongo's AsyncMongoClient
+(pymongo >= 4.10), so waiting on MongoDB never holds a thread. Compiling
+the catalog is CPU-bound and runs on the caller's executor. The result is
+installed in the same process catalog cache services.database uses, with the
+same TTL, stale-while-revalidate and stale-if-error behaviour, so request
+handlers that call get_catalog() afterwards find it fresh and never block on
+MongoDB themselves.
+
+Without an async driver (older pymongo, mongomock:// URIs or a snapshot-only
+setup) the synchronous refresh from services.database runs on the executor
+instead.
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+from pymongo.errors import PyMongoError
+
+from services import database, shared_catalog
+from services.metrics import stage
+
+try:
+    from pymongo import AsyncMongoClient
+except ImportError:  # AsyncMongoClient needs pymongo >= 4.10
+    AsyncMongoClient = None
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_database = None
+# Single-flight lock for refreshes the caller has to wait for
+_refresh_lock = None
+# Background refresh tasks, referenced until they finish
+_background_tasks = set()
+
+
+def async_driver_available():
+    """
+    True if the catalog can be read with the async driver.
+    """
+    uri = database.MONGODB_URI
+    return AsyncMongoClient is not None and bool(uri) and not uri.startswith("mongomock://")
+
+
+def get_async_database():
+    """
+    Get the AsyncMongoClient database. Creates the client if it doesn't exist.
+    """
+    global _client, _database
+    if _database is None:
+        _client = AsyncMongoClient(database.MONGODB_URI, serverSelectionTimeoutMS=database.MONGODB_TIMEOUT_MS)
+        _database = _client[database.DATABASE_NAME]
+    return _database
+
+
+async def close_async_connection():
+    """
+    Close the async MongoDB client.
+    """
+    global _client, _database
+    if _client is not None:
+        await _client.close()
+    _client = None
+    _database = None
+
+
+async def get_catalog_version_async():
+    """
+    database.get_catalog_version() with the async driver.
+    """
+    with stage("version_probe"):
+        db = get_async_database()
+        meta = await db[database.META_COLLECTION_NAME].find_one({"_id": database.CATALOG_VERSION_ID})
+        if meta is not None:
+            return database.meta_version(meta)
+
+        if database.CATALOG_LAYOUT == "program":
+            collection = db[database.PROGRAMS_COLLECTION_NAME]
+        else:
+            collection = db[database.COLLECTION_NAME]
+        count = await collection.count_documents({})
+        newest = await collection.find_one({}, projection={"_id": 1}, sort=[("_id", -1)])
+        return database.probe_version(count, newest)
+
+
+async def fetch_university_data_async():
+    """
+    database.fetch_university_data() with the async driver.
+    """
+    with stage("fetch"):
+        db = get_async_database()
+        if database.CATALOG_LAYOUT == "program":
+            cursor = db[database.PROGRAMS_COLLECTION_NAME].find({}, projection=database.PROGRAM_PROJECTION)
+            documents = await cursor.to_list(None)
+            if not documents:
+                raise ValueError("No documents found in the MongoDB collection")
+            return database.programs_to_university_db(documents)
+
+        documents = await db[database.COLLECTION_NAME].find({}).to_list(None)
+        return database.university_documents_to_db(documents)
+
+
+class _NotFetched(Exception):
+    """
+    A catalog had to be built from data that wasn't fetched.
+    """
+
+
+def _fetched(university_db):
+    """
+    Fetch callback for database._load_catalog returning already fetched
+    data; raises _NotFetched if there is none (None).
+    """
+    def fetch():
+        if university_db is None:
+            raise _NotFetched()
+        return university_db
+    return fetch
+
+
+async def refresh_catalog_async(executor):
+    """
+    Async counterpart of database._refresh_catalog(): probe the version and
+    reload the catalog if it changed. Compiling (and mapping or publishing a
+    shared generation) runs on executor.
+    """
+    loop = asyncio.get_running_loop()
+    if not async_driver_available():
+        return await loop.run_in_executor(executor, _refresh_blocking)
+
+    catalog, _, generation = database.catalog_state()
+    try:
+        version = await get_catalog_version_async()
+    except PyMongoError as e:
+        if catalog is not None:
+            raise
+        # Cold start while MongoDB is unreachable
+        catalog = await loop.run_in_executor(executor, database._cold_start_catalog, e)
+        database.install_catalog(catalog, generation)
+        return catalog
+
+    if catalog is None or version != catalog.version:
+        published = shared_catalog.CATALOG_SHARED_DIR and os.path.exists(shared_catalog.generation_path(version))
+        # Another worker already published this version: map it instead of fetching
+        university_db = None if published else await fetch_university_data_async()
+        try:
+            catalog = await loop.run_in_executor(executor, database._load_catalog, version, _fetched(university_db))
+        except _NotFetched:
+            # The generation was pruned between the check and mapping it
+            university_db = await fetch_university_data_async()
+            catalog = await loop.run_in_executor(executor, database._load_catalog, version, _fetched(university_db))
+
+    database.install_catalog(catalog, generation)
+    return catalog
+
+
+def _refresh_blocking():
+    with database._refresh_lock:
+        return database._refresh_catalog()
+
+
+async def _background_refresh(executor):
+    error = None
+    try:
+        await refresh_catalog_async(executor)
+    except Exception as e:
+        logger.exception("Background catalog refresh failed; serving the last snapshot")
+        error = e
+    finally:
+        database.release_background_refresh(error)
+
+
+async def get_catalog_async(executor):
+    """
+    Async counterpart of database.get_cached_catalog(): returns the cached
+    catalog while it's fresh, refreshes it in a background task while it's
+    stale, and waits for a single refresh only when it's cold or too stale.
+    """
+    global _refresh_lock
+
+    catalog, checked_at, _ = database.catalog_state()
+    age = time.monotonic() - checked_at
+    if catalog is not None and age < database.CATALOG_CACHE_TTL:
+        return catalog
+
+    if catalog is not None and age < database.CATALOG_MAX_STALENESS:
+        if database.claim_background_refresh():
+            task = asyncio.create_task(_background_refresh(executor))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+        return catalog
+
+    if _refresh_lock is None:
+        _refresh_lock = asyncio.Lock()
+    async with _refresh_lock:
+        current, current_checked_at, _ = database.catalog_state()
+        if current is not None and current_checked_at > checked_at:
+            return current  # Refreshed while we were waiting
+
+        # A refresh that just failed isn't retried by every queued request
+        error = database.recent_refresh_failure()
+        if error is not None:
+            return database.serve_after_failure(current, current_checked_at, error)
+
+        try:
+            return await refresh_catalog_async(executor)
+        except Exception as e:
+            database.record_refresh_failure(e)
+            current = database.serve_after_failure(current, current_checked_at, e)
+            logger.exception("Catalog refresh failed; serving the last snapshot")
+            return current
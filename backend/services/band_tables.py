@@ -0,0 +1,298 @@
+"""
+Precomputed band tables - the profile-shape parts of the score, per catalog version.
+
+Apart from interests and courses, a score only depends on a few discrete
+inputs: the average (which students report in 0.5-point steps), the best EC
+level, wants_coop and the grade. For every program the tables hold:
+
+    grade_score, bonus   the average-dependent academic parts, one row per
+                         average step from BAND_AVERAGE_MIN to BAND_AVERAGE_MAX
+    ec                   the EC score for every level 0..BAND_EC_MAX
+    coop                 the co-op fit for wants_coop False/True
+
+The grade only selects the weights and whether the course penalty applies,
+so it needs no table dimension; the EC and co-op parts can't be folded into
+the academic rows without changing the order of the float operations, so
+they're stored separately. A request on the grid then only computes the
+course penalty and the interest score and combines the rows with the same
+operations as the live path, so scores are identical.
+
+The scalar and NumPy builds produce the same float64 values bit for bit, so
+each table is one flat float64 buffer that both engines read (about 16
+bytes per program per average step in total). With CATALOG_SHARED_DIR set,
+the tables are built once by the worker publishing a catalog generation
+(with NumPy when it's installed) and stored in the generation file, so
+every worker maps them along with the catalog instead of building its own.
+Otherwise they're built in a background thread the first time a catalog
+version is scored (requests use the live path until they're ready) and
+replaced when the version changes. Catalogs without a version (filtered
+selections) and profiles off the grid are scored live.
+"""
+
+import logging
+import math
+import os
+import threading
+from array import array
+
+from services.metrics import register_collector, stage
+
+# Set to False to always score live
+BAND_TABLES = os.getenv("BAND_TABLES", "True").lower() == "true"
+BAND_AVERAGE_MIN = float(os.getenv("BAND_AVERAGE_MIN", "50"))
+BAND_AVERAGE_MAX = float(os.getenv("BAND_AVERAGE_MAX", "100"))
+BAND_AVERAGE_STEP = 0.5
+BAND_EC_MAX = int(os.getenv("BAND_EC_MAX", "5"))
+
+logger = logging.getLogger(__name__)
+
+# Catalog version -> BandTables built in this process, for the newest version only
+_tables = {}
+_building = set()
+_lock = threading.Lock()
+
+
+class BandTables:
+    """
+    Band tables for one catalog version (see module docstring). Each table
+    is a flat float64 buffer in row-major order: grade_score and bonus
+    [step][program id], ec [level][program id] and coop [wants_coop][program
+    id]. row() returns one row for the scalar engine, matrix() the whole
+    table as a read-only NumPy array; neither copies. shared is True for
+    tables mapped from a shared catalog generation.
+    """
+
+    __slots__ = ("version", "programs", "steps", "grade_score", "bonus", "ec", "coop", "shared", "_matrices")
+
+    NAMES = ("grade_score", "bonus", "ec", "coop")
+
+    def __init__(self, version, programs, steps, grade_score, bonus, ec, coop, shared=False):
+        self.version = version
+        self.programs = programs
+        self.steps = steps
+        self.grade_score = grade_score
+        self.bonus = bonus
+        self.ec = ec
+        self.coop = coop
+        self.shared = shared
+        self._matrices = {}
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in self.NAMES)
+
+    def row(self, name, index):
+        start = index * self.programs
+        return getattr(self, name)[start:start + self.programs]
+
+    def matrix(self, name):
+        matrix = self._matrices.get(name)
+        if matrix is None:
+            from services.vectorized import np
+            matrix = np.frombuffer(getattr(self, name), dtype=np.float64).reshape(-1, self.programs)
+            matrix.flags.writeable = False
+            matrix = self._matrices.setdefault(name, matrix)
+        return matrix
+
+
+def grid():
+    """
+    The table grid settings, stored with shared tables so a worker with
+    different settings doesn't use them.
+    """
+    return {
+        "average_min": BAND_AVERAGE_MIN,
+        "average_max": BAND_AVERAGE_MAX,
+        "average_step": BAND_AVERAGE_STEP,
+        "ec_max": BAND_EC_MAX,
+    }
+
+
+def average_steps():
+    """
+    The averages on the table grid, lowest first.
+    """
+    count = int((BAND_AVERAGE_MAX - BAND_AVERAGE_MIN) / BAND_AVERAGE_STEP) + 1
+    return [BAND_AVERAGE_MIN + i * BAND_AVERAGE_STEP for i in range(count)]
+
+
+def step_index(average, steps):
+    """
+    Row of an average in the tables, or None if it's off the grid (or not
+    a finite number).
+    """
+    if not math.isfinite(average):
+        return None
+    position = (average - BAND_AVERAGE_MIN) / BAND_AVERAGE_STEP
+    index = int(position)
+    if index != position or not 0 <= index < len(steps) or steps[index] != average:
+        return None
+    return index
+
+
+def _probe(average=0, ec_level=0, wants_coop=False):
+    """
+    Matcher for a profile with just the fields the tabled components read.
+    """
+    from services.matcher import UniversityMatcher
+    return UniversityMatcher({
+        "grade_level": 12,
+        "average": average,
+        "wants_coop": wants_coop,
+        "extra_curriculars": [["", ec_level]] if ec_level else [],
+        "major_interests": [],
+        "courses_taken": [],
+    })
+
+
+def build_tables(catalog, vectorized=None):
+    """
+    Compute the band tables for a catalog, with the NumPy engine's
+    operations if vectorized (default: whenever NumPy is installed) and the
+    scalar engine's otherwise. Both give the same values.
+    """
+    steps = average_steps()
+    levels = range(BAND_EC_MAX + 1)
+    if vectorized is None:
+        from services.vectorized import is_available
+        vectorized = is_available()
+
+    if vectorized:
+        from services import vectorized as engine
+        np = engine.np
+        arrays = engine.get_arrays(catalog)
+        # One (steps x programs) matrix, like a what-if sweep
+        user_avg = np.array(steps, dtype=np.float64)[:, None]
+        grade_score, bonus = engine.grade_components(user_avg, arrays)
+        grade_score = np.broadcast_to(grade_score, bonus.shape)
+        ec = [engine.ec_scores(level, arrays)[arrays.program_university] for level in levels]
+        coop = [engine.coop_fit(wants, arrays)[arrays.program_university] for wants in (False, True)]
+        # Cast through bytes so the views have the native "d" format of array("d")
+        tables = [
+            memoryview(np.ascontiguousarray(table, dtype=np.float64).ravel()).cast("B").cast("d")
+            for table in (grade_score, bonus, np.array(ec), np.array(coop))
+        ]
+    else:
+        program_university = catalog.program_university
+        grade_score, bonus = array("d"), array("d")
+        for average in steps:
+            matcher = _probe(average=average)
+            parts = [matcher._grade_components(lo, hi) for lo, hi in zip(catalog.min_average, catalog.max_average)]
+            grade_score.extend(part[0] for part in parts)
+            bonus.extend(part[1] for part in parts)
+        ec, coop = array("d"), array("d")
+        for level in levels:
+            matcher = _probe(ec_level=level)
+            uni_ec = [matcher._calculate_ec_score(required) for required in catalog.university_ec_quality]
+            ec.extend(uni_ec[u] for u in program_university)
+        for wants in (False, True):
+            matcher = _probe(wants_coop=wants)
+            uni_coop = [matcher._calculate_coop_fit(options) for options in catalog.university_coop_options]
+            coop.extend(uni_coop[u] for u in program_university)
+        tables = [memoryview(table) for table in (grade_score, bonus, ec, coop)]
+
+    return BandTables(catalog.version, len(catalog), steps, *tables)
+
+
+def install_tables(tables):
+    """
+    Make tables the current ones for their catalog version, dropping tables
+    of other versions.
+    """
+    with _lock:
+        _tables.clear()
+        _tables[tables.version] = tables
+
+
+def _build_in_background(catalog):
+    try:
+        with stage("band_tables"):
+            tables = build_tables(catalog)
+        install_tables(tables)
+    except Exception:
+        logger.exception("Building band tables for catalog %s failed; scoring live", catalog.version)
+    finally:
+        with _lock:
+            _building.discard(catalog.version)
+
+
+def get_tables(catalog):
+    """
+    The band tables for a catalog: the ones mapped with a shared catalog
+    generation, or else the ones built in this process. None if they aren't
+    built yet (starting a background build) or the catalog has no version.
+    """
+    if not BAND_TABLES or catalog.version is None:
+        return None
+    if catalog.shared_band_tables is not None:
+        return catalog.shared_band_tables
+    with _lock:
+        tables = _tables.get(catalog.version)
+        if tables is not None and tables.programs == len(catalog):
+            return tables
+        if catalog.version in _building:
+            return None
+        _building.add(catalog.version)
+    threading.Thread(target=_build_in_background, args=(catalog,), name="band-tables", daemon=True).start()
+    return None
+
+
+def clear():
+    with _lock:
+        _tables.clear()
+
+
+def score_catalog(matcher, catalog, tables, vectorized):
+    """
+    matcher._score_catalog(catalog) from the tables, with the NumPy engine if
+    vectorized, or None if the profile is off the grid.
+    Returns (final, academic, interest, ec, coop_fit).
+    """
+    step = step_index(matcher.user['average'], tables.steps)
+    ec_level = matcher._user_best_ec()
+    if step is None or not isinstance(ec_level, int) or not 0 <= ec_level <= BAND_EC_MAX:
+        return None
+
+    weights = matcher.weights
+    w_acad, w_int, w_ec = weights['academic'], weights['interest'], weights['ec']
+    wants_coop = 1 if matcher.user['wants_coop'] else 0
+
+    if vectorized:
+        from services import vectorized
+        np = vectorized.np
+        grade_score, bonus = tables.matrix("grade_score")[step], tables.matrix("bonus")[step]
+        s_ec = tables.matrix("ec")[ec_level]
+        coop_mult = tables.matrix("coop")[wants_coop]
+        arrays = vectorized.get_arrays(catalog)
+        if matcher.grade == 12:
+            group_penalty = np.array(matcher._requirement_group_penalties(catalog), dtype=np.float64)
+            course_penalty = group_penalty[arrays.requirement_group]
+        else:
+            course_penalty = 1.0
+        s_acad = np.minimum(1.30, (grade_score * course_penalty) + bonus)
+        s_int = vectorized.interest_scores(matcher.user['major_interests'], catalog, arrays)
+        final = ((s_acad * w_acad) + (s_int * w_int) + (s_ec * w_ec)) * coop_mult * 100
+        return final, s_acad, s_int, s_ec, coop_mult
+
+    grade_score, bonus = tables.row("grade_score", step), tables.row("bonus", step)
+    s_ec = tables.row("ec", ec_level)
+    coop_mult = tables.row("coop", wants_coop)
+    group_penalty = matcher._requirement_group_penalties(catalog)
+    s_acad = [
+        min(1.30, (g * group_penalty[group]) + b)
+        for g, b, group in zip(grade_score, bonus, catalog.requirement_group)
+    ]
+    s_int = matcher._interest_scores(catalog)
+    final = [
+        ((a * w_acad) + (i * w_int) + (e * w_ec)) * c * 100
+        for a, i, e, c in zip(s_acad, s_int, s_ec, coop_mult)
+    ]
+    return final, s_acad, s_int, s_ec, coop_mult
+
+
+@register_collector
+def _band_table_metrics():
+    with _lock:
+        tables = list(_tables.values())
+    return [("band_table_bytes", "gauge", "Memory held by band tables built in this process (shared ones are mapped)",
+             sum(t.nbytes for t in tables))]
@@ -0,0 +1,144 @@
+"""
+Batch scoring - ranks programs for many student profiles on a process pool.
+
+The catalog is compiled once by the caller and shipped to each worker process
+when the pool starts, so a batch of thousands of profiles never touches
+MongoDB again. Profiles are dispatched in chunks and results come back in
+input order as soon as each chunk is done.
+
+Workers are started with "forkserver" (or "spawn" where that's missing),
+never by forking the threaded API process: a fork copies locks held by
+other threads (the catalog cache, metrics, logging) in their locked state,
+which can deadlock the worker.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from services.matcher import REQUIRED_PROFILE_FIELDS, UniversityMatcher, non_finite_fields
+
+# Worker processes for batch scoring; 0 scores in the request thread instead.
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", str(os.cpu_count() or 1)))
+# Profiles sent to a worker per dispatch
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "16"))
+# Largest batch accepted by /api/recommend/batch
+BATCH_MAX_PROFILES = int(os.getenv("BATCH_MAX_PROFILES", "5000"))
+
+logger = logging.getLogger(__name__)
+
+# The pool is kept between batches and replaced when the catalog changes; a
+# replaced pool keeps running until the last batch streaming from it is done
+_pool_lock = threading.Lock()
+_pool = None
+_pool_catalog = None
+# Pool -> batches currently streaming from it
+_pool_streams = {}
+
+# Catalog of the current worker process, set by _init_worker
+_worker_catalog = None
+
+
+def _init_worker(catalog):
+    global _worker_catalog
+    _worker_catalog = catalog
+
+
+def score_profile(index, profile, options, catalog):
+    """
+    Rank programs for one profile of a batch. Never raises: problems with a
+    single profile are reported in its result so the rest of the batch goes on.
+    """
+    if not isinstance(profile, dict):
+        return {"index": index, "error": "Invalid profile", "message": "Profile must be a JSON object"}
+
+    missing_fields = [field for field in REQUIRED_PROFILE_FIELDS if field not in profile]
+    if missing_fields:
+        return {"index": index, "error": "Missing required fields", "missing": missing_fields}
+
+    invalid_fields = non_finite_fields(profile)
+    if invalid_fields:
+        return {"index": index, "error": "Non-finite numbers in profile", "invalid": invalid_fields}
+
+    try:
+        rankings, total = UniversityMatcher(profile, catalog=catalog).rank_programs(**options)
+    except Exception as e:
+        return {"index": index, "error": "Scoring failed", "message": str(e)}
+
+    return {"index": index, "success": True, "rankings": rankings, "total_programs": total}
+
+
+def _score_in_worker(job):
+    index, profile, options = job
+    return score_profile(index, profile, options, _worker_catalog)
+
+
+def _start_context():
+    """
+    Multiprocessing context for the pool (see module docstring).
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+def _acquire_pool(catalog):
+    """
+    Return a process pool whose workers hold this catalog, registered as used
+    by one more batch until _release_pool().
+    """
+    global _pool, _pool_catalog
+
+    with _pool_lock:
+        if _pool is None or _pool_catalog is not catalog:
+            if _pool is not None and _pool not in _pool_streams:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=BATCH_WORKERS, mp_context=_start_context(),
+                                        initializer=_init_worker, initargs=(catalog,))
+            _pool_catalog = catalog
+        _pool_streams[_pool] = _pool_streams.get(_pool, 0) + 1
+        return _pool
+
+
+def _release_pool(pool):
+    """
+    Mark a batch on pool as done, shutting the pool down if it was replaced
+    and this was its last batch.
+    """
+    with _pool_lock:
+        _pool_streams[pool] -= 1
+        if _pool_streams[pool] == 0:
+            del _pool_streams[pool]
+            if pool is not _pool:
+                pool.shutdown(wait=False)
+
+
+def stream_batch_results(profiles, options, catalog):
+    """
+    Yield one result per profile, in input order (see score_profile).
+    """
+    if BATCH_WORKERS <= 0 or len(profiles) <= 1:
+        for index, profile in enumerate(profiles):
+            yield score_profile(index, profile, options, catalog)
+        return
+
+    jobs = ((index, profile, options) for index, profile in enumerate(profiles))
+    pool = _acquire_pool(catalog)
+    try:
+        yield from pool.map(_score_in_worker, jobs, chunksize=BATCH_CHUNK_SIZE)
+    finally:
+        _release_pool(pool)
+
+
+def shutdown_pool():
+    """
+    Stop the batch worker processes.
+    """
+    global _pool, _pool_catalog
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+        _pool_catalog = None
@@ -0,0 +1,399 @@
+"""
+Compiled program catalog - validates and normalizes the university catalog once per load.
+
+The raw catalog (see data/mock_universities.py) is a nested dictionary keyed by
+university and program name. Scoring only needs a handful of fields from it,
+so compile_catalog() flattens it into a column-oriented table: one row per
+program, with numeric columns stored in compact arrays and per-university
+metadata (ec_quality, co-op options) stored once and referenced by index.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+
+# Requirements containing these phrases ("One more U or M course") are generic
+# and never count as missing.
+GENERIC_REQUIREMENT_PHRASES = ("one more", "additional", "any u", "any m", "another")
+
+
+def parse_requirement(requirement):
+    """
+    Split a required-course string into its alternative course codes.
+    Returns None for generic requirements, e.g.
+    "ENG4U / EAE4U" -> ("ENG4U", "EAE4U"), "One more U course" -> None.
+    """
+    req_lower = requirement.lower()
+    if any(phrase in req_lower for phrase in GENERIC_REQUIREMENT_PHRASES):
+        return None
+    return tuple(alt.strip() for alt in requirement.split('/'))
+
+
+class CompiledCatalog:
+    """
+    Flat, read-only program table built by compile_catalog().
+
+    University columns (indexed by university id):
+        university_names, university_ec_quality, university_coop_options,
+        university_coop_yes, university_coop_no
+
+    Program columns (indexed by program id, grouped by university):
+        program_university, program_names, min_average, max_average,
+        required_courses, interests, requirement_group
+
+    Interest index: tag_postings maps each interest tag to the ids of the
+    programs carrying it, and tag_count holds each program's number of
+    distinct tags, so interest scores only touch the student's own tags.
+
+    Required-course index: every distinct course alternative gets a bit in
+    course_alternatives, each non-generic requirement becomes a bitmask of its
+    alternatives, and each distinct list of requirements is stored once in
+    requirement_groups (a tuple of masks) and referenced by requirement_group.
+    """
+
+    __slots__ = (
+        "version",
+        "shared_path",
+        "_shared_file",
+        "shared_band_tables",
+        "_source",
+        "_load_source",
+        "university_names",
+        "university_ec_quality",
+        "university_coop_options",
+        "university_coop_yes",
+        "university_coop_no",
+        "program_university",
+        "program_names",
+        "min_average",
+        "max_average",
+        "required_courses",
+        "interests",
+        "requirement_group",
+        "tag_postings",
+        "tag_count",
+        "course_alternatives",
+        "requirement_groups",
+        "_alternative_bits",
+        "_group_ids",
+        "_program_index",
+        "arrays",
+    )
+
+    def __init__(self, version=None, source=None):
+        self.version = version
+        # Set when the table is mapped from a shared file (services.shared_catalog),
+        # together with the open file holding its shared lock
+        self.shared_path = None
+        self._shared_file = None
+        # Band tables published with the shared generation (services.band_tables)
+        self.shared_band_tables = None
+        # The raw catalog dictionary this table was built from; tables mapped
+        # from a shared file decode it on first use through _load_source
+        self._source = source
+        self._load_source = None
+
+        self.university_names = []
+        self.university_ec_quality = array("d")
+        self.university_coop_options = []
+        self.university_coop_yes = array("b")
+        self.university_coop_no = array("b")
+
+        self.program_university = array("i")
+        self.program_names = []
+        self.min_average = array("d")
+        self.max_average = array("d")
+        self.required_courses = []
+        self.interests = []
+        self.requirement_group = array("i")
+        self.tag_postings = {}
+        self.tag_count = array("i")
+
+        self.course_alternatives = []
+        self.requirement_groups = []
+        self._alternative_bits = {}
+        self._group_ids = {}
+        # (university name, program name) -> program id, built by program_ids()
+        self._program_index = None
+
+        # NumPy column views, built lazily by services.vectorized
+        self.arrays = None
+
+    def __len__(self):
+        return len(self.program_names)
+
+    def __reduce_ex__(self, protocol):
+        # Shared tables are re-mapped from their file instead of being copied
+        if self.shared_path is not None:
+            from services.shared_catalog import open_catalog
+            return (open_catalog, (self.shared_path,))
+        return super().__reduce_ex__(protocol)
+
+    @property
+    def source(self):
+        if self._source is None and self._load_source is not None:
+            self._source = self._load_source()
+        return self._source
+
+    @property
+    def university_count(self):
+        return len(self.university_names)
+
+    def university_programs(self, uni_index):
+        """
+        Range of the program ids of one university (programs are grouped by
+        university in id order).
+        """
+        program_university = self.program_university
+        return range(bisect_left(program_university, uni_index), bisect_right(program_university, uni_index))
+
+    def program_ids(self, keys):
+        """
+        Ascending ids of the programs named by (university, program) pairs;
+        pairs that aren't in this table are skipped.
+        """
+        index = self._program_index
+        if index is None:
+            university_names = self.university_names
+            index = self._program_index = {
+                (university_names[uni_index], prog_name): prog_index
+                for prog_index, (uni_index, prog_name) in enumerate(zip(self.program_university, self.program_names))
+            }
+        return sorted({index[key] for key in keys if key in index})
+
+    def prefilter_ids(self, average=None, interests=None):
+        """
+        Ascending ids of the programs passing the coarse prefilters:
+        min average - 5 <= average, and/or at least one tag in interests.
+        Mirrors services.database.program_query, using the average column
+        and the tag postings.
+        """
+        program_ids = None
+        if interests is not None:
+            tagged = set()
+            for tag in set(interests):
+                tagged.update(self.tag_postings.get(tag, ()))
+            program_ids = sorted(tagged)
+        if average is not None:
+            min_average = self.min_average
+            if program_ids is None:
+                program_ids = range(len(self))
+            program_ids = [i for i in program_ids if min_average[i] <= average + 5]
+        return list(range(len(self))) if program_ids is None else program_ids
+
+    def select(self, program_ids):
+        """
+        Table holding only the given programs (ascending ids, so catalog order
+        and tie order are kept). University columns and the requirement index
+        are shared with this table; the tag postings are rebuilt for the
+        selected programs. The selection has no raw source.
+        """
+        subset = CompiledCatalog(version=None)
+        for name in ("university_names", "university_ec_quality", "university_coop_options",
+                     "university_coop_yes", "university_coop_no",
+                     "course_alternatives", "requirement_groups", "_alternative_bits", "_group_ids"):
+            setattr(subset, name, getattr(self, name))
+
+        subset.program_university = array("i", (self.program_university[i] for i in program_ids))
+        subset.program_names = [self.program_names[i] for i in program_ids]
+        subset.min_average = array("d", (self.min_average[i] for i in program_ids))
+        subset.max_average = array("d", (self.max_average[i] for i in program_ids))
+        subset.required_courses = [self.required_courses[i] for i in program_ids]
+        subset.interests = [self.interests[i] for i in program_ids]
+        subset.requirement_group = array("i", (self.requirement_group[i] for i in program_ids))
+        subset.tag_count = array("i", (self.tag_count[i] for i in program_ids))
+        for prog_index, tags in enumerate(subset.interests):
+            for tag in tags:
+                postings = subset.tag_postings.get(tag)
+                if postings is None:
+                    postings = subset.tag_postings[tag] = array("i")
+                postings.append(prog_index)
+        return subset
+
+    def _intern_requirements(self, required_courses):
+        """
+        Return the requirement group id for a program's required courses.
+        """
+        masks = []
+        for req in required_courses:
+            alternatives = parse_requirement(req)
+            if alternatives is None:
+                continue  # Generic requirements are never missing
+            mask = 0
+            for alt in alternatives:
+                bit = self._alternative_bits.get(alt)
+                if bit is None:
+                    bit = self._alternative_bits[alt] = 1 << len(self.course_alternatives)
+                    self.course_alternatives.append(alt)
+                mask |= bit
+            masks.append(mask)
+
+        group = tuple(masks)
+        group_id = self._group_ids.get(group)
+        if group_id is None:
+            group_id = self._group_ids[group] = len(self.requirement_groups)
+            self.requirement_groups.append(group)
+        return group_id
+
+    def match_courses(self, user_courses):
+        """
+        Bitmask of the course alternatives satisfied by a student's courses.
+        Uses the same containment rule as the scalar course check (either
+        string contained in the other), evaluated once per distinct alternative.
+        """
+        matched = 0
+        for alt, bit in self._alternative_bits.items():
+            for user_course in user_courses:
+                if alt in user_course or user_course in alt:
+                    matched |= bit
+                    break
+        return matched
+
+    def interest_matches(self, user_interests):
+        """
+        Number of the student's interests carried by each program, as a
+        {program id: matches} dictionary; programs not in it have no matches.
+        Walks only the postings of the student's (distinct) tags.
+        """
+        matches = {}
+        for tag in set(user_interests):
+            for prog_index in self.tag_postings.get(tag, ()):
+                matches[prog_index] = matches.get(prog_index, 0) + 1
+        return matches
+
+    def missing_course_counts(self, user_courses):
+        """
+        Number of unmet (non-generic) requirements for every requirement group.
+        """
+        matched = self.match_courses(user_courses)
+        return [sum(1 for mask in group if not mask & matched) for group in self.requirement_groups]
+
+
+def _compile_program(catalog, uni_index, uni_name, prog_name, details):
+    """
+    Validate one program entry and append it to the program columns.
+    """
+    if not isinstance(details, dict):
+        raise ValueError(f"Program '{prog_name}' at university '{uni_name}' must be a dictionary, got {type(details)}")
+
+    if 'recommended_average' not in details:
+        raise KeyError(f"Program '{prog_name}' at university '{uni_name}' missing 'recommended_average'")
+
+    recommended_avg = details['recommended_average']
+    if not isinstance(recommended_avg, list):
+        raise ValueError(
+            f"Program '{prog_name}' at university '{uni_name}': "
+            f"'recommended_average' must be a list, got {type(recommended_avg)}"
+        )
+
+    if len(recommended_avg) == 1:
+        recommended_avg = [recommended_avg[0] - 2, recommended_avg[0] + 2]
+
+    if len(recommended_avg) < 2:
+        raise ValueError(
+            f"Program '{prog_name}' at university '{uni_name}': "
+            f"'recommended_average' must have at least 2 elements (min and max), "
+            f"got {len(recommended_avg)} elements: {recommended_avg}"
+        )
+
+    required_courses = details.get('required_courses', [])
+    if not isinstance(required_courses, list):
+        raise ValueError(
+            f"Program '{prog_name}' at university '{uni_name}': "
+            f"'required_courses' must be a list, got {type(required_courses)}"
+        )
+
+    # Interest tags are stored as 'interest_fields' in the catalog documents
+    # and as 'interests' by older data; accept both.
+    tags = []
+    for field in ('interests', 'interest_fields'):
+        values = details.get(field, [])
+        if not isinstance(values, list):
+            raise ValueError(
+                f"Program '{prog_name}' at university '{uni_name}': "
+                f"'{field}' must be a list, got {type(values)}"
+            )
+        tags.extend(values)
+    tags = tuple(dict.fromkeys(tags))  # Distinct, in first-seen order
+
+    # Convert everything first so a bad value can't leave the columns misaligned
+    min_avg = float(recommended_avg[0])
+    max_avg = float(recommended_avg[1])
+    courses = tuple(str(course) for course in required_courses)
+    group_id = catalog._intern_requirements(courses)
+
+    prog_index = len(catalog.program_names)
+    for tag in tags:
+        postings = catalog.tag_postings.get(tag)
+        if postings is None:
+            postings = catalog.tag_postings[tag] = array("i")
+        postings.append(prog_index)
+
+    catalog.program_university.append(uni_index)
+    catalog.program_names.append(prog_name)
+    catalog.min_average.append(min_avg)
+    catalog.max_average.append(max_avg)
+    catalog.required_courses.append(courses)
+    catalog.requirement_group.append(group_id)
+    catalog.interests.append(tags)
+    catalog.tag_count.append(len(tags))
+
+
+def compile_catalog(university_db, version=None):
+    """
+    Validate and normalize a raw university catalog into a CompiledCatalog.
+
+    Raises ValueError describing the first bad university or program, so a
+    broken catalog document is rejected when it is loaded rather than while
+    scoring a live request.
+    """
+    catalog = CompiledCatalog(version=version, source=university_db)
+
+    for uni_name, uni_data in university_db.items():
+        if not isinstance(uni_data, dict):
+            raise ValueError(f"University '{uni_name}' must be a dictionary, got {type(uni_data)}")
+
+        # Validate university-level fields
+        if 'ec_quality' not in uni_data:
+            raise ValueError(f"University '{uni_name}' missing required field 'ec_quality'. Available fields: {list(uni_data.keys())}")
+
+        if 'co-op' not in uni_data:
+            raise ValueError(f"University '{uni_name}' missing required field 'co-op'. Available fields: {list(uni_data.keys())}")
+
+        if 'programs' not in uni_data:
+            raise ValueError(f"University '{uni_name}' missing required field 'programs'. Available fields: {list(uni_data.keys())}")
+
+        ec_quality = uni_data['ec_quality']
+        if isinstance(ec_quality, bool) or not isinstance(ec_quality, (int, float)):
+            raise ValueError(f"University '{uni_name}': 'ec_quality' must be a number, got {type(ec_quality)}")
+
+        coop_options = uni_data['co-op']
+        if not isinstance(coop_options, list):
+            raise ValueError(f"University '{uni_name}': 'co-op' must be a list, got {type(coop_options)}")
+
+        programs = uni_data['programs']
+        if not isinstance(programs, dict):
+            raise ValueError(f"University '{uni_name}': 'programs' must be a dictionary, got {type(programs)}")
+
+        uni_index = len(catalog.university_names)
+        catalog.university_names.append(uni_name)
+        catalog.university_ec_quality.append(ec_quality)
+        catalog.university_coop_options.append(tuple(coop_options))
+        catalog.university_coop_yes.append("yes" in coop_options)
+        catalog.university_coop_no.append("no" in coop_options)
+
+        for prog_name, details in programs.items():
+            try:
+                _compile_program(catalog, uni_index, uni_name, prog_name, details)
+            except (KeyError, ValueError, IndexError, TypeError) as e:
+                # Provide detailed error information
+                if not isinstance(details, dict):
+                    details = {}
+                raise ValueError(
+                    f"Error processing program '{prog_name}' at university '{uni_name}': {e}. "
+                    f"Available fields: {list(details.keys())}. "
+                    f"recommended_average value: {details.get('recommended_average', 'MISSING')}. "
+                    f"recommended_average type: {type(details.get('recommended_average', None))}"
+                ) from e
+
+    return catalog
+
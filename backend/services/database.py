@@ -1,10 +1,18 @@
 """
 Database connection module for MongoDB.
 """
+import logging
 import os
+import threading
+import time
 from pathlib import Path
 from pymongo import MongoClient
+from pymongo.errors import PyMongoError
 from dotenv import load_dotenv
+from services.catalog import compile_catalog
+from services.snapshot import read_snapshot
+from services import shared_catalog
+from services.metrics import Counter, register, register_collector, stage, timed
 
 # Load environment variables
 backend_dir = Path(__file__).parent.parent
@@ -13,13 +21,73 @@ load_dotenv(dotenv_path=str(env_path))
 
 # MongoDB configuration
 MONGODB_URI = os.getenv("MONGODB_URI")
+# How long to look for a server before an operation fails (pymongo's default is 30s)
+MONGODB_TIMEOUT_MS = int(os.getenv("MONGODB_TIMEOUT_MS", "30000"))
+# Local catalog snapshot written by the loader (python -m services.loader).
+# Used instead of MongoDB when MONGODB_URI is unset, and to cold-start when
+# MongoDB is unreachable.
+CATALOG_SNAPSHOT_PATH = os.getenv("CATALOG_SNAPSHOT_PATH")
 DATABASE_NAME = "university_admission_information"
 COLLECTION_NAME = "ontario_universities"
+PROGRAMS_COLLECTION_NAME = "ontario_programs"
+META_COLLECTION_NAME = "catalog_meta"
+CATALOG_VERSION_ID = "catalog_version"
+
+# Catalog storage layout:
+#   "university" - one document per university in ontario_universities
+#                  (the shape of data/mock_universities.py)
+#   "program"    - one normalized document per program in ontario_programs,
+#                  which supports projections, indexes and filter pushdown
+CATALOG_LAYOUT = os.getenv("CATALOG_LAYOUT", "university").lower()
+
+# Fields the scorer reads from a program document
+PROGRAM_PROJECTION = {
+    "_id": 0,
+    "university": 1,
+    "program": 1,
+    "ec_quality": 1,
+    "co-op": 1,
+    "recommended_average": 1,
+    "interest_fields": 1,
+    "interests": 1,
+    "required_courses": 1,
+}
+# Fields identifying a program document
+PROGRAM_KEY_PROJECTION = {"_id": 0, "university": 1, "program": 1}
+
+# Seconds a cached catalog is served before the version probe runs again.
+# 0 re-checks the version on every request (still skipping the full fetch).
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "300"))
+# Past the TTL the last snapshot keeps being served while one background
+# refresh runs, until it is this many seconds old; after that requests wait
+# for the refresh.
+CATALOG_MAX_STALENESS = float(os.getenv("CATALOG_MAX_STALENESS", "3600"))
+# If a refresh fails (e.g. during a Mongo failover), the last snapshot is
+# still served until it is this many seconds old.
+CATALOG_STALE_IF_ERROR = float(os.getenv("CATALOG_STALE_IF_ERROR", "86400"))
+# Minimum seconds between background refresh attempts after a failure.
+CATALOG_RETRY_INTERVAL = float(os.getenv("CATALOG_RETRY_INTERVAL", "5"))
+
+logger = logging.getLogger(__name__)
 
 # Global client and database instances
 _client = None
 _database = None
 
+# Process-level catalog cache. _catalog_lock guards the fields below and is
+# only held briefly; _refresh_lock makes sure a single thread talks to Mongo.
+_catalog_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_catalog = None  # CompiledCatalog; the raw dictionary is _catalog.source
+_catalog_checked_at = 0.0
+_catalog_generation = 0
+_refresh_pending = False
+_retry_after = 0.0
+_last_refresh_error = None  # Why the last refresh failed, until one succeeds
+_fallback_catalog = None  # Snapshot catalog served once _catalog is too stale
+
+CATALOG_REFRESH_FAILURES = register(Counter(
+    "catalog_refresh_failures_total", "Catalog refreshes that failed (the last snapshot was kept)"))
 
 def get_database():
     """
@@ -31,7 +99,12 @@ def get_database():
         if not MONGODB_URI:
             raise ValueError("MONGODB_URI environment variable is not set")
         
-        _client = MongoClient(MONGODB_URI)
+        if MONGODB_URI.startswith("mongomock://"):
+            # In-memory stand-in for local runs and tests (pip install mongomock)
+            import mongomock
+            _client = mongomock.MongoClient("mongodb://" + MONGODB_URI[len("mongomock://"):])
+        else:
+            _client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=MONGODB_TIMEOUT_MS)
         _database = _client[DATABASE_NAME]
     
     return _database
@@ -45,6 +118,142 @@ def get_universities_collection():
     return db[COLLECTION_NAME]
 
 
+def get_programs_collection():
+    """
+    Get the ontario_programs collection (one document per program).
+    """
+    db = get_database()
+    return db[PROGRAMS_COLLECTION_NAME]
+
+
+def _catalog_collection():
+    """
+    The collection holding the catalog for the configured CATALOG_LAYOUT.
+    """
+    if CATALOG_LAYOUT == "program":
+        return get_programs_collection()
+    return get_universities_collection()
+
+
+def university_to_program_documents(university_db):
+    """
+    Flatten a university catalog into one document per program:
+    {
+        "university": str, "program": str,
+        "ec_quality": int, "co-op": [...],   # copied from the university
+        "recommended_average": [min, max],
+        "min_average": float,                # indexed, for average-band queries
+        "interest_fields": [...],            # indexed (multikey)
+        "required_courses": [...],
+        "required_course_codes": [...]       # "/" alternatives split out, indexed
+    }
+    """
+    documents = []
+    for uni_name, uni_data in university_db.items():
+        for prog_name, details in uni_data['programs'].items():
+            recommended_avg = details.get('recommended_average', [])
+            if len(recommended_avg) == 1:
+                recommended_avg = [recommended_avg[0] - 2, recommended_avg[0] + 2]
+            required_courses = details.get('required_courses', [])
+
+            document = {
+                "university": uni_name,
+                "program": prog_name,
+                "ec_quality": uni_data['ec_quality'],
+                "co-op": uni_data['co-op'],
+                "recommended_average": details.get('recommended_average'),
+                "min_average": recommended_avg[0] if recommended_avg else None,
+                "interest_fields": details.get('interest_fields', []),
+                "required_courses": required_courses,
+                "required_course_codes": sorted({
+                    alt.strip() for req in required_courses for alt in req.split('/')
+                }),
+            }
+            if 'interests' in details:
+                document['interests'] = details['interests']
+            documents.append(document)
+    return documents
+
+
+def programs_to_university_db(documents):
+    """
+    Reassemble program documents into the university catalog structure.
+    """
+    university_db = {}
+    for doc in documents:
+        uni_data = university_db.get(doc['university'])
+        if uni_data is None:
+            uni_data = university_db[doc['university']] = {
+                "ec_quality": doc['ec_quality'],
+                "co-op": doc['co-op'],
+                "programs": {},
+            }
+        details = {
+            "recommended_average": doc['recommended_average'],
+            "interest_fields": doc.get('interest_fields', []),
+            "required_courses": doc.get('required_courses', []),
+        }
+        if 'interests' in doc:
+            details['interests'] = doc['interests']
+        uni_data['programs'][doc['program']] = details
+    return university_db
+
+
+def ensure_program_indexes():
+    """
+    Create the indexes used by program-layout queries (idempotent).
+    """
+    collection = get_programs_collection()
+    collection.create_index([("university", 1), ("program", 1)], unique=True)
+    collection.create_index("min_average")
+    collection.create_index("interest_fields")
+    collection.create_index("required_course_codes")
+
+
+def program_query(average=None, interests=None):
+    """
+    Mongo filter for the coarse prefilters on program documents:
+    average   - only programs within reach, i.e. min average - 5 <= average
+    interests - only programs tagged with at least one of these interests
+    """
+    query = {}
+    if average is not None:
+        query["min_average"] = {"$lte": average + 5}
+    if interests is not None:
+        interests = list(interests)
+        query["$or"] = [{"interest_fields": {"$in": interests}}, {"interests": {"$in": interests}}]
+    return query
+
+
+def fetch_program_documents(query=None):
+    """
+    Fetch program documents, projected down to the fields the scorer reads.
+    """
+    return list(get_programs_collection().find(query or {}, projection=PROGRAM_PROJECTION))
+
+
+def prefilter_pushdown_available():
+    """
+    True if prefilters can be queried in MongoDB: the catalog is stored in
+    the program layout and no refresh failed in the last
+    CATALOG_RETRY_INTERVAL seconds (so requests don't wait on a server
+    that's down).
+    """
+    return CATALOG_LAYOUT == "program" and bool(MONGODB_URI) and recent_refresh_failure() is None
+
+
+@timed("fetch")
+def fetch_prefiltered_program_keys(average=None, interests=None):
+    """
+    (university, program) names of the programs passing the coarse
+    prefilters (see program_query). The filter runs in MongoDB against the
+    program-layout indexes and only the two name fields are returned.
+    """
+    cursor = get_programs_collection().find(program_query(average, interests), projection=PROGRAM_KEY_PROJECTION)
+    return [(doc['university'], doc['program']) for doc in cursor]
+
+
+@timed("fetch")
 def fetch_university_data():
     """
     Fetch all university data from MongoDB and transform it to match the expected structure.
@@ -67,12 +276,27 @@ def fetch_university_data():
     }
     
     OR the entire database might be stored as a single document with all universities.
+    
+    With CATALOG_LAYOUT=program the catalog is read from the per-program
+    documents instead (see university_to_program_documents).
     """
+    if CATALOG_LAYOUT == "program":
+        documents = fetch_program_documents()
+        if not documents:
+            raise ValueError("No documents found in the MongoDB collection")
+        return programs_to_university_db(documents)
+    
     collection = get_universities_collection()
     
     # Fetch all documents from the collection
-    documents = list(collection.find({}))
-    
+    return university_documents_to_db(list(collection.find({})))
+
+
+def university_documents_to_db(documents):
+    """
+    Merge university-layout documents into the university catalog structure.
+    Raises ValueError if there are none, or none of them holds a university.
+    """
     if not documents:
         raise ValueError("No documents found in the MongoDB collection")
     
@@ -96,6 +320,338 @@ def fetch_university_data():
     return university_db
 
 
+@timed("version_probe")
+def get_catalog_version():
+    """
+    Cheap probe for whether the catalog has changed, without fetching it.
+
+    Prefers the version document in the catalog_meta collection
+    ({"_id": "catalog_version", "version": ..., "updated_at": ...}), which
+    writers bump on every load. Falls back to the collection's document count
+    plus its newest ObjectId, which catches inserts and deletes but not
+    in-place updates.
+    """
+    meta = get_database()[META_COLLECTION_NAME].find_one({"_id": CATALOG_VERSION_ID})
+    if meta is not None:
+        return meta_version(meta)
+
+    collection = _catalog_collection()
+    count = collection.count_documents({})
+    newest = collection.find_one({}, projection={"_id": 1}, sort=[("_id", -1)])
+    return probe_version(count, newest)
+
+
+def meta_version(meta):
+    """
+    Catalog version string for a catalog_meta version document.
+    """
+    return f"v:{meta.get('version')}:{meta.get('updated_at')}"
+
+
+def probe_version(count, newest):
+    """
+    Fallback catalog version string from the catalog collection's document
+    count and newest document ({"_id": ...} or None).
+    """
+    return f"probe:{count}:{newest['_id'] if newest else None}"
+
+
+def _load_catalog(version, fetch):
+    """
+    Compile the catalog returned by fetch() for a version. With
+    CATALOG_SHARED_DIR set, the compiled table is shared between worker
+    processes: it's mapped from the published generation if another worker
+    already loaded this version, and published for the others otherwise.
+    """
+    def build():
+        university_db = fetch()
+        with stage("compile"):
+            return compile_catalog(university_db, version=version)
+
+    if shared_catalog.CATALOG_SHARED_DIR:
+        return shared_catalog.load_or_publish(version, build)
+    return build()
+
+
+def _snapshot_catalog(current):
+    """
+    Compile the catalog from CATALOG_SNAPSHOT_PATH, reusing current if the
+    snapshot file hasn't changed since it was loaded.
+    """
+    mtime = os.stat(CATALOG_SNAPSHOT_PATH).st_mtime_ns
+    if current is not None and current.version is not None and current.version.startswith(f"snapshot:{mtime}:"):
+        return current
+
+    university_db, header = read_snapshot(CATALOG_SNAPSHOT_PATH)
+    version = f"snapshot:{mtime}:{header.get('catalog_version')}"
+    return _load_catalog(version, lambda: university_db)
+
+
+def _snapshot_available():
+    """
+    True if CATALOG_SNAPSHOT_PATH points at an existing file.
+    """
+    return bool(CATALOG_SNAPSHOT_PATH) and os.path.exists(CATALOG_SNAPSHOT_PATH)
+
+
+def _cold_start_catalog(error):
+    """
+    The catalog to start from while MongoDB is unreachable (error): the
+    generation other workers published last with CATALOG_SHARED_DIR set, or
+    else the local snapshot. Re-raises error if there's neither.
+    """
+    if shared_catalog.CATALOG_SHARED_DIR:
+        catalog = shared_catalog.open_current()
+        if catalog is not None:
+            logger.warning("MongoDB unreachable (%s); starting from shared catalog %s", error, catalog.version)
+            return catalog
+    if not _snapshot_available():
+        raise error
+    logger.warning("MongoDB unreachable (%s); starting from the catalog snapshot", error)
+    return _snapshot_catalog(None)
+
+
+def _refresh_catalog():
+    """
+    Reload the catalog if its version changed. Caller must hold _refresh_lock.
+    """
+    with _catalog_lock:
+        catalog, generation = _catalog, _catalog_generation
+
+    if not MONGODB_URI and _snapshot_available():
+        # No database configured: the local snapshot is the catalog
+        catalog = _snapshot_catalog(catalog)
+    else:
+        try:
+            version = get_catalog_version()
+        except PyMongoError as e:
+            if catalog is not None:
+                raise
+            version = None
+            catalog = _cold_start_catalog(e)
+
+        if version is not None and (catalog is None or version != catalog.version):
+            # Validation happens here, so a bad document fails the load (and the
+            # last good snapshot stays in place) instead of failing requests.
+            catalog = _load_catalog(version, fetch_university_data)
+
+    install_catalog(catalog, generation)
+    return catalog
+
+
+def catalog_state():
+    """
+    (catalog, checked_at, generation) of the process catalog cache. Pass the
+    generation to install_catalog() after refreshing outside this module.
+    """
+    with _catalog_lock:
+        return _catalog, _catalog_checked_at, _catalog_generation
+
+
+def install_catalog(catalog, generation):
+    """
+    Store a freshly checked catalog, unless the cache was invalidated since
+    generation was read (so an invalidated catalog isn't resurrected).
+    """
+    global _catalog, _catalog_checked_at, _retry_after, _last_refresh_error, _fallback_catalog
+    with _catalog_lock:
+        if generation == _catalog_generation:
+            _catalog = catalog
+            _catalog_checked_at = time.monotonic()
+            _retry_after = 0.0
+            _last_refresh_error = None
+            _fallback_catalog = None
+
+
+def _claim_refresh_locked(now):
+    """
+    True if the caller should start the background refresh. Caller must
+    hold _catalog_lock.
+    """
+    global _refresh_pending
+    if now < _retry_after or _refresh_pending:
+        return False
+    _refresh_pending = True
+    return True
+
+
+def claim_background_refresh():
+    """
+    Claim the single background refresh slot; call release_background_refresh()
+    when the refresh is done. Used by refreshers outside this module
+    (services.async_database) so only one refresh runs at a time.
+    """
+    with _catalog_lock:
+        return _claim_refresh_locked(time.monotonic())
+
+
+def release_background_refresh(error=None):
+    """
+    Release the slot taken by claim_background_refresh(). Pass the exception
+    of a failed refresh; it's recorded with record_refresh_failure().
+    """
+    global _refresh_pending
+    if error is not None:
+        record_refresh_failure(error)
+    with _catalog_lock:
+        _refresh_pending = False
+
+
+def record_refresh_failure(error):
+    """
+    Count a failed refresh and hold off further attempts, background or
+    blocking, for CATALOG_RETRY_INTERVAL seconds.
+    """
+    global _retry_after, _last_refresh_error
+    CATALOG_REFRESH_FAILURES.inc()
+    with _catalog_lock:
+        _retry_after = time.monotonic() + CATALOG_RETRY_INTERVAL
+        _last_refresh_error = error
+
+
+def recent_refresh_failure():
+    """
+    The error of a refresh that failed less than CATALOG_RETRY_INTERVAL
+    seconds ago, or None if a refresh may be attempted.
+    """
+    with _catalog_lock:
+        if time.monotonic() < _retry_after:
+            return _last_refresh_error or RuntimeError("Catalog refresh failed")
+        return None
+
+
+def serve_after_failure(catalog, checked_at, error):
+    """
+    The last snapshot if it's younger than CATALOG_STALE_IF_ERROR, otherwise
+    the local snapshot file if there is one, otherwise raise error: what a
+    request gets while the catalog can't be refreshed.
+    """
+    global _fallback_catalog
+    if catalog is not None and time.monotonic() - checked_at < CATALOG_STALE_IF_ERROR:
+        return catalog
+    if not _snapshot_available():
+        raise error
+    with _catalog_lock:
+        fallback = _fallback_catalog
+    fallback = _snapshot_catalog(fallback)
+    with _catalog_lock:
+        _fallback_catalog = fallback
+    return fallback
+
+
+def _background_refresh():
+    """
+    Refresh the catalog in a background thread; failures keep the old snapshot.
+    """
+    error = None
+    try:
+        if not _refresh_lock.acquire(blocking=False):
+            return  # A blocking refresh is already running
+        try:
+            _refresh_catalog()
+        except Exception as e:
+            logger.exception("Background catalog refresh failed; serving the last snapshot")
+            error = e
+        finally:
+            _refresh_lock.release()
+    finally:
+        release_background_refresh(error)
+
+
+def _blocking_refresh(seen_checked_at):
+    """
+    Refresh the catalog while the caller waits. Only one thread fetches; the
+    others wait for it and reuse its result. If it fails, the threads queued
+    behind it (and new requests, for CATALOG_RETRY_INTERVAL seconds) don't
+    probe MongoDB again: they get the last snapshot or the error right away.
+    """
+    with _refresh_lock:
+        with _catalog_lock:
+            catalog, checked_at = _catalog, _catalog_checked_at
+        if catalog is not None and checked_at > seen_checked_at:
+            return catalog  # Refreshed while we were waiting
+
+        error = recent_refresh_failure()
+        if error is not None:
+            return serve_after_failure(catalog, checked_at, error)
+
+        try:
+            return _refresh_catalog()
+        except Exception as e:
+            record_refresh_failure(e)
+            catalog = serve_after_failure(catalog, checked_at, e)
+            logger.exception("Catalog refresh failed; serving the last snapshot")
+            return catalog
+
+
+def get_cached_catalog():
+    """
+    Return the compiled catalog (services.catalog.CompiledCatalog), fetching
+    and compiling it from MongoDB only when needed.
+
+    The catalog is kept per process. Within CATALOG_CACHE_TTL seconds of the
+    last check it is returned as-is. After that the last snapshot keeps being
+    returned while a single background thread runs the version probe (and the
+    full fetch, if the version changed), up to CATALOG_MAX_STALENESS. Only a
+    cold or too-stale cache makes the caller wait, and then one thread does
+    the fetch for everyone. The returned catalog is shared between requests
+    and must not be mutated.
+    """
+    with _catalog_lock:
+        catalog, checked_at = _catalog, _catalog_checked_at
+        now = time.monotonic()
+        age = now - checked_at
+
+        if catalog is not None and age < CATALOG_CACHE_TTL:
+            return catalog
+
+        if catalog is not None and age < CATALOG_MAX_STALENESS:
+            if _claim_refresh_locked(now):
+                threading.Thread(target=_background_refresh, name="catalog-refresh", daemon=True).start()
+            return catalog
+
+    return _blocking_refresh(checked_at)
+
+
+def get_cached_university_data():
+    """
+    Return the raw university catalog dictionary, cached like get_cached_catalog().
+    The returned dictionary is shared between requests and must not be mutated.
+    """
+    return get_cached_catalog().source
+
+
+def invalidate_catalog_cache():
+    """
+    Drop the cached catalog so the next read fetches it from MongoDB.
+    """
+    global _catalog, _catalog_checked_at, _catalog_generation, _retry_after, _last_refresh_error, _fallback_catalog
+    with _catalog_lock:
+        _catalog = None
+        _fallback_catalog = None
+        _catalog_checked_at = 0.0
+        _catalog_generation += 1
+        _retry_after = 0.0
+        _last_refresh_error = None
+
+
+@register_collector
+def _catalog_metrics():
+    """
+    Size and age of the cached catalog, read when /metrics is rendered.
+    """
+    with _catalog_lock:
+        catalog, checked_at = _catalog, _catalog_checked_at
+    if catalog is None:
+        return []
+    return [
+        ("catalog_programs", "gauge", "Programs in the cached catalog", len(catalog)),
+        ("catalog_universities", "gauge", "Universities in the cached catalog", catalog.university_count),
+        ("catalog_checked_age_seconds", "gauge", "Seconds since the catalog version was last checked",
+         round(time.monotonic() - checked_at, 3)),
+    ]
+
+
 def close_connection():
     """
     Close MongoDB connection.
@@ -105,4 +661,5 @@ def close_connection():
         _client.close()
         _client = None
         _database = None
+    invalidate_catalog_cache()
 
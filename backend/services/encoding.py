@@ -0,0 +1,167 @@
+"""
+Response encoding - fast JSON, the columnar ranking format and compression.
+
+dumps() uses orjson when it's installed (pip install "backend[fast]") and
+falls back to the standard json module. The columnar format sends a ranking
+as parallel arrays, with university and program names stored once and
+referenced by index:
+
+    {
+        "format": "columnar",
+        "universities": ["University of Waterloo", ...],
+        "programs": ["Software Engineering", ...],
+        "columns": {
+            "university": [0, ...],   # index into "universities"
+            "program": [0, ...],      # index into "programs"
+            "score": [...], "academic": [...], "interest": [...],
+            "ec": [...], "coop_fit": [...]
+        }
+    }
+
+The ndjson format streams a ranking as newline-delimited JSON: a header
+line first, then one row per line in rank order.
+
+Responses are compressed with brotli (if installed) or gzip when the client
+accepts it and the body is large enough to be worth it.
+"""
+
+import gzip
+import json
+import os
+
+try:
+    import orjson
+except ImportError:  # orjson is an optional dependency
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # brotli is an optional dependency
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+# Streamed NDJSON rows are sent in chunks of about this many bytes
+NDJSON_CHUNK_BYTES = int(os.getenv("NDJSON_CHUNK_BYTES", "65536"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "5"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+RESPONSE_FORMATS = ("rows", "columnar", "ndjson")
+BREAKDOWN_FIELDS = ("academic", "interest", "ec", "coop_fit")
+
+
+def dumps(value):
+    """
+    Compact JSON encoding of value as UTF-8 bytes.
+    """
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def columnar_rankings(rankings):
+    """
+    Convert ranking rows to the columnar format (see module docstring).
+    """
+    universities, university_ids = [], {}
+    programs, program_ids = [], {}
+    columns = {name: [] for name in ("university", "program", "score") + BREAKDOWN_FIELDS}
+    university_column, program_column = columns["university"], columns["program"]
+    score_column = columns["score"]
+    breakdown_columns = [(field, columns[field]) for field in BREAKDOWN_FIELDS]
+
+    for row in rankings:
+        uni_name = row["university"]
+        uni_id = university_ids.get(uni_name)
+        if uni_id is None:
+            uni_id = university_ids[uni_name] = len(universities)
+            universities.append(uni_name)
+
+        prog_name = row["program"]
+        prog_id = program_ids.get(prog_name)
+        if prog_id is None:
+            prog_id = program_ids[prog_name] = len(programs)
+            programs.append(prog_name)
+
+        university_column.append(uni_id)
+        program_column.append(prog_id)
+        score_column.append(row["score"])
+        breakdown = row["breakdown"]
+        for field, column in breakdown_columns:
+            column.append(breakdown[field])
+
+    return {"format": "columnar", "universities": universities, "programs": programs, "columns": columns}
+
+
+def ndjson_lines(header, rows, chunk_bytes=None):
+    """
+    Encode a header object and then each row as newline-delimited JSON.
+    The header is yielded on its own so clients get it as soon as possible;
+    rows are grouped into chunks of about chunk_bytes (NDJSON_CHUNK_BYTES).
+    """
+    chunk_bytes = NDJSON_CHUNK_BYTES if chunk_bytes is None else chunk_bytes
+    yield dumps(header) + b"\n"
+
+    chunk, size = [], 0
+    for row in rows:
+        line = dumps(row) + b"\n"
+        chunk.append(line)
+        size += len(line)
+        if size >= chunk_bytes:
+            yield b"".join(chunk)
+            chunk, size = [], 0
+    if chunk:
+        yield b"".join(chunk)
+
+
+def parse_accept_encoding(header):
+    """
+    {coding: q} for an Accept-Encoding header value.
+    """
+    accepted = {}
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def choose_encoding(accept_encoding):
+    """
+    Best supported content coding for an Accept-Encoding header, or None
+    for identity. Prefers brotli, then gzip, at equal quality.
+    """
+    accepted = parse_accept_encoding(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    best, best_q = None, 0.0
+    for coding in ("br", "gzip"):
+        if coding == "br" and brotli is None:
+            continue
+        q = accepted.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(body, accept_encoding):
+    """
+    (body, content coding or None) for a response body, compressed if the
+    client accepts it and the body is at least COMPRESS_MIN_BYTES long.
+    """
+    if len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    coding = choose_encoding(accept_encoding)
+    if coding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY), coding
+    if coding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0), coding
+    return body, None
@@ -0,0 +1,237 @@
+"""
+Recommendation filters - restrict a ranking to part of the catalog before scoring.
+
+A request narrows the catalog with coarse prefilters on the student's own
+profile, catalog filters, or both:
+
+    "prefilter": {
+        "reachable": true,       # min average - 5 is at or below the student's average
+        "interests": true        # tagged with at least one of the student's interests
+    },
+    "filters": {
+        "universities": ["University of Waterloo", ...],  # only these universities
+        "coop": true,            # true: universities offering co-op,
+                                 # false: universities offering non-co-op study
+        "interests": ["Computer Science", ...],  # tagged with at least one of these
+        "average_band": 5,       # recommended average range overlaps the
+                                 # student's average +/- this many points
+        "min_score": 60          # drop programs scoring below this
+    }
+
+Both are resolved to program ids and intersected by narrow_catalog(), which
+selects the programs from the compiled table once; only they are scored, so
+scores are normalized over the narrowed set. Catalog filters use the
+compiled catalog's indexes (university names, the per-university co-op
+flags, the tag postings and the average columns). Prefilters are pushed down
+to MongoDB when the catalog is stored in the program layout, and resolved
+from the average column and tag postings otherwise. min_score applies to
+normalized scores and is folded into the ranking's own min_score. Selections
+are cached per catalog version, so repeated dashboard views skip the index
+lookups and the MongoDB query.
+"""
+
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from pymongo.errors import PyMongoError
+
+from services.database import fetch_prefiltered_program_keys, prefilter_pushdown_available
+from services.metrics import timed
+
+# Maximum cached program selections (0 disables the cache)
+FILTER_CACHE_SIZE = int(os.getenv("FILTER_CACHE_SIZE", "32"))
+
+FILTER_FIELDS = ("universities", "coop", "interests", "average_band", "min_score")
+PREFILTER_FLAGS = ("reachable", "interests")
+
+logger = logging.getLogger(__name__)
+
+
+def _string_list(value, name):
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise ValueError(f"'filters.{name}' must be a list of strings")
+    return sorted(set(value))
+
+
+def parse_prefilter(value):
+    """
+    Validate a prefilter object (see module docstring). Returns None if no
+    flag is set. Raises ValueError if malformed.
+    """
+    if value is None:
+        return None
+    if not isinstance(value, dict) or set(value) - set(PREFILTER_FLAGS):
+        raise ValueError("'prefilter' must be an object with optional 'reachable' and 'interests' flags")
+    if not all(isinstance(flag, bool) for flag in value.values()):
+        raise ValueError("'prefilter' flags must be booleans")
+    return value if any(value.values()) else None
+
+
+def parse_filters(value):
+    """
+    Validate a filters object (see module docstring) into canonical form:
+    string lists de-duplicated and sorted, so equal filters compare and hash
+    equal. Returns None if there is nothing to filter on.
+    Raises ValueError if malformed.
+    """
+    if value is None:
+        return None
+    if not isinstance(value, dict) or set(value) - set(FILTER_FIELDS):
+        raise ValueError(f"'filters' must be an object with optional {', '.join(FILTER_FIELDS)}")
+
+    filters = {}
+    for name in ("universities", "interests"):
+        if value.get(name) is not None:
+            filters[name] = _string_list(value[name], name)
+    if value.get('coop') is not None:
+        if not isinstance(value['coop'], bool):
+            raise ValueError("'filters.coop' must be a boolean")
+        filters['coop'] = value['coop']
+    for name in ("average_band", "min_score"):
+        number = value.get(name)
+        if number is None:
+            continue
+        if isinstance(number, bool) or not isinstance(number, (int, float)):
+            raise ValueError(f"'filters.{name}' must be a number")
+        filters[name] = number
+    if filters.get('average_band', 0) < 0:
+        raise ValueError("'filters.average_band' must not be negative")
+    return filters or None
+
+
+def resolve_filters(catalog, filters, average):
+    """
+    Ascending ids of the programs passing the catalog filters (everything
+    but min_score) for a student with the given average.
+    """
+    university_ids = None
+    if 'universities' in filters:
+        index = {name: uni_index for uni_index, name in enumerate(catalog.university_names)}
+        university_ids = {index[name] for name in filters['universities'] if name in index}
+    if 'coop' in filters:
+        offers = catalog.university_coop_yes if filters['coop'] else catalog.university_coop_no
+        coop_ids = {uni_index for uni_index in range(catalog.university_count) if offers[uni_index]}
+        university_ids = coop_ids if university_ids is None else university_ids & coop_ids
+
+    program_ids = None
+    if university_ids is not None:
+        program_ids = [i for uni_index in sorted(university_ids) for i in catalog.university_programs(uni_index)]
+
+    if 'interests' in filters:
+        tagged = set()
+        for tag in filters['interests']:
+            tagged.update(catalog.tag_postings.get(tag, ()))
+        program_ids = sorted(tagged) if program_ids is None else [i for i in program_ids if i in tagged]
+
+    if 'average_band' in filters:
+        low = average - filters['average_band']
+        high = average + filters['average_band']
+        min_average, max_average = catalog.min_average, catalog.max_average
+        if program_ids is None:
+            program_ids = range(len(catalog))
+        program_ids = [i for i in program_ids if min_average[i] <= high and max_average[i] >= low]
+
+    return list(range(len(catalog))) if program_ids is None else program_ids
+
+
+def resolve_prefilter(catalog, average=None, interests=None):
+    """
+    Ascending ids of the programs passing the prefilters (average: reachable
+    from it, interests: tagged with one of them), queried in MongoDB when
+    the program layout allows it and from the catalog indexes otherwise.
+    """
+    if prefilter_pushdown_available():
+        try:
+            return catalog.program_ids(fetch_prefiltered_program_keys(average, interests))
+        except PyMongoError as e:
+            logger.warning("Prefilter query failed (%s); filtering the cached catalog", e)
+    return catalog.prefilter_ids(average, interests)
+
+
+class _SelectionCache:
+    """
+    Thread-safe LRU of narrowed tables keyed by catalog version and criteria.
+    """
+
+    def __init__(self, max_entries=FILTER_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            subset = self._entries.get(key)
+            if subset is not None:
+                self._entries.move_to_end(key)
+            return subset
+
+    def put(self, key, subset):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = subset
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_selections = _SelectionCache()
+
+
+def narrowing_criteria(user_profile, prefilter=None, filters=None):
+    """
+    Canonical form of everything a request narrows the catalog by, with the
+    profile fields the prefilters and the average band read: equal criteria
+    select the same programs from a catalog version.
+    """
+    criteria = {name: value for name, value in (filters or {}).items() if name != 'min_score'}
+    if prefilter and prefilter.get('reachable'):
+        criteria['reachable_from'] = user_profile['average']
+    if prefilter and prefilter.get('interests'):
+        criteria['interest_match'] = sorted(set(user_profile['major_interests']))
+    if 'average_band' in criteria:
+        criteria['band_average'] = user_profile['average']
+    return criteria
+
+
+@timed("filter")
+def narrow_catalog(catalog, user_profile, prefilter=None, filters=None):
+    """
+    Program table holding only the programs of catalog that pass the
+    prefilters and filters for this student; the catalog itself if all of
+    them do. Cached for versioned catalogs.
+    """
+    criteria = narrowing_criteria(user_profile, prefilter, filters)
+    if not criteria:
+        return catalog
+
+    key = None
+    if catalog.version is not None:
+        key = (catalog.version, json.dumps(criteria, sort_keys=True))
+        subset = _selections.get(key)
+        if subset is not None:
+            return subset
+
+    program_ids = None
+    if prefilter:
+        average = user_profile['average'] if prefilter.get('reachable') else None
+        interests = user_profile['major_interests'] if prefilter.get('interests') else None
+        program_ids = resolve_prefilter(catalog, average, interests)
+    if filters and set(filters) - {'min_score'}:
+        filtered = resolve_filters(catalog, filters, user_profile['average'])
+        if program_ids is None:
+            program_ids = filtered
+        else:
+            passing = set(program_ids)
+            program_ids = [i for i in filtered if i in passing]
+
+    subset = catalog if len(program_ids) == len(catalog) else catalog.select(program_ids)
+    if key is not None:
+        _selections.put(key, subset)
+    return subset
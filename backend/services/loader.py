@@ -0,0 +1,180 @@
+"""
+Catalog loader - validates a catalog file and publishes it to MongoDB.
+
+Usage (from the backend directory):
+    python -m services.loader data/mock_universities.py --snapshot data/catalog.jsonl
+
+The catalog file is either a Python module defining UNIVERSITY_DB (like
+data/mock_universities.py), a JSON file holding the same dictionary, or a
+snapshot written by this loader. The catalog is validated with the same
+compile step the API uses, written with batched bulk upserts, and then the
+catalog version document is bumped so every API process reloads it.
+"""
+
+import argparse
+import json
+import os
+import runpy
+import sys
+from datetime import datetime, timezone
+
+from pymongo import ReplaceOne
+from pymongo.errors import PyMongoError
+
+from services import database
+from services.catalog import compile_catalog
+from services.snapshot import read_snapshot, write_snapshot
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def read_catalog_file(path):
+    """
+    Load a raw university catalog from a .py, .json or snapshot (.jsonl) file.
+    """
+    if path.endswith(".py"):
+        namespace = runpy.run_path(path)
+        if "UNIVERSITY_DB" not in namespace:
+            raise ValueError(f"'{path}' does not define UNIVERSITY_DB")
+        return namespace["UNIVERSITY_DB"]
+
+    if path.endswith(".jsonl"):
+        university_db, _ = read_snapshot(path)
+        return university_db
+
+    with open(path, "r", encoding="utf-8") as f:
+        university_db = json.load(f)
+    if not isinstance(university_db, dict):
+        raise ValueError(f"'{path}' must contain a JSON object of universities")
+    return university_db
+
+
+def _bulk_upsert(collection, operations, batch_size):
+    written = 0
+    for start in range(0, len(operations), batch_size):
+        result = collection.bulk_write(operations[start:start + batch_size], ordered=False)
+        written += result.upserted_count + result.modified_count
+    return written
+
+
+def write_catalog(university_db, layout=None, batch_size=DEFAULT_BATCH_SIZE, prune=True):
+    """
+    Upsert the catalog into MongoDB in the given layout ("university" or
+    "program", default CATALOG_LAYOUT). With prune, documents for
+    universities/programs no longer in the catalog are deleted; in the
+    university layout that only covers documents keyed by "university".
+    Returns the number of documents inserted or changed.
+    """
+    layout = (layout or database.CATALOG_LAYOUT).lower()
+
+    if layout == "program":
+        collection = database.get_programs_collection()
+        database.ensure_program_indexes()
+        documents = database.university_to_program_documents(university_db)
+        operations = [
+            ReplaceOne({"university": doc["university"], "program": doc["program"]}, doc, upsert=True)
+            for doc in documents
+        ]
+        written = _bulk_upsert(collection, operations, batch_size)
+        if prune:
+            keep = {(doc["university"], doc["program"]) for doc in documents}
+            stale = [
+                doc["_id"] for doc in collection.find({}, projection={"university": 1, "program": 1})
+                if (doc.get("university"), doc.get("program")) not in keep
+            ]
+            if stale:
+                collection.delete_many({"_id": {"$in": stale}})
+        return written
+
+    # University layout: {"university": name, name: {...}}. The extra string
+    # field is the upsert key; fetch_university_data skips it.
+    collection = database.get_universities_collection()
+    collection.create_index("university")
+    operations = [
+        ReplaceOne({"university": uni_name}, {"university": uni_name, uni_name: uni_data}, upsert=True)
+        for uni_name, uni_data in university_db.items()
+    ]
+    written = _bulk_upsert(collection, operations, batch_size)
+    if prune:
+        # Only documents written by the loader have the key; documents in
+        # the legacy layouts (e.g. one document holding every university)
+        # are left alone
+        collection.delete_many({"university": {"$exists": True, "$nin": list(university_db)}})
+    return written
+
+
+def bump_catalog_version():
+    """
+    Increment the catalog version document so readers invalidate their caches.
+    Returns the new version number.
+    """
+    meta = database.get_database()[database.META_COLLECTION_NAME].find_one_and_update(
+        {"_id": database.CATALOG_VERSION_ID},
+        {"$inc": {"version": 1}, "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}},
+        upsert=True,
+        return_document=True,
+    )
+    database.invalidate_catalog_cache()
+    return meta["version"]
+
+
+def load_catalog(path, snapshot_path=None, layout=None, batch_size=DEFAULT_BATCH_SIZE, prune=True, write_mongo=True):
+    """
+    Validate a catalog file, publish it to MongoDB and/or write a snapshot.
+    Returns a summary dictionary.
+    """
+    university_db = read_catalog_file(path)
+    catalog = compile_catalog(university_db)  # Raises ValueError on bad documents
+
+    summary = {
+        "universities": catalog.university_count,
+        "programs": len(catalog),
+        "written": 0,
+        "catalog_version": None,
+    }
+    if write_mongo:
+        summary["written"] = write_catalog(university_db, layout=layout, batch_size=batch_size, prune=prune)
+        summary["catalog_version"] = bump_catalog_version()
+    if snapshot_path:
+        write_snapshot(university_db, snapshot_path, catalog_version=summary["catalog_version"])
+        summary["snapshot"] = os.path.abspath(snapshot_path)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate a university catalog and load it into MongoDB.")
+    parser.add_argument("catalog", help="catalog file (.py with UNIVERSITY_DB, .json, or .jsonl snapshot)")
+    parser.add_argument("--snapshot", default=database.CATALOG_SNAPSHOT_PATH,
+                        help="also write a local snapshot here (default: CATALOG_SNAPSHOT_PATH)")
+    parser.add_argument("--layout", choices=["university", "program"], default=database.CATALOG_LAYOUT,
+                        help="MongoDB layout to write (default: CATALOG_LAYOUT)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="documents per bulk_write")
+    parser.add_argument("--no-prune", action="store_true", help="keep documents missing from the catalog file")
+    parser.add_argument("--snapshot-only", action="store_true", help="validate and write the snapshot without MongoDB")
+    args = parser.parse_args(argv)
+
+    if args.snapshot_only and not args.snapshot:
+        parser.error("--snapshot-only needs --snapshot or CATALOG_SNAPSHOT_PATH")
+
+    try:
+        summary = load_catalog(
+            args.catalog,
+            snapshot_path=args.snapshot,
+            layout=args.layout,
+            batch_size=args.batch_size,
+            prune=not args.no_prune,
+            write_mongo=not args.snapshot_only,
+        )
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    except PyMongoError as e:
+        print(f"error: MongoDB write failed: {e}", file=sys.stderr)
+        return 1
+
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,19 +2,253 @@
 University Scoring Engine - Matches students to programs based on multiple criteria.
 """
 
-from services.database import fetch_university_data
+import heapq
+import math
+import os
+
+from services.catalog import GENERIC_REQUIREMENT_PHRASES
+from services.database import get_cached_catalog, get_cached_university_data
+from services.filters import narrow_catalog, parse_filters, parse_prefilter
+from services.metrics import stage
+from services import band_tables
+
+# Scoring engine: "python" (scalar), "numpy" (services.vectorized) or "auto",
+# which uses NumPy when it's installed and the catalog is large enough for
+# the array setup to pay off.
+SCORING_ENGINE = os.getenv("SCORING_ENGINE", "auto").lower()
+VECTORIZE_MIN_PROGRAMS = int(os.getenv("VECTORIZE_MIN_PROGRAMS", "200"))
+# Use the two-stage upper-bound ranker for paged Grade 12 requests on the
+# scalar engine (see UniversityMatcher._rank_bounded).
+BOUNDED_RANKING = os.getenv("BOUNDED_RANKING", "True").lower() == "true"
+
+
+# Fields every student profile must provide
+REQUIRED_PROFILE_FIELDS = ['grade_level', 'average', 'wants_coop', 'extra_curriculars',
+                           'major_interests', 'courses_taken']
+
+
+def non_finite_fields(profile):
+    """
+    Profile fields holding a NaN or infinite number (JSON parsing accepts
+    NaN and Infinity), which would score differently on each engine.
+    """
+    def finite(value):
+        return not isinstance(value, float) or math.isfinite(value)
+
+    fields = []
+    if not finite(profile.get('average')):
+        fields.append('average')
+    for field in ('courses_taken', 'extra_curriculars'):
+        entries = profile.get(field)
+        if isinstance(entries, list) and not all(
+                finite(value) for entry in entries if isinstance(entry, (list, tuple)) for value in entry):
+            fields.append(field)
+    return fields
+
+
+def parse_ranking_options(payload):
+    """
+    Read the optional limit/offset/min_score paging fields, prefilter and
+    filters (see services.filters) from a request payload. filters.min_score
+    is folded into min_score. Raises ValueError if any of them is malformed.
+    """
+    limit = payload.get('limit')
+    offset = payload.get('offset', 0)
+    min_score = payload.get('min_score')
+
+    if limit is not None and (isinstance(limit, bool) or not isinstance(limit, int) or limit < 0):
+        raise ValueError("'limit' must be a non-negative integer")
+    if offset is None:
+        offset = 0
+    if isinstance(offset, bool) or not isinstance(offset, int) or offset < 0:
+        raise ValueError("'offset' must be a non-negative integer")
+    if min_score is not None and (isinstance(min_score, bool) or not isinstance(min_score, (int, float))):
+        raise ValueError("'min_score' must be a number")
+
+    prefilter = parse_prefilter(payload.get('prefilter'))
+    filters = parse_filters(payload.get('filters'))
+    if filters is not None and 'min_score' in filters:
+        filter_min = filters.pop('min_score')
+        min_score = filter_min if min_score is None else max(min_score, filter_min)
+        filters = filters or None
+
+    return {"limit": limit, "offset": offset, "min_score": min_score, "prefilter": prefilter, "filters": filters}
+
 
 def get_university_db():
     """
-    Get university database from MongoDB.
+    Get university database from MongoDB (cached per process, see services.database).
     Raises an exception if MongoDB is unavailable or not configured.
     """
-    return fetch_university_data()
+    return get_cached_university_data()
+
+
+def get_catalog():
+    """
+    Get the compiled program table for the current university database.
+    Raises an exception if MongoDB is unavailable or not configured.
+    """
+    return get_cached_catalog()
+
+
+def competitiveness_tier(max_avg):
+    """
+    Full competitiveness bonus for a program whose requirements the student meets.
+    More competitive programs (higher max_avg) get bigger bonuses.
+    Scale: max_avg of 70-80 = no bonus, 80-90 = small bonus, 90-95 = larger bonus, 95+ = highest bonus
+    """
+    if max_avg >= 95:
+        # Extremely competitive: bonus of 0.20-0.30 based on how high the requirement is
+        return 0.20 + (0.10 * ((max_avg - 95) / 5))  # 0.20 at 95, up to 0.30 at 100
+    elif max_avg >= 90:
+        # Highly competitive: bonus of 0.10-0.20 based on how high the requirement is
+        return 0.10 + (0.10 * ((max_avg - 90) / 5))  # 0.10 at 90, up to 0.20 at 95
+    elif max_avg >= 85:
+        # Moderately competitive: bonus of 0.05-0.10
+        return 0.05 + (0.05 * ((max_avg - 85) / 5))  # 0.05 at 85, up to 0.10 at 90
+    elif max_avg >= 80:
+        # Somewhat competitive: small bonus
+        return 0.02 + (0.03 * ((max_avg - 80) / 5))  # 0.02 at 80, up to 0.05 at 85
+    # max_avg < 80: no bonus (less competitive programs)
+    return 0.0
+
+
+def normalize_score(score, normalization_factor):
+    """
+    Apply the ranking's normalization factor (None when no scaling is needed).
+    """
+    if normalization_factor is None:
+        return score
+    return round(score * normalization_factor, 1)
+
+
+def select_ranking(scores, limit=None, offset=0, min_score=None):
+    """
+    Pick the program ids for one page of a ranking.
+
+    scores are the rounded percentage scores indexed by program id. Ties keep
+    catalog order, like a stable sort. When a limit is given only the top
+    offset + limit entries are selected with a heap instead of sorting
+    everything. Returns (page ids in rank order, number of programs passing
+    min_score, normalization factor or None).
+    """
+    if not scores:
+        return [], 0, None
+
+    # Normalize scores to cap at 100% while preserving relative rankings:
+    # the highest score is scaled to exactly 100% if it's above it
+    max_score = max(scores)
+    normalization_factor = 100 / max_score if max_score > 100 else None
+
+    if min_score is None:
+        total = len(scores)
+    else:
+        total = sum(1 for score in scores if normalize_score(score, normalization_factor) >= min_score)
+
+    if limit is None:
+        ranked = sorted(range(len(scores)), key=scores.__getitem__, reverse=True)
+        page = ranked[offset:total]
+    else:
+        end = min(offset + limit, total)
+        page = heapq.nlargest(end, range(len(scores)), key=scores.__getitem__)[offset:] if end > offset else []
+
+    return page, total, normalization_factor
+
+
+def select_top_scores(final, limit, offset=0):
+    """
+    select_ranking for one page of unrounded final scores (a list or NumPy
+    array) without rounding every score.
+
+    Rounding is monotonic, so nothing whose unrounded score is more than a
+    rounding step below the k-th largest one can round into the top
+    offset + limit; only the scores near or above it are rounded and sorted.
+    Returns (page ids in rank order, total, normalization factor,
+    {program id: rounded score} covering the page).
+    """
+    n = len(final)
+    end = min(offset + limit, n)
+    if n == 0:
+        return [], 0, None, {}
+
+    if isinstance(final, list):
+        top = max(final)
+        kth = heapq.nlargest(end, final)[-1] if end else None
+    else:
+        top = float(final.max())
+        if end:
+            partitioned = final.copy()
+            partitioned.partition(n - end)
+            kth = float(partitioned[n - end])
+
+    max_score = round(top, 1)
+    normalization_factor = 100 / max_score if max_score > 100 else None
+    if end <= offset:
+        return [], n, normalization_factor, {}
+
+    cutoff = round(kth, 1) - 0.06
+    if isinstance(final, list):
+        scores = {i: round(score, 1) for i, score in enumerate(final) if score >= cutoff}
+    else:
+        candidates = (final >= cutoff).nonzero()[0].tolist()
+        scores = {i: round(score, 1) for i, score in zip(candidates, final[candidates].tolist())}
+
+    # Candidates are in catalog order and sorted() is stable, so ties keep it
+    ranked = sorted(scores, key=scores.__getitem__, reverse=True)
+    return ranked[offset:end], n, normalization_factor, scores
+
+
+def build_ranking_row(catalog, i, score, s_acad, s_int, s_ec, coop_mult, normalization_factor=None):
+    """
+    Build the response row for program i from its rounded score and components.
+    """
+    return {
+        "university": catalog.university_names[catalog.program_university[i]],
+        "program": catalog.program_names[i],
+        "score": normalize_score(score, normalization_factor),
+        "breakdown": {
+            "academic": round(float(s_acad), 2),
+            "interest": round(float(s_int), 2),
+            "ec": round(float(s_ec), 2),
+            "coop_fit": round(float(coop_mult), 2)
+        }
+    }
+
+
+def rank_components(catalog, components, limit=None, offset=0, min_score=None):
+    """
+    Order scored components (final, academic, interest, ec, coop_fit, as
+    returned by UniversityMatcher._score_catalog) into one page.
+    Returns (total, normalization_factor, rows iterator); rows are built
+    only when consumed.
+    """
+    final, academic, interest, ec, coop = components
+    with stage("rank"):
+        if limit is not None and min_score is None:
+            order, total, normalization_factor, scores = select_top_scores(final, limit, offset)
+        else:
+            if not isinstance(final, list):
+                final = final.tolist()  # NumPy engine: round Python floats, like the scalar path
+            scores = [round(score, 1) for score in final]
+            order, total, normalization_factor = select_ranking(scores, limit, offset, min_score)
+
+    rows = (
+        build_ranking_row(catalog, i, scores[i], academic[i], interest[i], ec[i], coop[i], normalization_factor)
+        for i in order
+    )
+    return total, normalization_factor, rows
 
 
 class UniversityMatcher:
-    def __init__(self, user_profile):
+    def __init__(self, user_profile, catalog=None, engine=None):
+        """
+        catalog: optional CompiledCatalog to score against instead of the
+        shared cached one (used by batch jobs and benchmarks).
+        engine: "python", "numpy" or "auto"; defaults to SCORING_ENGINE.
+        """
         self.user = user_profile
+        self.catalog = catalog
+        self.engine = (engine or SCORING_ENGINE).lower()
         self.grade = user_profile['grade_level']
         self.weights = self._get_dynamic_weights()
 
@@ -30,10 +264,26 @@ class UniversityMatcher:
         else:
             return {"interest": 0.1, "academic": 0.8, "ec": 0.1}
 
-    def _calculate_academic_score(self, min_avg, max_avg, required_courses):
+    def _calculate_academic_score(self, min_avg, max_avg, required_courses, course_penalty=None):
         """
         Checks if user meets grade cutoffs and has taken required courses.
         Rewards competitive programs (higher averages) when requirements are met.
+        course_penalty: precomputed result of the course check (see
+        _requirement_group_penalties); computed from required_courses if None.
+        """
+        grade_score, competitiveness_bonus = self._grade_components(min_avg, max_avg)
+
+        # --- B. Required Course Check (Grade 11/12 Only) ---
+        if course_penalty is None:
+            course_penalty = self._course_penalty(required_courses)
+
+        # Cap the final score at 1.30 to allow for higher bonuses for extremely competitive programs
+        final_score = min(1.30, (grade_score * course_penalty) + competitiveness_bonus)
+        return final_score
+
+    def _grade_components(self, min_avg, max_avg):
+        """
+        The average-dependent parts of the academic score: (grade_score, competitiveness_bonus).
         """
         user_avg = self.user['average']
         
@@ -46,78 +296,90 @@ class UniversityMatcher:
             # Linear scaling between (min-5) and max
             grade_score = (user_avg - (min_avg - 5)) / (max_avg - (min_avg - 5))
 
-        # --- B. Required Course Check (Grade 11/12 Only) ---
-        course_penalty = 1.0
-        if self.grade >= 11:
-            user_courses = [c[0] for c in self.user['courses_taken']]  # Extract subject names
-            missing = []
-            
-            for req in required_courses:
-                # Skip generic requirements like "One more U or M course"
-                req_lower = req.lower()
-                if any(phrase in req_lower for phrase in ["one more", "additional", "any u", "any m", "another"]):
-                    continue  # Don't penalize for generic requirements
-                
-                # Handle alternatives (e.g., "ENG4U / EAE4U")
-                # Split by "/" and check if any alternative is contained in user's courses
-                alternatives = [alt.strip() for alt in req.split('/')]
-                found_match = False
-                for alt in alternatives:
-                    # Check if this alternative is contained in any user course
-                    # or if any user course is contained in this alternative
-                    for user_course in user_courses:
-                        if alt in user_course or user_course in alt:
-                            found_match = True
-                            break
-                    if found_match:
-                        break
-                
-                if not found_match:
-                    # Course is truly missing
-                    missing.append(req)
-            
-            # If missing courses in Gr 12, heavy penalty
-            if self.grade == 12 and missing:
-                course_penalty = max(0, 1.0 - (len(missing) * 0.15)) 
-            # If Gr 11, slight warning penalty (they have time to take them)
-            elif self.grade == 11 and missing:
-                course_penalty = 1.0  # No penalty yet, just warning (optional: 0.95)
-
         # --- C. Competitiveness Bonus ---
         # Reward meeting/exceeding requirements of competitive programs (higher averages)
         competitiveness_bonus = 0.0
         if user_avg >= max_avg:
-            # User meets/exceeds requirements - give bonus based on program competitiveness
-            # More competitive programs (higher max_avg) get bigger bonuses
-            # Scale: max_avg of 70-80 = no bonus, 80-90 = small bonus, 90-95 = larger bonus, 95+ = highest bonus
-            if max_avg >= 95:
-                # Extremely competitive: bonus of 0.20-0.30 based on how high the requirement is
-                competitiveness_bonus = 0.20 + (0.10 * ((max_avg - 95) / 5))  # 0.20 at 95, up to 0.30 at 100
-            elif max_avg >= 90:
-                # Highly competitive: bonus of 0.10-0.20 based on how high the requirement is
-                competitiveness_bonus = 0.10 + (0.10 * ((max_avg - 90) / 5))  # 0.10 at 90, up to 0.20 at 95
-            elif max_avg >= 85:
-                # Moderately competitive: bonus of 0.05-0.10
-                competitiveness_bonus = 0.05 + (0.05 * ((max_avg - 85) / 5))  # 0.05 at 85, up to 0.10 at 90
-            elif max_avg >= 80:
-                # Somewhat competitive: small bonus
-                competitiveness_bonus = 0.02 + (0.03 * ((max_avg - 80) / 5))  # 0.02 at 80, up to 0.05 at 85
-            # max_avg < 80: no bonus (less competitive programs)
+            # User meets/exceeds requirements - give full bonus based on program competitiveness
+            competitiveness_bonus = competitiveness_tier(max_avg)
         elif user_avg >= (max_avg - 2):
             # User is very close to meeting requirements - give partial bonus
             proximity = (user_avg - (max_avg - 2)) / 2  # 0 to 1 based on how close
-            if max_avg >= 95:
-                competitiveness_bonus = (0.20 + (0.10 * ((max_avg - 95) / 5))) * proximity * 0.5
-            elif max_avg >= 90:
-                competitiveness_bonus = (0.10 + (0.10 * ((max_avg - 90) / 5))) * proximity * 0.5
-            elif max_avg >= 85:
-                competitiveness_bonus = (0.05 + (0.05 * ((max_avg - 85) / 5))) * proximity * 0.5
-            elif max_avg >= 80:
-                competitiveness_bonus = (0.02 + (0.03 * ((max_avg - 80) / 5))) * proximity * 0.5
+            competitiveness_bonus = competitiveness_tier(max_avg) * proximity * 0.5
 
-        # Cap the final score at 1.30 to allow for higher bonuses for extremely competitive programs
-        final_score = min(1.30, (grade_score * course_penalty) + competitiveness_bonus)
-        return final_score
+        return grade_score, competitiveness_bonus
+
+    def _course_penalty(self, required_courses):
+        """
+        Multiplier on the grade score for required courses the student hasn't taken.
+        Only Grade 12 students are penalized; Grade 11 students still have time.
+        """
+        if self.grade < 11:
+            return 1.0
+
+        user_courses = [c[0] for c in self.user['courses_taken']]  # Extract subject names
+        missing = []
+        
+        for req in required_courses:
+            # Skip generic requirements like "One more U or M course"
+            req_lower = req.lower()
+            if any(phrase in req_lower for phrase in GENERIC_REQUIREMENT_PHRASES):
+                continue  # Don't penalize for generic requirements
+            
+            # Handle alternatives (e.g., "ENG4U / EAE4U")
+            # Split by "/" and check if any alternative is contained in user's courses
+            alternatives = [alt.strip() for alt in req.split('/')]
+            found_match = False
+            for alt in alternatives:
+                # Check if this alternative is contained in any user course
+                # or if any user course is contained in this alternative
+                for user_course in user_courses:
+                    if alt in user_course or user_course in alt:
+                        found_match = True
+                        break
+                if found_match:
+                    break
+            
+            if not found_match:
+                # Course is truly missing
+                missing.append(req)
+        
+        # If missing courses in Gr 12, heavy penalty
+        if self.grade == 12 and missing:
+            return max(0, 1.0 - (len(missing) * 0.15)) 
+        # If Gr 11, slight warning penalty (they have time to take them)
+        elif self.grade == 11 and missing:
+            return 1.0  # No penalty yet, just warning (optional: 0.95)
+        return 1.0
+
+    def _requirement_group_penalties(self, catalog):
+        """
+        Course penalty for every requirement group of a compiled catalog.
+        Same result as _course_penalty(), but each distinct course alternative
+        is matched against the student's courses once per request and
+        requirements are checked with bitmask lookups.
+        """
+        if self.grade != 12:
+            # Only Grade 12 students are penalized for missing courses
+            return [1.0] * len(catalog.requirement_groups)
+
+        user_courses = [c[0] for c in self.user['courses_taken']]
+        return [
+            max(0, 1.0 - (missing * 0.15)) if missing else 1.0
+            for missing in catalog.missing_course_counts(user_courses)
+        ]
+
+    def _interest_scores(self, catalog):
+        """
+        Interest score for every program of a compiled catalog, using the
+        catalog's tag index. Same coverage ratio as _calculate_interest_score();
+        programs sharing none of the student's tags score 0.0.
+        """
+        scores = [0.0] * len(catalog)
+        tag_count = catalog.tag_count
+        for prog_index, matches in catalog.interest_matches(self.user['major_interests']).items():
+            scores[prog_index] = matches / tag_count[prog_index]
+        return scores
 
     def _calculate_interest_score(self, program_interests):
         """
@@ -133,14 +395,19 @@ class UniversityMatcher:
         # Score = matches / total program keywords (Coverage)
         return len(matches) / len(prog_interests)
 
+    def _user_best_ec(self):
+        """
+        User's highest EC leadership level (0 if they listed none).
+        """
+        if not self.user['extra_curriculars']:
+            return 0
+        return max([ec[1] for ec in self.user['extra_curriculars']])
+
     def _calculate_ec_score(self, required_level):
         """
         Matches user's highest EC leadership level against program expectation.
         """
-        if not self.user['extra_curriculars']:
-            user_best = 0
-        else:
-            user_best = max([ec[1] for ec in self.user['extra_curriculars']])
+        user_best = self._user_best_ec()
 
         # Bonus if they exceed requirements, penalty if they fail
         if user_best >= required_level:
@@ -169,124 +436,204 @@ class UniversityMatcher:
             else:
                 return 0.92  # Friction Penalty: Program forces Co-op (mandatory).
 
-    def get_ranked_programs(self):
-        results = []
-        
-        # Fetch university data from MongoDB
-        UNIVERSITY_DB = get_university_db()
-        
-        for uni_name, uni_data in UNIVERSITY_DB.items():
-            # Validate university-level fields
-            if 'ec_quality' not in uni_data:
-                raise ValueError(f"University '{uni_name}' missing required field 'ec_quality'. Available fields: {list(uni_data.keys())}")
+    def _use_vectorized(self, catalog):
+        """
+        Decide whether to score this catalog with the NumPy engine.
+        """
+        if self.engine == "python":
+            return False
+
+        from services import vectorized
+        if self.engine == "numpy":
+            if not vectorized.is_available():
+                raise ValueError("SCORING_ENGINE is 'numpy' but numpy is not installed")
+            return True
+        return vectorized.is_available() and len(catalog) >= VECTORIZE_MIN_PROGRAMS
+
+    def _score_catalog(self, catalog):
+        """
+        Component scores for every program in the catalog.
+        Returns (final, academic, interest, ec, coop_fit) sequences indexed by
+        program id; final is the unrounded percentage score. Profiles on the
+        band table grid are scored from the precomputed tables once they're
+        built (see services.band_tables).
+        """
+        use_vectorized = self._use_vectorized(catalog)
+        tables = band_tables.get_tables(catalog)
+        if tables is not None:
+            components = band_tables.score_catalog(self, catalog, tables, use_vectorized)
+            if components is not None:
+                return components
+
+        if use_vectorized:
+            from services import vectorized
+            return vectorized.score_catalog(self, catalog)
+
+        # EC and co-op fit only depend on university-level fields
+        uni_ec = [self._calculate_ec_score(level) for level in catalog.university_ec_quality]
+        uni_coop = [self._calculate_coop_fit(options) for options in catalog.university_coop_options]
+
+        group_penalty = self._requirement_group_penalties(catalog)
+        requirement_group = catalog.requirement_group
+        interest_scores = self._interest_scores(catalog)
+
+        final, academic, interest, ec, coop = [], [], [], [], []
+        for i, uni_index in enumerate(catalog.program_university):
+            # 1. Component Scores
+            s_acad = self._calculate_academic_score(
+                catalog.min_average[i],
+                catalog.max_average[i],
+                None,  # Only needed when no course_penalty is given
+                course_penalty=group_penalty[requirement_group[i]]
+            )
             
-            if 'co-op' not in uni_data:
-                raise ValueError(f"University '{uni_name}' missing required field 'co-op'. Available fields: {list(uni_data.keys())}")
+            s_int = interest_scores[i]
             
-            if 'programs' not in uni_data:
-                raise ValueError(f"University '{uni_name}' missing required field 'programs'. Available fields: {list(uni_data.keys())}")
+            # Use university-level ec_quality
+            s_ec = uni_ec[uni_index]
             
-            # Get university-level metadata
-            uni_ec_quality = uni_data['ec_quality']
-            uni_coop_options = uni_data['co-op']  # University-level co-op options
-            programs = uni_data['programs']
+            # 2. Weighted Base Calculation
+            base_score = (
+                (s_acad * self.weights['academic']) +
+                (s_int * self.weights['interest']) +
+                (s_ec * self.weights['ec'])
+            )
             
-            if not isinstance(programs, dict):
-                raise ValueError(f"University '{uni_name}': 'programs' must be a dictionary, got {type(programs)}")
+            # 3. Apply Multipliers (Co-op) - use university-level co-op options
+            coop_mult = uni_coop[uni_index]
             
-            for prog_name, details in programs.items():
-                try:
-                    # Validate required program fields
-                    if 'recommended_average' not in details:
-                        raise KeyError(f"Program '{prog_name}' at university '{uni_name}' missing 'recommended_average'")
-                    
-                    recommended_avg = details['recommended_average']
-                    if not isinstance(recommended_avg, list):
-                        raise ValueError(
-                            f"Program '{prog_name}' at university '{uni_name}': "
-                            f"'recommended_average' must be a list, got {type(recommended_avg)}"
-                        )
-                    
-                    if len(recommended_avg) == 1:
-                        recommended_avg = [recommended_avg[0] - 2, recommended_avg[0] + 2]
-
-                    if len(recommended_avg) < 2:
-                        raise ValueError(
-                            f"Program '{prog_name}' at university '{uni_name}': "
-                            f"'recommended_average' must have at least 2 elements (min and max), "
-                            f"got {len(recommended_avg)} elements: {recommended_avg}"
-                        )
-                    
-                    # Validate other fields with defaults
-                    required_courses = details.get('required_courses', [])
-                    if not isinstance(required_courses, list):
-                        raise ValueError(
-                            f"Program '{prog_name}' at university '{uni_name}': "
-                            f"'required_courses' must be a list, got {type(required_courses)}"
-                        )
-                    
-                    interests = details.get('interests', [])
-                    if not isinstance(interests, list):
-                        raise ValueError(
-                            f"Program '{prog_name}' at university '{uni_name}': "
-                            f"'interests' must be a list, got {type(interests)}"
-                        )
-                    
-                    # 1. Component Scores
-                    s_acad = self._calculate_academic_score(
-                        recommended_avg[0],
-                        recommended_avg[1],
-                        required_courses
-                    )
-                    
-                    s_int = self._calculate_interest_score(interests)
-                    
-                    # Use university-level ec_quality
-                    s_ec = self._calculate_ec_score(uni_ec_quality)
-                    
-                    # 2. Weighted Base Calculation
-                    base_score = (
-                        (s_acad * self.weights['academic']) +
-                        (s_int * self.weights['interest']) +
-                        (s_ec * self.weights['ec'])
-                    )
-                    
-                    # 3. Apply Multipliers (Co-op) - use university-level co-op options
-                    coop_mult = self._calculate_coop_fit(uni_coop_options)
-                    
-                    final_score = base_score * coop_mult * 100  # Convert to percentage
-
-                    results.append({
-                        "university": uni_name,
-                        "program": prog_name,
-                        "score": round(final_score, 1),
-                        "breakdown": {
-                            "academic": round(s_acad, 2),
-                            "interest": round(s_int, 2),
-                            "ec": round(s_ec, 2),
-                            "coop_fit": round(coop_mult, 2)
-                        }
-                    })
-                except (KeyError, ValueError, IndexError, TypeError) as e:
-                    # Provide detailed error information
-                    raise ValueError(
-                        f"Error processing program '{prog_name}' at university '{uni_name}': {e}. "
-                        f"Available fields: {list(details.keys())}. "
-                        f"recommended_average value: {details.get('recommended_average', 'MISSING')}. "
-                        f"recommended_average type: {type(details.get('recommended_average', None))}"
-                    ) from e
-        
-        # Return sorted by highest score
-        sorted_results = sorted(results, key=lambda x: x['score'], reverse=True)
+            final.append(base_score * coop_mult * 100)  # Convert to percentage
+            academic.append(s_acad)
+            interest.append(s_int)
+            ec.append(s_ec)
+            coop.append(coop_mult)
+
+        return final, academic, interest, ec, coop
+
+    def rank_programs(self, limit=None, offset=0, min_score=None, prefilter=None, filters=None):
+        """
+        Score the catalog and return one page of the ranking.
+
+        limit/offset select rows in rank order (limit=None returns all of
+        them) and min_score drops rows whose normalized score is below it.
+        prefilter and filters restrict scoring (and normalization) to the
+        programs selected by services.filters.narrow_catalog. Only the returned rows
+        are built. Returns (rows, total), where total is the number of
+        programs that passed min_score.
+        """
+        total, _, rows = self.iter_ranking(limit=limit, offset=offset, min_score=min_score, prefilter=prefilter,
+                                           filters=filters)
+        with stage("rows"):
+            rows = list(rows)
+        return rows, total
+
+    def iter_ranking(self, limit=None, offset=0, min_score=None, prefilter=None, filters=None):
+        """
+        Streaming form of rank_programs: scores and orders the catalog, but
+        builds each row only when it's consumed.
+        Returns (total, normalization_factor, rows iterator); the factor is
+        None when scores aren't rescaled.
+        """
+        # Compiled program table (validated once per catalog load)
+        catalog = self.catalog if self.catalog is not None else get_catalog()
+        if prefilter or filters:
+            catalog = narrow_catalog(catalog, self.user, prefilter, filters)
         
-        # Normalize scores to cap at 100% while preserving relative rankings
-        if sorted_results:
-            max_score = sorted_results[0]['score']
-            if max_score > 100:
-                # Scale all scores proportionally so the highest becomes 100%
-                normalization_factor = 100 / max_score
-                for result in sorted_results:
-                    result['score'] = round(result['score'] * normalization_factor, 1)
+        if (BOUNDED_RANKING and limit is not None and min_score is None
+                and self.grade == 12 and not self._use_vectorized(catalog)):
+            with stage("score"):  # Scoring and selection are interleaved
+                rows, total, normalization_factor = self._rank_bounded(catalog, limit, offset)
+            return total, normalization_factor, iter(rows)
         
-        return sorted_results
+        with stage("score"):
+            components = self._score_catalog(catalog)
+        return rank_components(catalog, components, limit, offset, min_score)
+
+    def _rank_bounded(self, catalog, limit, offset):
+        """
+        Two-stage top-k ranking for Grade 12 students.
+
+        The course penalty only ever lowers the academic score, so the score
+        computed without it is an upper bound on the exact score. Stage one
+        computes that bound for every program (average band, tag index and
+        per-university EC/co-op only). Stage two walks programs in order of
+        decreasing bound and applies the required-course check until the
+        k-th best exact score beats the next bound; nothing after it can
+        enter the top k. The page is identical to a full scan's (ties are
+        broken by catalog order in both).
+        Returns (rows, total, normalization_factor).
+        """
+        k = offset + limit
+        n = len(catalog)
+        if k == 0 or n == 0:
+            return [], n, None
+
+        weights = self.weights
+        uni_ec = [self._calculate_ec_score(level) for level in catalog.university_ec_quality]
+        uni_coop = [self._calculate_coop_fit(options) for options in catalog.university_coop_options]
+        interest = self._interest_scores(catalog)
+
+        # --- Stage 1: upper bounds, best first (stable, so ties keep catalog order) ---
+        w_acad, w_int, w_ec = weights['academic'], weights['interest'], weights['ec']
+        min_average, max_average = catalog.min_average, catalog.max_average
+        program_university = catalog.program_university
+        bounds = [
+            ((min(1.30, sum(self._grade_components(min_average[i], max_average[i]))) * w_acad) +
+             (interest[i] * w_int) + (uni_ec[uni_index] * w_ec)) * uni_coop[uni_index] * 100
+            for i, uni_index in enumerate(program_university)
+        ]
+        candidates = sorted(range(n), key=bounds.__getitem__, reverse=True)
+
+        # --- Stage 2: exact scores until no remaining bound can reach the top k ---
+        matched = catalog.match_courses([c[0] for c in self.user['courses_taken']])
+        group_penalty = {}
+        top = []  # Min-heap of (score, -program id): the worst kept entry is top[0]
+        scores, academic = {}, {}
+        for i in candidates:
+            # Rounding is monotonic, so every later program rounds to at most this bound
+            if len(top) == k and top[0][0] > round(bounds[i], 1):
+                break
 
+            group = catalog.requirement_group[i]
+            penalty = group_penalty.get(group)
+            if penalty is None:
+                missing = sum(1 for mask in catalog.requirement_groups[group] if not mask & matched)
+                penalty = group_penalty[group] = max(0, 1.0 - (missing * 0.15)) if missing else 1.0
+
+            s_acad = self._calculate_academic_score(min_average[i], max_average[i], (), course_penalty=penalty)
+            uni_index = program_university[i]
+            base_score = (
+                (s_acad * w_acad) +
+                (interest[i] * w_int) +
+                (uni_ec[uni_index] * w_ec)
+            )
+            score = round(base_score * uni_coop[uni_index] * 100, 1)
+            scores[i], academic[i] = score, s_acad
+
+            if len(top) < k:
+                heapq.heappush(top, (score, -i))
+            elif (score, -i) > top[0]:
+                heapq.heapreplace(top, (score, -i))
+
+        ranked = [-neg_i for _, neg_i in sorted(top, reverse=True)]
+
+        # The best program is always in the top k, so normalization matches a full scan
+        max_score = scores[ranked[0]]
+        normalization_factor = 100 / max_score if max_score > 100 else None
+
+        rows = []
+        for i in ranked[offset:]:
+            uni_index = catalog.program_university[i]
+            rows.append(build_ranking_row(
+                catalog, i, scores[i], academic[i], interest[i], uni_ec[uni_index], uni_coop[uni_index],
+                normalization_factor
+            ))
+        return rows, n, normalization_factor
+
+    def get_ranked_programs(self, limit=None, offset=0, min_score=None, prefilter=None, filters=None):
+        """
+        Ranked programs, highest score first (see rank_programs for the options).
+        """
+        rows, _ = self.rank_programs(limit=limit, offset=offset, min_score=min_score, prefilter=prefilter,
+                                     filters=filters)
+        return rows
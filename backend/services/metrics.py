@@ -0,0 +1,259 @@
+"""
+Request metrics - per-stage latency timers, counters and Prometheus output.
+
+Code paths wrap their expensive steps in stage("name"). Stages nest
+(serialize contains compress, catalog contains fetch and compile, ...), and
+each one records its exclusive time - its duration minus the stages nested
+in it - so a request's stage timings add up to at most its total. Every stage
+duration is observed in the recommend_stage_seconds histogram and, while a request
+is being timed (begin_request), added to that request's timings, which the
+API returns as a Server-Timing header. render_prometheus() renders every
+metric in the Prometheus text format for the /metrics endpoint; modules
+with values that are cheaper to read on demand (cache statistics, catalog
+size) register a collector instead of updating a metric on every request.
+"""
+
+import contextvars
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Set to False to skip all timers and counters
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() == "true"
+
+# Histogram buckets in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current_timings = contextvars.ContextVar("request_timings", default=None)
+# [seconds] spent in stages nested in the innermost running stage
+_nested_seconds = contextvars.ContextVar("nested_stage_seconds", default=None)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """
+    Monotonic counter with optional labels.
+    """
+
+    type_name = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {} if self.labelnames else {(): 0}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _format_labels(self.labelnames, key), value) for key, value in self._values.items()]
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram with optional labels.
+    """
+
+    type_name = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, series in self._series.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames, key, [("le", bound)])
+                    samples.append((f"{self.name}_bucket", labels, cumulative))
+                labels = _format_labels(self.labelnames, key)
+                samples.append((f"{self.name}_sum", labels, series[-1]))
+                samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+# --- Registry ---
+
+_metrics = []
+_collectors = []
+
+
+def register(metric):
+    _metrics.append(metric)
+    return metric
+
+
+def register_collector(collect):
+    """
+    Register collect(), returning (name, type, help, value) tuples that are
+    read when /metrics is rendered.
+    """
+    _collectors.append(collect)
+    return collect
+
+
+STAGE_SECONDS = register(Histogram(
+    "recommend_stage_seconds", "Time spent in each stage of a ranking request, excluding nested stages", ["stage"]))
+REQUEST_SECONDS = register(Histogram(
+    "http_request_duration_seconds", "Request latency by endpoint", ["endpoint", "status"]))
+REQUESTS = register(Counter("http_requests_total", "Requests by endpoint and status", ["endpoint", "status"]))
+ERRORS = register(Counter("http_request_errors_total", "Requests answered with 4xx/5xx", ["endpoint", "status"]))
+
+
+def render_prometheus():
+    """
+    Every registered metric and collector value in the Prometheus text format.
+    """
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.type_name}")
+        lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in metric.samples())
+    for collect in _collectors:
+        for name, type_name, help_text, value in collect():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {type_name}")
+            lines.append(f"{name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+# --- Stage timers ---
+
+class RequestTimings:
+    """
+    Accumulated stage durations (seconds) for one request.
+    """
+
+    __slots__ = ("started", "stages")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        """
+        Server-Timing header value, e.g. "score;dur=3.412, total;dur=5.020".
+        """
+        entries = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.stages.items()]
+        entries.append(f"total;dur={self.elapsed() * 1000:.3f}")
+        return ", ".join(entries)
+
+
+def begin_request():
+    """
+    Start timing the current request. Returns (timings, token); pass the
+    token to end_request().
+    """
+    timings = RequestTimings()
+    return timings, _current_timings.set(timings)
+
+
+def end_request(token):
+    _current_timings.reset(token)
+
+
+@contextmanager
+def stage(name):
+    """
+    Time a block as one stage of the current request. Time spent in stages
+    nested in the block is only counted for those.
+    """
+    if not METRICS_ENABLED:
+        yield
+        return
+    parent = _nested_seconds.get()
+    nested = [0.0]
+    _nested_seconds.set(nested)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        # set() rather than a token reset: streamed rows may resume a stage
+        # in a different context
+        _nested_seconds.set(parent)
+        if parent is not None:
+            parent[0] += elapsed
+        elapsed = max(0.0, elapsed - nested[0])
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        timings = _current_timings.get()
+        if timings is not None:
+            timings.add(name, elapsed)
+
+
+def timed(name):
+    """
+    Decorator timing every call of a function as the stage name.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def observe_request(endpoint, status, seconds):
+    """
+    Count a finished request and record its latency.
+    """
+    if not METRICS_ENABLED:
+        return
+    REQUESTS.inc(endpoint=endpoint, status=status)
+    REQUEST_SECONDS.observe(seconds, endpoint=endpoint, status=status)
+    if status >= 400:
+        ERRORS.inc(endpoint=endpoint, status=status)
@@ -0,0 +1,113 @@
+"""
+Sampling profiler hook - profiles 1 in N requests and writes reports to disk.
+
+Off unless PROFILE_SAMPLE_EVERY is set. A sampled request runs under
+cProfile and/or tracemalloc (PROFILE_MODE), and when it finishes the
+reports are written to PROFILE_DIR:
+    <time>-<pid>-<n>-<endpoint>.prof       cProfile stats (load with pstats/snakeviz)
+    <time>-<pid>-<n>-<endpoint>.txt        top functions by cumulative time
+    <time>-<pid>-<n>-<endpoint>.mem.txt    peak traced memory and top allocation sites
+"""
+
+import cProfile
+import io
+import itertools
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+# Profile every Nth request (0 disables the hook)
+PROFILE_SAMPLE_EVERY = int(os.getenv("PROFILE_SAMPLE_EVERY", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# Comma-separated: "cprofile", "tracemalloc" or both
+PROFILE_MODE = {mode.strip() for mode in os.getenv("PROFILE_MODE", "cprofile,tracemalloc").lower().split(",")}
+
+logger = logging.getLogger(__name__)
+
+_request_counter = itertools.count(1)
+# cProfile and tracemalloc are process-wide, so only one sample runs at a time
+_sample_lock = threading.Lock()
+
+
+class Sample:
+    """
+    An in-progress profile of one request.
+    """
+
+    __slots__ = ("endpoint", "number", "profiler", "tracing")
+
+    def __init__(self, endpoint, number):
+        self.endpoint = endpoint
+        self.number = number
+        self.profiler = None
+        self.tracing = False
+
+
+def start(endpoint):
+    """
+    Start profiling this request if it's the Nth one. Returns a Sample to
+    pass to finish(), or None if the request isn't sampled.
+    """
+    if PROFILE_SAMPLE_EVERY <= 0:
+        return None
+    number = next(_request_counter)
+    if number % PROFILE_SAMPLE_EVERY or not _sample_lock.acquire(blocking=False):
+        return None
+
+    sample = Sample(endpoint, number)
+    try:
+        if "tracemalloc" in PROFILE_MODE and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            sample.tracing = True
+        if "cprofile" in PROFILE_MODE:
+            sample.profiler = cProfile.Profile()
+            sample.profiler.enable()
+    except ValueError as e:  # Another profiler is already active
+        logger.warning("Skipping profile sample: %s", e)
+        sample.profiler = None
+    return sample
+
+
+def finish(sample):
+    """
+    Stop a sample and write its reports. Never raises.
+    """
+    if sample is None:
+        return
+    try:
+        if sample.profiler is not None:
+            sample.profiler.disable()
+        memory = None
+        if sample.tracing:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            memory = (peak, snapshot)
+        _write_reports(sample, memory)
+    except Exception:
+        logger.exception("Failed to write profile sample")
+    finally:
+        _sample_lock.release()
+
+
+def _write_reports(sample, memory):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = time.strftime("%Y%m%dT%H%M%S")
+    base = os.path.join(PROFILE_DIR, f"{stamp}-{os.getpid()}-{sample.number}-{sample.endpoint}")
+
+    if sample.profiler is not None:
+        sample.profiler.dump_stats(f"{base}.prof")
+        summary = io.StringIO()
+        pstats.Stats(sample.profiler, stream=summary).sort_stats("cumulative").print_stats(40)
+        with open(f"{base}.txt", "w", encoding="utf-8") as f:
+            f.write(summary.getvalue())
+
+    if memory is not None:
+        peak, snapshot = memory
+        with open(f"{base}.mem.txt", "w", encoding="utf-8") as f:
+            f.write(f"peak traced memory: {peak} bytes\n\n")
+            for stat in snapshot.statistics("lineno")[:25]:
+                f.write(f"{stat}\n")
@@ -0,0 +1,138 @@
+"""
+Recommendation result cache - skips scoring for repeated profiles.
+
+Rankings are keyed by a canonical hash of the normalized student profile,
+the ranking options and the catalog version, and kept in a size-bounded LRU
+with a TTL. Entries for an old catalog version are flushed as soon as a new
+version is seen.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from services.matcher import UniversityMatcher, get_catalog
+from services.metrics import register_collector, stage
+
+# Maximum cached rankings (0 disables the cache) and their lifetime in seconds
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "600"))
+
+
+def profile_cache_key(profile, options, catalog_version):
+    """
+    Canonical hash of everything a ranking depends on.
+
+    Profiles that score identically hash identically: interests and courses
+    are de-duplicated and sorted, only course codes count (not grades) and
+    only the best EC level counts, as in the scorer.
+    """
+    extra_curriculars = profile['extra_curriculars']
+    normalized = {
+        "grade_level": profile['grade_level'],
+        "average": float(profile['average']),
+        "wants_coop": bool(profile['wants_coop']),
+        "best_ec": max([ec[1] for ec in extra_curriculars]) if extra_curriculars else 0,
+        "interests": sorted(set(profile['major_interests'])),
+        "courses": sorted(set(c[0] for c in profile['courses_taken'])),
+        "options": options,
+        "catalog_version": catalog_version,
+    }
+    encoded = json.dumps(normalized, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Thread-safe LRU + TTL cache of ranking results.
+    """
+
+    def __init__(self, max_entries=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._catalog_version = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def observe_catalog_version(self, version):
+        """
+        Flush every entry if the catalog version changed since the last call.
+        """
+        with self._lock:
+            if version != self._catalog_version:
+                self._entries.clear()
+                self._catalog_version = version
+
+    def get(self, key):
+        """
+        Return the cached value for key, or None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]  # Expired
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# Process-wide cache used by the API
+recommendation_cache = ResultCache()
+
+
+@register_collector
+def _cache_metrics():
+    stats = recommendation_cache.stats()
+    return [
+        ("result_cache_hits_total", "counter", "Rankings served from the result cache", stats["hits"]),
+        ("result_cache_misses_total", "counter", "Rankings that had to be scored", stats["misses"]),
+        ("result_cache_entries", "gauge", "Rankings currently cached", stats["entries"]),
+    ]
+
+
+def rank_programs_cached(profile, options, cache=recommendation_cache):
+    """
+    UniversityMatcher(profile).rank_programs(**options), served from the cache
+    when an identical profile was ranked against the same catalog version.
+    The returned rows are shared with the cache and must not be mutated.
+    """
+    with stage("catalog"):
+        catalog = get_catalog()  # In-memory unless the catalog cache needs a refresh
+    if cache.max_entries <= 0:
+        return UniversityMatcher(profile, catalog=catalog).rank_programs(**options)
+
+    cache.observe_catalog_version(catalog.version)
+    key = profile_cache_key(profile, options, catalog.version)
+    result = cache.get(key)
+    if result is None:
+        result = UniversityMatcher(profile, catalog=catalog).rank_programs(**options)
+        cache.put(key, result)
+    return result
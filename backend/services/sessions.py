@@ -0,0 +1,276 @@
+"""
+Re-ranking sessions - keep a profile's component scores between edits.
+
+Students usually change one field at a time. A session keeps the
+per-program component vectors of its profile server-side, and an edit only
+recomputes the components that depend on the changed fields:
+
+    average            grade score and competitiveness bonus (academic)
+    courses_taken      course penalty (academic, Grade 12 only)
+    grade_level        weights and course penalty
+    major_interests    interest
+    extra_curriculars  ec
+    wants_coop         coop_fit
+
+The final scores are then recombined from the stored vectors and re-ranked,
+which gives exactly the ranking a full get_ranked_programs() would. Sessions
+live in an LRU bounded both by count (RANK_SESSION_MAX) and by the programs
+they hold in total (RANK_SESSION_MAX_PROGRAMS; each one keeps about eight
+floats per program of its catalog), and expire after RANK_SESSION_TTL
+seconds without use.
+"""
+
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from services.matcher import (REQUIRED_PROFILE_FIELDS, UniversityMatcher, get_catalog, non_finite_fields,
+                              rank_components)
+from services.metrics import register_collector, stage
+
+RANK_SESSION_MAX = int(os.getenv("RANK_SESSION_MAX", "256"))
+# Programs held across all sessions (one session with a 10k-program catalog
+# counts 10k); least recently used sessions are evicted past it
+RANK_SESSION_MAX_PROGRAMS = int(os.getenv("RANK_SESSION_MAX_PROGRAMS", "1000000"))
+RANK_SESSION_TTL = float(os.getenv("RANK_SESSION_TTL", "1800"))
+
+# Components invalidated by each profile field
+FIELD_COMPONENTS = {
+    'average': {'grade'},
+    'courses_taken': {'penalty'},
+    'grade_level': {'weights', 'penalty'},
+    'major_interests': {'interest'},
+    'extra_curriculars': {'ec'},
+    'wants_coop': {'coop'},
+}
+ALL_COMPONENTS = {'grade', 'penalty', 'weights', 'interest', 'ec', 'coop'}
+
+
+class RankingSession:
+    """
+    A profile and its component vectors for one catalog.
+
+    grade_score, bonus, penalty, academic, interest, ec and coop are
+    per-program sequences (NumPy arrays with the vectorized engine).
+    """
+
+    def __init__(self, session_id, profile, catalog):
+        self.session_id = session_id
+        self.profile = dict(profile)
+        self.catalog = catalog
+        self.expires_at = 0.0
+        self.lock = threading.Lock()
+        self.matcher = None
+        self.vectorized = False
+        self.grade_score = self.bonus = self.penalty = None
+        self.academic = self.interest = self.ec = self.coop = None
+        self.final = None
+        self.recompute(ALL_COMPONENTS)
+
+    def recompute(self, components):
+        """
+        Recompute the given components from the current profile, then the
+        academic and final scores.
+        """
+        catalog = self.catalog
+        self.matcher = matcher = UniversityMatcher(self.profile, catalog=catalog)
+        use_vectorized = matcher._use_vectorized(catalog)
+        if use_vectorized != self.vectorized or self.final is None:
+            components = set(ALL_COMPONENTS)  # Stored vectors are for the other engine
+        self.vectorized = use_vectorized
+
+        if self.vectorized:
+            from services import vectorized
+            np = vectorized.np
+            arrays = vectorized.get_arrays(catalog)
+            if 'grade' in components:
+                self.grade_score, self.bonus = vectorized.grade_components(self.profile['average'], arrays)
+            if 'penalty' in components:
+                group_penalty = np.array(matcher._requirement_group_penalties(catalog), dtype=np.float64)
+                self.penalty = group_penalty[arrays.requirement_group] if matcher.grade == 12 else 1.0
+            if 'interest' in components:
+                self.interest = vectorized.interest_scores(self.profile['major_interests'], catalog, arrays)
+            if 'ec' in components:
+                self.ec = vectorized.ec_scores(matcher._user_best_ec(), arrays)[arrays.program_university]
+            if 'coop' in components:
+                self.coop = vectorized.coop_fit(self.profile['wants_coop'], arrays)[arrays.program_university]
+            if components & {'grade', 'penalty'}:
+                self.academic = np.minimum(1.30, (self.grade_score * self.penalty) + self.bonus)
+        else:
+            program_university = catalog.program_university
+            if 'grade' in components:
+                parts = [matcher._grade_components(lo, hi) for lo, hi in zip(catalog.min_average, catalog.max_average)]
+                self.grade_score = [part[0] for part in parts]
+                self.bonus = [part[1] for part in parts]
+            if 'penalty' in components:
+                group_penalty = matcher._requirement_group_penalties(catalog)
+                self.penalty = [group_penalty[group] for group in catalog.requirement_group]
+            if 'interest' in components:
+                self.interest = matcher._interest_scores(catalog)
+            if 'ec' in components:
+                uni_ec = [matcher._calculate_ec_score(level) for level in catalog.university_ec_quality]
+                self.ec = [uni_ec[u] for u in program_university]
+            if 'coop' in components:
+                uni_coop = [matcher._calculate_coop_fit(options) for options in catalog.university_coop_options]
+                self.coop = [uni_coop[u] for u in program_university]
+            if components & {'grade', 'penalty'}:
+                self.academic = [
+                    min(1.30, (grade_score * penalty) + bonus)
+                    for grade_score, penalty, bonus in zip(self.grade_score, self.penalty, self.bonus)
+                ]
+
+        self._combine()
+
+    def _combine(self):
+        """
+        Final percentage scores from the stored components (same operations
+        as UniversityMatcher._score_catalog).
+        """
+        weights = self.matcher.weights
+        w_acad, w_int, w_ec = weights['academic'], weights['interest'], weights['ec']
+        if self.vectorized:
+            base_score = (self.academic * w_acad) + (self.interest * w_int) + (self.ec * w_ec)
+            self.final = base_score * self.coop * 100
+        else:
+            self.final = [
+                ((s_acad * w_acad) + (s_int * w_int) + (s_ec * w_ec)) * coop_mult * 100
+                for s_acad, s_int, s_ec, coop_mult in zip(self.academic, self.interest, self.ec, self.coop)
+            ]
+
+    def update(self, changes, catalog):
+        """
+        Apply a profile delta and recompute what it touches. A new catalog
+        (or engine) recomputes everything. Returns the recomputed components.
+        If recomputing fails (e.g. a value of the wrong type), the session is
+        left as it was before the update.
+        """
+        components = set()
+        for field, value in changes.items():
+            if self.profile.get(field) != value:
+                components |= FIELD_COMPONENTS[field]
+        if catalog is not self.catalog:
+            components = set(ALL_COMPONENTS)
+        if not components:
+            return []
+
+        saved = dict(vars(self))
+        self.profile = dict(self.profile, **changes)
+        self.catalog = catalog
+        try:
+            self.recompute(components)
+        except BaseException:
+            vars(self).update(saved)
+            raise
+        return sorted(components)
+
+    def rank(self, limit=None, offset=0, min_score=None):
+        """
+        (rows, total) for the current components, like rank_programs().
+        """
+        components = (self.final, self.academic, self.interest, self.ec, self.coop)
+        total, _, rows = rank_components(self.catalog, components, limit, offset, min_score)
+        with stage("rows"):
+            return list(rows), total
+
+
+def parse_profile_changes(payload):
+    """
+    The profile fields present in a session update payload; empty for an
+    update that only pages. Raises ValueError if they hold non-finite numbers.
+    """
+    changes = {field: payload[field] for field in REQUIRED_PROFILE_FIELDS if field in payload}
+    invalid_fields = non_finite_fields(changes)
+    if invalid_fields:
+        raise ValueError(f"Non-finite numbers in: {', '.join(invalid_fields)}")
+    return changes
+
+
+class SessionStore:
+    """
+    Thread-safe LRU of ranking sessions with idle expiry, bounded by session
+    count and by the programs held across sessions.
+    """
+
+    def __init__(self, max_sessions=RANK_SESSION_MAX, ttl=RANK_SESSION_TTL, max_programs=RANK_SESSION_MAX_PROGRAMS):
+        self.max_sessions = max_sessions
+        self.max_programs = max_programs
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def programs(self):
+        """
+        Programs held across live sessions.
+        """
+        with self._lock:
+            return self._programs()
+
+    def _programs(self):
+        return sum(len(session.catalog) for session in self._sessions.values())
+
+    def create(self, profile, catalog=None):
+        """
+        Score a profile and keep its components in a new session.
+        """
+        with stage("score"):
+            session = RankingSession(secrets.token_urlsafe(16), profile, catalog or get_catalog())
+        with self._lock:
+            self._expire()
+            session.expires_at = time.monotonic() + self.ttl
+            self._sessions[session.session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            # The new session is kept even if it alone is over the limit
+            programs = self._programs()
+            while programs > self.max_programs and len(self._sessions) > 1:
+                _, evicted = self._sessions.popitem(last=False)
+                programs -= len(evicted.catalog)
+        return session
+
+    def get(self, session_id):
+        """
+        Return a live session (refreshing its expiry), or None.
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            now = time.monotonic()
+            if session.expires_at <= now:
+                del self._sessions[session_id]
+                return None
+            session.expires_at = now + self.ttl
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def _expire(self):
+        now = time.monotonic()
+        expired = [sid for sid, session in self._sessions.items() if session.expires_at <= now]
+        for sid in expired:
+            del self._sessions[sid]
+
+
+# Process-wide sessions used by the API
+ranking_sessions = SessionStore()
+
+
+@register_collector
+def _session_metrics():
+    return [
+        ("ranking_sessions", "gauge", "Live re-ranking sessions", len(ranking_sessions)),
+        ("ranking_session_programs", "gauge", "Programs held across live re-ranking sessions",
+         ranking_sessions.programs()),
+    ]
@@ -0,0 +1,421 @@
+"""
+Shared catalog files - one compiled catalog mapped read-only by every worker.
+
+With several prefork workers, each one would otherwise fetch, compile and hold
+its own copy of the catalog. When CATALOG_SHARED_DIR is set, the first worker
+to load a catalog version publishes the compiled table to a file there, and
+every worker (including batch pool processes) maps that file instead:
+numeric columns are used in place through memoryviews over the mapping, and
+strings are stored once in an interned string table.
+
+File layout (all blocks 8-byte aligned):
+    8 bytes   magic
+    8 bytes   header length (little-endian)
+    header    JSON: version, counts and {block: [offset, typecode, itemsize, length, bytes]}
+    blocks    raw column arrays, the band tables (float64, see
+              services.band_tables), the interned string table (JSON) and the
+              raw catalog (JSON, only decoded if something asks for catalog.source)
+
+Generations are named after the catalog version and swapped in by atomically
+replacing the "current" pointer file, which workers read to cold-start from
+the last published generation while MongoDB is unreachable.
+
+Publishing is serialized across processes with an exclusive flock on
+"publish.lock": the first worker to see a new version fetches, compiles and
+publishes it, and the others wait for it and then map the published file.
+Every process holds a shared flock on each generation it has mapped, and a
+generation is only unlinked once nobody holds it, so tables still in use
+(including ones pickled by path to batch workers) stay valid. Without fcntl
+(Windows) there is no cross-process locking.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+from array import array
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+from services import band_tables
+from services.catalog import CompiledCatalog
+from services.metrics import stage
+
+CATALOG_SHARED_DIR = os.getenv("CATALOG_SHARED_DIR")
+# Newest published generations always kept on disk; older ones are unlinked
+# once no process has them mapped
+CATALOG_SHARED_KEEP = int(os.getenv("CATALOG_SHARED_KEEP", "2"))
+
+MAGIC = b"ATCAT\x00\x01\x00"
+POINTER_NAME = "current.json"
+LOCK_NAME = "publish.lock"
+
+# Numeric columns stored as raw arrays: name -> typecode
+_COLUMNS = {
+    "university_ec_quality": "d",
+    "university_coop_yes": "b",
+    "university_coop_no": "b",
+    "program_university": "i",
+    "min_average": "d",
+    "max_average": "d",
+    "requirement_group": "i",
+    "tag_count": "i",
+}
+
+
+class InternedColumn:
+    """
+    Read-only sequence of strings stored as indexes into a shared string table.
+    """
+
+    __slots__ = ("_ids", "_table")
+
+    def __init__(self, ids, table):
+        self._ids = ids
+        self._table = table
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __getitem__(self, index):
+        return self._table[self._ids[index]]
+
+    def __iter__(self):
+        table = self._table
+        return (table[i] for i in self._ids)
+
+
+class _LazyJSONColumn:
+    """
+    Read-only sequence decoded from a JSON block on first access.
+    """
+
+    __slots__ = ("_view", "_values", "_wrap")
+
+    def __init__(self, view, wrap=None):
+        self._view = view
+        self._values = None
+        self._wrap = wrap
+
+    def _load(self):
+        if self._values is None:
+            values = json.loads(bytes(self._view))
+            self._values = [self._wrap(v) for v in values] if self._wrap else values
+        return self._values
+
+    def __len__(self):
+        return len(self._load())
+
+    def __getitem__(self, index):
+        return self._load()[index]
+
+    def __iter__(self):
+        return iter(self._load())
+
+
+def generation_path(version, directory=None):
+    """
+    File a catalog version is published to.
+    """
+    digest = hashlib.sha1(str(version).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(directory or CATALOG_SHARED_DIR, f"catalog-{digest}.bin")
+
+
+def _intern(strings, table, index):
+    ids = array("i")
+    for value in strings:
+        i = index.get(value)
+        if i is None:
+            i = index[value] = len(table)
+            table.append(value)
+        ids.append(i)
+    return ids
+
+
+def publish(catalog, directory=None):
+    """
+    Write a compiled catalog to a new shared generation and point "current"
+    at it. With BAND_TABLES on, the catalog's band tables are built here and
+    stored with it, so readers don't build their own. Returns the path of
+    the generation file.
+    """
+    directory = directory or CATALOG_SHARED_DIR
+    os.makedirs(directory, exist_ok=True)
+    path = generation_path(catalog.version, directory)
+
+    # Interned string table shared by every string column
+    table, index = [], {}
+    program_name_ids = _intern(catalog.program_names, table, index)
+    university_name_ids = _intern(catalog.university_names, table, index)
+    tag_names = list(catalog.tag_postings)
+    tag_name_ids = _intern(tag_names, table, index)
+
+    # Tag postings in CSR form: tag_offsets[t]..tag_offsets[t + 1] in tag_programs
+    tag_offsets, tag_programs = array("q", [0]), array("i")
+    for tag in tag_names:
+        tag_programs.extend(catalog.tag_postings[tag])
+        tag_offsets.append(len(tag_programs))
+
+    columns = {name: array(typecode, getattr(catalog, name)) for name, typecode in _COLUMNS.items()}
+    columns.update({
+        "program_name_ids": program_name_ids,
+        "university_name_ids": university_name_ids,
+        "tag_name_ids": tag_name_ids,
+        "tag_offsets": tag_offsets,
+        "tag_programs": tag_programs,
+    })
+    blobs = {
+        "strings": table,
+        "university_coop_options": catalog.university_coop_options,
+        "required_courses": catalog.required_courses,
+        "interests": catalog.interests,
+        "course_alternatives": catalog.course_alternatives,
+        # Masks can exceed 64 bits, JSON keeps them exact
+        "requirement_groups": catalog.requirement_groups,
+        "source": catalog.source,
+    }
+
+    blocks = [(name, column.typecode, column.itemsize, len(column), column.tobytes()) for name, column in columns.items()]
+    band_grid = None
+    if band_tables.BAND_TABLES and catalog.version is not None:
+        with stage("band_tables"):
+            tables = band_tables.build_tables(catalog)
+        band_grid = band_tables.grid()
+        for name in band_tables.BandTables.NAMES:
+            table = getattr(tables, name)
+            blocks.append((f"band_{name}", "d", table.itemsize, len(table), table.tobytes()))
+    blocks += [(name, "json", 1, None, json.dumps(value, separators=(",", ":")).encode("utf-8")) for name, value in blobs.items()]
+
+    # Block offsets are relative to the (aligned) end of the header
+    layout, offset = {}, 0
+    for name, typecode, itemsize, length, data in blocks:
+        layout[name] = [offset, typecode, itemsize, length, len(data)]
+        offset = _align(offset + len(data))
+    header = json.dumps({
+        "version": catalog.version,
+        "programs": len(catalog),
+        "universities": catalog.university_count,
+        "band_tables": band_grid,
+        "blocks": layout,
+    }, separators=(",", ":")).encode("utf-8")
+    data_start = _align(len(MAGIC) + 8 + len(header))
+
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, "little"))
+        f.write(header)
+        for name, _, _, _, data in blocks:
+            f.seek(data_start + layout[name][0])
+            f.write(data)
+    os.replace(tmp_path, path)
+
+    _write_pointer(directory, catalog.version, path)
+    _prune_generations(directory)
+    return path
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def _write_pointer(directory, version, path):
+    pointer = os.path.join(directory, POINTER_NAME)
+    tmp_pointer = f"{pointer}.tmp.{os.getpid()}"
+    with open(tmp_pointer, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "path": os.path.basename(path)}, f)
+    os.replace(tmp_pointer, pointer)
+
+
+@contextmanager
+def _publish_lock(directory):
+    """
+    Hold the directory's exclusive publish lock (a no-op without fcntl).
+    """
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, LOCK_NAME), "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        yield
+
+
+def _prune_generations(directory):
+    """
+    Unlink generations older than the newest CATALOG_SHARED_KEEP that no
+    process has mapped (nobody holds their shared lock).
+    """
+    generations = []
+    for name in os.listdir(directory):
+        if name.startswith("catalog-") and name.endswith(".bin"):
+            path = os.path.join(directory, name)
+            try:
+                generations.append((os.path.getmtime(path), path))
+            except FileNotFoundError:
+                pass  # Pruned by another worker meanwhile
+    generations.sort(reverse=True)
+    for _, path in generations[max(1, CATALOG_SHARED_KEEP):]:
+        try:
+            with open(path, "rb") as f:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue  # Still mapped somewhere
+                os.unlink(path)
+        except OSError:
+            pass
+
+
+def current_generation(directory=None):
+    """
+    (version, path) of the most recently published generation, or None.
+    """
+    directory = directory or CATALOG_SHARED_DIR
+    try:
+        with open(os.path.join(directory, POINTER_NAME), "r", encoding="utf-8") as f:
+            pointer = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return pointer["version"], os.path.join(directory, pointer["path"])
+
+
+def open_current(directory=None):
+    """
+    The most recently published generation as a CompiledCatalog, or None if
+    there is none (or it can't be read).
+    """
+    current = current_generation(directory)
+    if current is None:
+        return None
+    try:
+        return open_catalog(current[1])
+    except (OSError, ValueError):
+        return None
+
+
+def _read_header(mapped, path):
+    """
+    (header, data offset) of a mapped generation, after checking that every
+    block is inside the file and was written with this platform's item
+    sizes. Raises ValueError for anything else.
+    """
+    header_start = len(MAGIC) + 8
+    if len(mapped) < header_start or mapped[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"'{path}' is not a shared catalog file")
+    header_size = int.from_bytes(mapped[len(MAGIC):header_start], "little")
+    data_start = _align(header_start + header_size)
+    try:
+        header = json.loads(mapped[header_start:header_start + header_size])
+        blocks = list(header["blocks"].values())
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"Shared catalog '{path}' has a corrupt header") from e
+    for offset, typecode, itemsize, _, nbytes in blocks:
+        if data_start + offset + nbytes > len(mapped):
+            raise ValueError(f"Shared catalog '{path}' is truncated")
+        if typecode != "json" and array(typecode).itemsize != itemsize:
+            raise ValueError(f"Shared catalog '{path}' was written on an incompatible platform")
+    return header, data_start
+
+
+def open_catalog(path):
+    """
+    Map a published generation read-only and return it as a CompiledCatalog.
+    Raises FileNotFoundError if the generation was pruned and ValueError if
+    it's corrupt or truncated; the file and its lock are released either way.
+    """
+    f = open(path, "rb")
+    mapped = None
+    try:
+        if fcntl is not None:
+            # Held while the table is alive, so the file isn't pruned under it
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH)
+            if os.fstat(f.fileno()).st_ino != os.stat(path).st_ino:
+                raise FileNotFoundError(f"Shared catalog '{path}' was replaced")
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header, data_start = _read_header(mapped, path)
+
+        # Everything decoded up front is read from the map before any view
+        # holds it open, so a corrupt block still lets the map be closed
+        def decode(name):
+            offset, _, _, _, nbytes = header["blocks"][name]
+            return json.loads(mapped[data_start + offset:data_start + offset + nbytes])
+
+        decoded = {name: decode(name) for name in
+                   ("strings", "university_coop_options", "course_alternatives", "requirement_groups")}
+    except BaseException:
+        if mapped is not None:
+            mapped.close()
+        f.close()
+        raise
+
+    view = memoryview(mapped)
+
+    def block(name):
+        offset, typecode, itemsize, length, nbytes = header["blocks"][name]
+        data = view[data_start + offset:data_start + offset + nbytes]
+        return data if typecode == "json" else data.cast(typecode)
+
+    strings = decoded["strings"]
+
+    catalog = CompiledCatalog(version=header["version"])
+    catalog.shared_path = path
+    catalog._shared_file = f
+    catalog._load_source = lambda: json.loads(bytes(block("source")))
+
+    for name in _COLUMNS:
+        setattr(catalog, name, block(name))
+    catalog.university_names = InternedColumn(block("university_name_ids"), strings)
+    catalog.program_names = InternedColumn(block("program_name_ids"), strings)
+    catalog.university_coop_options = [tuple(o) for o in decoded["university_coop_options"]]
+    catalog.required_courses = _LazyJSONColumn(block("required_courses"), tuple)
+    catalog.interests = _LazyJSONColumn(block("interests"), tuple)
+
+    tag_offsets, tag_programs = block("tag_offsets"), block("tag_programs")
+    catalog.tag_postings = {
+        strings[name_id]: tag_programs[tag_offsets[t]:tag_offsets[t + 1]]
+        for t, name_id in enumerate(block("tag_name_ids"))
+    }
+
+    catalog.course_alternatives = decoded["course_alternatives"]
+    catalog.requirement_groups = [tuple(group) for group in decoded["requirement_groups"]]
+    catalog._alternative_bits = {alt: 1 << i for i, alt in enumerate(catalog.course_alternatives)}
+    catalog._group_ids = {}
+
+    # Only used if this worker's table grid matches the publisher's
+    if header.get("band_tables") == band_tables.grid():
+        catalog.shared_band_tables = band_tables.BandTables(
+            header["version"], header["programs"], band_tables.average_steps(),
+            *(block(f"band_{name}") for name in band_tables.BandTables.NAMES), shared=True)
+    return catalog
+
+
+def _open_published(path):
+    try:
+        return open_catalog(path)
+    except FileNotFoundError:
+        return None
+
+
+def load_or_publish(version, build):
+    """
+    Return the shared table for a catalog version, mapping an existing
+    generation if another worker already published it, or building it with
+    build() (which returns a CompiledCatalog) and publishing it otherwise.
+    Only one process builds a version; the others wait for the publish lock
+    and map its file.
+    """
+    path = generation_path(version)
+    catalog = _open_published(path)
+    if catalog is None:
+        with _publish_lock(CATALOG_SHARED_DIR):
+            catalog = _open_published(path)  # Published while we waited
+            if catalog is None:
+                catalog = open_catalog(publish(build()))
+                return catalog
+    if (current_generation() or (None,))[0] != version:
+        _write_pointer(CATALOG_SHARED_DIR, version, path)
+    return catalog
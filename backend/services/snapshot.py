@@ -0,0 +1,68 @@
+"""
+Local catalog snapshot files - JSON lines, one university per line.
+
+Written by the catalog loader (services/loader.py) next to every MongoDB
+load, and read back by services.database to cold-start workers and
+benchmarks without MongoDB. Layout:
+
+    {"format": "admit-tree-catalog", "format_version": 1, "catalog_version": ..., "universities": N}
+    {"university": "University Name", "data": {"ec_quality": ..., "co-op": [...], "programs": {...}}}
+    ...
+"""
+
+import json
+import os
+from datetime import datetime, timezone
+
+SNAPSHOT_FORMAT = "admit-tree-catalog"
+SNAPSHOT_FORMAT_VERSION = 1
+
+
+def write_snapshot(university_db, path, catalog_version=None):
+    """
+    Write a catalog snapshot atomically (readers never see a partial file).
+    """
+    path = os.fspath(path)
+    header = {
+        "format": SNAPSHOT_FORMAT,
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "catalog_version": catalog_version,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "universities": len(university_db),
+    }
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(header, separators=(",", ":")) + "\n")
+        for uni_name, uni_data in university_db.items():
+            f.write(json.dumps({"university": uni_name, "data": uni_data}, separators=(",", ":")) + "\n")
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path):
+    """
+    Read a catalog snapshot. Returns (university_db, header).
+    Raises ValueError if the file isn't a catalog snapshot or a record is
+    malformed.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        header = json.loads(f.readline() or "null")
+        if not isinstance(header, dict) or header.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"'{path}' is not a catalog snapshot")
+        if header.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"Unsupported catalog snapshot version {header.get('format_version')} in '{path}'")
+
+        university_db = {}
+        for line_number, line in enumerate(f, start=2):
+            if line.strip():
+                record = json.loads(line)
+                try:
+                    university_db[record["university"]] = record["data"]
+                except (KeyError, TypeError) as e:
+                    raise ValueError(f"Malformed record on line {line_number} of catalog snapshot '{path}'") from e
+
+    if len(university_db) != header.get("universities"):
+        raise ValueError(f"Catalog snapshot '{path}' is truncated")
+    return university_db, header
@@ -0,0 +1,151 @@
+"""
+NumPy scoring engine - scores a whole compiled catalog with column arrays.
+
+Computes exactly the same formulas as the scalar methods on UniversityMatcher
+(same operations in the same order, in float64), so both engines produce
+identical scores. NumPy is optional; use is_available() before calling.
+"""
+
+try:
+    import numpy as np
+except ImportError:  # numpy is an optional dependency
+    np = None
+
+from services.matcher import competitiveness_tier
+
+
+def is_available():
+    """
+    True if NumPy is installed and the vectorized engine can be used.
+    """
+    return np is not None
+
+
+class CatalogArrays:
+    """
+    NumPy views of the numeric catalog columns, built once per catalog.
+    """
+
+    __slots__ = ("program_university", "min_average", "max_average", "tier_bonus", "requirement_group", "tag_count",
+                 "university_ec_quality", "university_coop_yes", "university_coop_no")
+
+    def __init__(self, catalog):
+        self.program_university = np.asarray(catalog.program_university, dtype=np.intp)
+        self.min_average = np.asarray(catalog.min_average, dtype=np.float64)
+        self.max_average = np.asarray(catalog.max_average, dtype=np.float64)
+        # The competitiveness tier only depends on max_avg, so it's profile independent
+        self.tier_bonus = np.array([competitiveness_tier(m) for m in catalog.max_average], dtype=np.float64)
+        self.requirement_group = np.asarray(catalog.requirement_group, dtype=np.intp)
+        self.tag_count = np.asarray(catalog.tag_count, dtype=np.float64)
+        self.university_ec_quality = np.asarray(catalog.university_ec_quality, dtype=np.float64)
+        self.university_coop_yes = np.asarray(catalog.university_coop_yes, dtype=bool)
+        self.university_coop_no = np.asarray(catalog.university_coop_no, dtype=bool)
+
+
+def get_arrays(catalog):
+    """
+    Return the (cached) CatalogArrays for a compiled catalog.
+    """
+    if catalog.arrays is None:
+        catalog.arrays = CatalogArrays(catalog)
+    return catalog.arrays
+
+
+def grade_components(user_avg, arrays):
+    """
+    Vectorized _grade_components for every program: (grade_score, bonus).
+    """
+    min_avg = arrays.min_average
+    max_avg = arrays.max_average
+    floor = min_avg - 5  # 5% buffer zone before scoring 0
+
+    # --- A. Grade Range Interpolation ---
+    with np.errstate(divide="ignore", invalid="ignore"):
+        interpolated = (user_avg - floor) / (max_avg - floor)
+    grade_score = np.where(user_avg >= max_avg, 1.0, np.where(user_avg < floor, 0.0, interpolated))
+
+    # --- C. Competitiveness Bonus (full at max_avg, partial within 2 points of it) ---
+    proximity = (user_avg - (max_avg - 2)) / 2
+    bonus = np.where(
+        user_avg >= max_avg,
+        arrays.tier_bonus,
+        np.where(user_avg >= (max_avg - 2), arrays.tier_bonus * proximity * 0.5, 0.0),
+    )
+    return grade_score, bonus
+
+
+def academic_scores(user_avg, course_penalty, arrays):
+    """
+    Vectorized _calculate_academic_score for every program.
+    course_penalty is a per-program array (or scalar 1.0).
+    """
+    grade_score, bonus = grade_components(user_avg, arrays)
+
+    # Cap at 1.30 like the scalar path
+    return np.minimum(1.30, (grade_score * course_penalty) + bonus)
+
+
+def ec_scores(user_best, arrays):
+    """
+    Vectorized _calculate_ec_score for every university.
+    """
+    required = arrays.university_ec_quality
+    return np.where(
+        user_best >= required,
+        1.0 + (0.05 * (user_best - required)),
+        np.maximum(0, 1.0 - (0.2 * (required - user_best))),
+    )
+
+
+def interest_scores(user_interests, catalog, arrays):
+    """
+    Interest coverage for every program, counted from the tag postings of the
+    student's distinct interests only.
+    """
+    postings = [catalog.tag_postings[tag] for tag in set(user_interests) if tag in catalog.tag_postings]
+    scores = np.zeros(len(catalog), dtype=np.float64)
+    if postings:
+        matches = np.bincount(np.concatenate([np.asarray(p, dtype=np.intp) for p in postings]), minlength=len(catalog))
+        hit = matches > 0
+        scores[hit] = matches[hit] / arrays.tag_count[hit]
+    return scores
+
+
+def coop_fit(wants_coop, arrays):
+    """
+    Vectorized _calculate_coop_fit for every university.
+    """
+    if wants_coop:
+        return np.where(arrays.university_coop_yes, 1.0, 0.85)
+    return np.where(arrays.university_coop_no, 1.0, 0.92)
+
+
+def score_catalog(matcher, catalog):
+    """
+    Score every program in the catalog for one matcher's profile.
+
+    Returns (final, academic, interest, ec, coop_fit) as float64 arrays indexed
+    by program id; final is the unrounded percentage score.
+    """
+    arrays = get_arrays(catalog)
+    user = matcher.user
+    weights = matcher.weights
+
+    if matcher.grade == 12:
+        group_penalty = np.array(matcher._requirement_group_penalties(catalog), dtype=np.float64)
+        course_penalty = group_penalty[arrays.requirement_group]
+    else:
+        course_penalty = 1.0
+
+    s_acad = academic_scores(user['average'], course_penalty, arrays)
+    s_int = interest_scores(user['major_interests'], catalog, arrays)
+    s_ec = ec_scores(matcher._user_best_ec(), arrays)[arrays.program_university]
+    coop_mult = coop_fit(user['wants_coop'], arrays)[arrays.program_university]
+
+    base_score = (
+        (s_acad * weights['academic']) +
+        (s_int * weights['interest']) +
+        (s_ec * weights['ec'])
+    )
+    final = base_score * coop_mult * 100
+    return final, s_acad, s_int, s_ec, coop_mult
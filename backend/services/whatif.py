@@ -0,0 +1,237 @@
+"""
+What-if sweeps - score curves for one profile across averages and grades.
+
+A sweep re-scores the catalog for every (grade_level, average) point. Only
+the academic score depends on the average, and only the weights and the
+course penalty depend on the grade, so interest, EC and co-op fit are
+computed once per sweep and the course penalty once per grade. With NumPy
+the academic score is evaluated as one (averages x programs) matrix per
+grade with the same formulas as services.vectorized; the scalar fallback
+reuses the shared components point by point. Scores are rounded,
+normalized and ranked per point, so every point's scores and ranks equal
+what /api/recommend returns for that profile.
+"""
+
+import math
+import os
+
+from services.matcher import UniversityMatcher, get_catalog
+
+# Maximum (grade_level, average) points in one sweep
+WHATIF_MAX_POINTS = int(os.getenv("WHATIF_MAX_POINTS", "400"))
+GRADE_LEVELS = (9, 10, 11, 12)
+
+
+def _number(value, name):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(f"'{name}' must be a finite number")
+    return value
+
+
+def parse_sweep_options(payload):
+    """
+    Read the sweep and limit from a request payload:
+    "sweep": {"average": {"start": 70, "stop": 100, "step": 0.5} or [80, 85, ...],
+              "grade_level": [11, 12]}
+    Either sweep key may be omitted to keep the profile's own value.
+    Returns {"averages", "grade_levels", "limit"}. Raises ValueError if malformed.
+    """
+    limit = payload.get('limit')
+    if limit is not None and (isinstance(limit, bool) or not isinstance(limit, int) or limit < 0):
+        raise ValueError("'limit' must be a non-negative integer")
+
+    sweep = payload.get('sweep')
+    if not isinstance(sweep, dict) or not sweep or set(sweep) - {'average', 'grade_level'}:
+        raise ValueError("'sweep' must be an object with 'average' and/or 'grade_level'")
+
+    averages = sweep.get('average', [payload['average']])
+    if isinstance(averages, dict):
+        if set(averages) != {'start', 'stop', 'step'}:
+            raise ValueError("'sweep.average' range must have 'start', 'stop' and 'step'")
+        start = _number(averages['start'], 'sweep.average.start')
+        stop = _number(averages['stop'], 'sweep.average.stop')
+        step = _number(averages['step'], 'sweep.average.step')
+        if step <= 0 or stop < start:
+            raise ValueError("'sweep.average' needs step > 0 and stop >= start")
+        count = int((stop - start) / step + 1e-9) + 1
+        if count > WHATIF_MAX_POINTS:
+            raise ValueError(f"At most {WHATIF_MAX_POINTS} sweep points, got {count} averages")
+        # Rounded so 70 + 3 * 0.1 is 70.3, not 70.30000000000001
+        averages = [round(start + i * step, 9) for i in range(count)]
+    elif isinstance(averages, list) and averages:
+        averages = [_number(a, 'sweep.average') for a in averages]
+    else:
+        raise ValueError("'sweep.average' must be a non-empty list or a {start, stop, step} range")
+
+    grade_levels = sweep.get('grade_level', [payload['grade_level']])
+    if not isinstance(grade_levels, list) or not grade_levels or any(g not in GRADE_LEVELS for g in grade_levels):
+        raise ValueError(f"'sweep.grade_level' must be a non-empty list of grades from {GRADE_LEVELS}")
+
+    if len(averages) * len(grade_levels) > WHATIF_MAX_POINTS:
+        raise ValueError(f"At most {WHATIF_MAX_POINTS} sweep points, got {len(averages) * len(grade_levels)}")
+    return {"averages": averages, "grade_levels": list(dict.fromkeys(grade_levels)), "limit": limit}
+
+
+def _finish_point(final):
+    """
+    Normalized scores and 1-based ranks for one point's unrounded final
+    scores (same rounding, normalization and tie order as select_ranking).
+    """
+    scores = [round(score, 1) for score in final]
+    max_score = max(scores)
+    if max_score > 100:
+        factor = 100 / max_score
+        normalized = [round(score * factor, 1) for score in scores]
+    else:
+        normalized = scores
+    ranks = [0] * len(scores)
+    for rank, i in enumerate(sorted(range(len(scores)), key=scores.__getitem__, reverse=True), start=1):
+        ranks[i] = rank
+    return normalized, ranks
+
+
+def _round1(np, values):
+    """
+    round(value, 1) for every element, matching Python's correctly rounded
+    result. np.round scales by 10 first, which can land on the wrong side of
+    a .x5 tie, so values within float error of a tie are rounded in Python.
+    """
+    rounded = np.round(values, 1)
+    scaled = values * 10
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_tie.any():
+        rounded[near_tie] = [round(value, 1) for value in values[near_tie].tolist()]
+    return rounded
+
+
+def _sweep_numpy(profile, points, catalog):
+    from services import vectorized
+    np = vectorized.np
+
+    arrays = vectorized.get_arrays(catalog)
+    base = UniversityMatcher(profile, catalog=catalog)
+    s_int = vectorized.interest_scores(profile['major_interests'], catalog, arrays)
+    s_ec = vectorized.ec_scores(base._user_best_ec(), arrays)[arrays.program_university]
+    coop_mult = vectorized.coop_fit(profile['wants_coop'], arrays)[arrays.program_university]
+
+    final = np.empty((len(points), len(catalog)), dtype=np.float64)
+    for grade in dict.fromkeys(grade for grade, _ in points):
+        rows = [j for j, point in enumerate(points) if point[0] == grade]
+        matcher = UniversityMatcher(dict(profile, grade_level=grade), catalog=catalog)
+        weights = matcher.weights
+        if grade == 12:
+            group_penalty = np.array(matcher._requirement_group_penalties(catalog), dtype=np.float64)
+            course_penalty = group_penalty[arrays.requirement_group]
+        else:
+            course_penalty = 1.0
+
+        # One (averages x programs) matrix per grade
+        user_avg = np.array([points[j][1] for j in rows], dtype=np.float64)[:, None]
+        s_acad = vectorized.academic_scores(user_avg, course_penalty, arrays)
+        base_score = (
+            (s_acad * weights['academic']) +
+            (s_int * weights['interest']) +
+            (s_ec * weights['ec'])
+        )
+        final[rows] = base_score * coop_mult * 100
+
+    scores = _round1(np, final)
+    max_scores = scores.max(axis=1, keepdims=True)
+    factor = np.where(max_scores > 100, 100 / max_scores, 1.0)
+    normalized = np.where(max_scores > 100, _round1(np, scores * factor), scores)
+
+    # Stable sort on the negated scores keeps ties in catalog order
+    order = np.argsort(-scores, axis=1, kind="stable")
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(1, len(catalog) + 1), axis=1)
+    return normalized, ranks
+
+
+def _sweep_python(profile, points, catalog):
+    base = UniversityMatcher(profile, catalog=catalog)
+    uni_ec = [base._calculate_ec_score(level) for level in catalog.university_ec_quality]
+    uni_coop = [base._calculate_coop_fit(options) for options in catalog.university_coop_options]
+    interest = base._interest_scores(catalog)
+    program_university = catalog.program_university
+    requirement_group = catalog.requirement_group
+
+    matchers, normalized, ranks = {}, [], []
+    for grade, average in points:
+        if grade not in matchers:
+            matcher = UniversityMatcher(dict(profile, grade_level=grade), catalog=catalog)
+            matchers[grade] = (matcher, matcher._requirement_group_penalties(catalog))
+        matcher, group_penalty = matchers[grade]
+        weights = matcher.weights
+        matcher.user = dict(matcher.user, average=average)
+
+        final = []
+        for i, uni_index in enumerate(program_university):
+            s_acad = matcher._calculate_academic_score(
+                catalog.min_average[i], catalog.max_average[i], None,
+                course_penalty=group_penalty[requirement_group[i]]
+            )
+            base_score = (
+                (s_acad * weights['academic']) +
+                (interest[i] * weights['interest']) +
+                (uni_ec[uni_index] * weights['ec'])
+            )
+            final.append(base_score * uni_coop[uni_index] * 100)
+        point_scores, point_ranks = _finish_point(final)
+        normalized.append(point_scores)
+        ranks.append(point_ranks)
+    return normalized, ranks
+
+
+def _program_columns(matrix, order):
+    """
+    One list per program in order, holding its value at every point.
+    """
+    if isinstance(matrix, list):
+        return [[row[i] for row in matrix] for i in order]
+    return matrix[:, order].T.tolist()
+
+
+def sweep_profile(profile, averages, grade_levels, limit=None, catalog=None, engine=None):
+    """
+    Score curves for every program across the sweep points (grade-major).
+
+    Programs are ordered by their rank for the profile as given, which is
+    scored along with the sweep; limit keeps only the top ones. Each program
+    gets its normalized score and rank at every point, and its rank change
+    (positive means it moves up) relative to the profile as given.
+    """
+    catalog = catalog if catalog is not None else get_catalog()
+    base_point = (profile['grade_level'], profile['average'])
+    points = [(grade, average) for grade in grade_levels for average in averages]
+    if len(catalog) == 0:
+        return {"points": [], "base": None, "programs": [], "total_programs": 0}
+
+    # The profile as given is scored as one more point
+    matcher = UniversityMatcher(profile, catalog=catalog, engine=engine)
+    sweep = _sweep_numpy if matcher._use_vectorized(catalog) else _sweep_python
+    normalized, ranks = sweep(profile, points + [base_point], catalog)
+
+    base_ranks = ranks[-1] if isinstance(ranks, list) else ranks[-1].tolist()
+    order = sorted(range(len(catalog)), key=base_ranks.__getitem__)
+    if limit is not None:
+        order = order[:limit]
+
+    programs = []
+    for i, scores, program_ranks in zip(order, _program_columns(normalized, order), _program_columns(ranks, order)):
+        base_score, base_rank = scores.pop(), program_ranks.pop()
+        programs.append({
+            "university": catalog.university_names[catalog.program_university[i]],
+            "program": catalog.program_names[i],
+            "base_score": base_score,
+            "base_rank": base_rank,
+            "scores": scores,
+            "ranks": program_ranks,
+            "rank_changes": [base_rank - rank for rank in program_ranks],
+        })
+
+    return {
+        "points": [{"grade_level": grade, "average": average} for grade, average in points],
+        "base": {"grade_level": base_point[0], "average": base_point[1]},
+        "programs": programs,
+        "total_programs": len(catalog),
+    }
@@ -0,0 +1,91 @@
+"""
+Shared fixtures: seeded synthetic catalogs and profiles (benchmarks/synthetic.py).
+"""
+
+import pytest
+
+from benchmarks.synthetic import generate_catalog, generate_profiles
+from services import band_tables, database, filters, result_cache
+from services.catalog import compile_catalog
+
+
+def with_twins(university_db):
+    """
+    Copy of a raw catalog where every university is followed by an identical
+    twin, so every program has an exact tie later in catalog order.
+    """
+    twinned = {}
+    for uni_name, uni_data in university_db.items():
+        twinned[uni_name] = uni_data
+        twinned[f"{uni_name} (twin)"] = uni_data
+    return twinned
+
+
+def edge_profiles():
+    """
+    Profiles at the edges of the scoring formulas: perfect averages (scores
+    above 100, so rankings are normalized), no interests, courses or ECs.
+    """
+    return [
+        {"grade_level": 12, "average": 100, "wants_coop": True, "extra_curriculars": [["captain", 5]],
+         "major_interests": ["software", "ai", "math"], "courses_taken": [["ENG4U", 99], ["MCV4U", 98]]},
+        {"grade_level": 12, "average": 55, "wants_coop": False, "extra_curriculars": [],
+         "major_interests": [], "courses_taken": []},
+        {"grade_level": 11, "average": 91.5, "wants_coop": False, "extra_curriculars": [["club", 2], ["team", 4]],
+         "major_interests": ["software", "software", "unknown-tag"], "courses_taken": [["MCR3U", 90]]},
+        {"grade_level": 9, "average": 88, "wants_coop": True, "extra_curriculars": [["band", 1]],
+         "major_interests": ["music", "history"], "courses_taken": []},
+    ]
+
+
+@pytest.fixture(autouse=True)
+def live_scoring(monkeypatch):
+    """
+    Score live: versioned test catalogs would otherwise start background
+    band table builds shared between tests. Band table tests enable them.
+    """
+    monkeypatch.setattr(band_tables, "BAND_TABLES", False)
+    yield
+    band_tables.clear()
+
+
+@pytest.fixture(autouse=True)
+def fresh_selections():
+    """
+    Narrowed catalogs are cached by catalog version, which tests reuse.
+    """
+    filters._selections.clear()
+    yield
+    filters._selections.clear()
+
+
+@pytest.fixture(scope="session")
+def university_db():
+    return with_twins(generate_catalog(300, seed=7, programs_per_university=25))
+
+
+@pytest.fixture(scope="session")
+def catalog(university_db):
+    return compile_catalog(university_db)
+
+
+@pytest.fixture(scope="session")
+def profiles():
+    return edge_profiles() + generate_profiles(24, seed=11)
+
+
+@pytest.fixture
+def client(university_db, monkeypatch):
+    """
+    Flask test client for app.py, serving university_db as catalog version "v1".
+    """
+    import app as app_module
+
+    monkeypatch.setattr(database, "MONGODB_URI", "mongodb://unreachable")
+    monkeypatch.setattr(database, "get_catalog_version", lambda: "v1")
+    monkeypatch.setattr(database, "fetch_university_data", lambda: university_db)
+    database.invalidate_catalog_cache()
+    result_cache.recommendation_cache.clear()
+    yield app_module.app.test_client()
+    database.invalidate_catalog_cache()
+    result_cache.recommendation_cache.clear()
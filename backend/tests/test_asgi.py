@@ -0,0 +1,77 @@
+"""
+ASGI entry point: Flask views served from the event loop, and the
+concurrency limit.
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from services import async_database
+
+
+@pytest.fixture
+def asgi_app(client, monkeypatch):
+    """
+    asgi.app serving the client fixture's catalog through the synchronous
+    refresh.
+    """
+    import asgi
+
+    monkeypatch.setattr(async_database, "async_driver_available", lambda: False)
+    return asgi
+
+
+def call(app, method, path, payload=None, query=b""):
+    """
+    Send one HTTP request through an ASGI app. Returns (status, headers, body).
+    """
+    body = b"" if payload is None else json.dumps(payload).encode()
+    scope = {
+        "type": "http", "method": method, "path": path, "query_string": query,
+        "headers": [(b"content-type", b"application/json")],
+    }
+    requests = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return requests.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start = sent[0]
+    headers = {name.decode(): value.decode() for name, value in start["headers"]}
+    return start["status"], headers, b"".join(m.get("body", b"") for m in sent[1:])
+
+
+def test_recommend_matches_the_flask_view(asgi_app, client, profiles):
+    payload = dict(profiles[3], limit=20)
+    status, _, body = call(asgi_app.app, "POST", "/api/recommend", payload)
+
+    assert status == 200
+    assert json.loads(body) == client.post("/api/recommend", json=payload).get_json()
+
+
+def test_ndjson_is_relayed_chunk_by_chunk(asgi_app, client, profiles):
+    payload = dict(profiles[4], limit=40)
+    status, headers, body = call(asgi_app.app, "POST", "/api/recommend", payload, query=b"format=ndjson")
+
+    assert status == 200
+    assert headers["content-type"] == "application/x-ndjson"
+    expected = client.post("/api/recommend?format=ndjson", json=payload).get_data()
+    assert body.splitlines() == expected.splitlines()
+
+
+def test_requests_past_the_limit_get_a_503(asgi_app, profiles, monkeypatch):
+    monkeypatch.setattr(asgi_app, "_in_flight", asgi_app.ASYNC_MAX_CONCURRENCY)
+    rejected = asgi_app.REJECTED.value()
+
+    status, headers, body = call(asgi_app.app, "POST", "/api/recommend", profiles[0])
+
+    assert status == 503
+    assert headers["retry-after"] == asgi_app.ASYNC_RETRY_AFTER
+    assert json.loads(body)["error"] == "Server busy"
+    assert asgi_app.REJECTED.value() == rejected + 1
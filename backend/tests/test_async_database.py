@@ -0,0 +1,91 @@
+"""
+Async catalog refresh (services.async_database) against shared generations.
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from services import async_database, database, shared_catalog
+
+
+@pytest.fixture
+def async_mongo(university_db, tmp_path, monkeypatch):
+    """
+    An async driver serving university_db at version "v7" with a shared
+    catalog directory. Returns the list of fetches.
+    """
+    fetches = []
+
+    async def version():
+        return "v7"
+
+    async def fetch():
+        fetches.append(True)
+        return university_db
+
+    monkeypatch.setattr(async_database, "async_driver_available", lambda: True)
+    monkeypatch.setattr(async_database, "get_catalog_version_async", version)
+    monkeypatch.setattr(async_database, "fetch_university_data_async", fetch)
+    monkeypatch.setattr(shared_catalog, "CATALOG_SHARED_DIR", str(tmp_path))
+    database.invalidate_catalog_cache()
+    yield fetches
+    database.invalidate_catalog_cache()
+
+
+def refresh():
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        return asyncio.run(async_database.refresh_catalog_async(executor))
+
+
+def test_cold_refresh_fetches_and_installs_the_catalog(async_mongo, catalog):
+    refreshed = refresh()
+
+    assert refreshed.version == "v7"
+    assert list(refreshed.program_names) == list(catalog.program_names)
+    assert database.catalog_state()[0] is refreshed
+    assert async_mongo == [True]
+
+
+def test_concurrent_cold_requests_fetch_once(async_mongo, monkeypatch):
+    fetch = async_database.fetch_university_data_async
+
+    async def slow_fetch():
+        await asyncio.sleep(0.1)
+        return await fetch()
+
+    monkeypatch.setattr(async_database, "fetch_university_data_async", slow_fetch)
+    monkeypatch.setattr(async_database, "_refresh_lock", None)
+
+    async def requests(executor):
+        return await asyncio.gather(*(async_database.get_catalog_async(executor) for _ in range(8)))
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        loaded = asyncio.run(requests(executor))
+
+    assert len({id(c) for c in loaded}) == 1
+    assert async_mongo == [True]
+
+
+def test_published_generation_is_mapped_without_fetching(async_mongo, catalog):
+    shared_catalog.publish(database.compile_catalog(catalog.source, version="v7"))
+
+    refreshed = refresh()
+
+    assert refreshed.shared_path == shared_catalog.generation_path("v7")
+    assert async_mongo == []
+
+
+def test_generation_pruned_before_mapping_is_fetched(async_mongo, catalog, monkeypatch):
+    path = shared_catalog.generation_path("v7")
+    exists = os.path.exists
+    # The existence check sees the generation, which is gone when it's mapped
+    monkeypatch.setattr(os.path, "exists", lambda p: p == path or exists(p))
+
+    refreshed = refresh()
+
+    assert refreshed.version == "v7"
+    assert list(refreshed.program_names) == list(catalog.program_names)
+    assert async_mongo == [True]
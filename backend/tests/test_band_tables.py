@@ -0,0 +1,114 @@
+"""
+Band tables: both builds are identical, scoring from them equals live
+scoring, and shared catalog generations carry them.
+"""
+
+import json
+
+import pytest
+
+from services import band_tables, shared_catalog
+from services.catalog import compile_catalog
+from services.matcher import UniversityMatcher
+
+ENGINES = ["python", "numpy"]
+
+
+@pytest.fixture
+def tables_enabled(monkeypatch):
+    monkeypatch.setattr(band_tables, "BAND_TABLES", True)
+
+
+@pytest.fixture
+def versioned(catalog):
+    return compile_catalog(catalog.source, version="tables-v1")
+
+
+def on_grid(profiles):
+    step = band_tables.BAND_AVERAGE_STEP
+    return [dict(p, average=min(100, round(p['average'] / step) * step)) for p in profiles]
+
+
+def ranks_from_tables(profiles, catalog, engine):
+    rankings = []
+    for profile in profiles:
+        matcher = UniversityMatcher(profile, catalog=catalog, engine=engine)
+        tables = band_tables.get_tables(catalog)
+        assert tables is not None
+        assert band_tables.score_catalog(matcher, catalog, tables, engine == "numpy") is not None
+        rankings.append(matcher.rank_programs(limit=40))
+    return rankings
+
+
+def ranks_live(profiles, catalog, engine, monkeypatch):
+    monkeypatch.setattr(band_tables, "BAND_TABLES", False)
+    rankings = [UniversityMatcher(p, catalog=catalog, engine=engine).rank_programs(limit=40) for p in profiles]
+    monkeypatch.setattr(band_tables, "BAND_TABLES", True)
+    return rankings
+
+
+def test_scalar_and_numpy_builds_are_identical(versioned):
+    pytest.importorskip("numpy")
+    scalar = band_tables.build_tables(versioned, vectorized=False)
+    vector = band_tables.build_tables(versioned, vectorized=True)
+    for name in band_tables.BandTables.NAMES:
+        assert getattr(scalar, name).tobytes() == getattr(vector, name).tobytes()
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_table_scores_equal_live_scores(tables_enabled, versioned, profiles, monkeypatch, engine):
+    if engine == "numpy":
+        pytest.importorskip("numpy")
+    band_tables.install_tables(band_tables.build_tables(versioned))
+    grid_profiles = on_grid(profiles)
+    expected = ranks_live(grid_profiles, versioned, engine, monkeypatch)
+    assert ranks_from_tables(grid_profiles, versioned, engine) == expected
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_shared_generation_carries_the_tables(tables_enabled, versioned, profiles, tmp_path, monkeypatch, engine):
+    if engine == "numpy":
+        pytest.importorskip("numpy")
+    monkeypatch.setattr(shared_catalog, "CATALOG_SHARED_DIR", str(tmp_path))
+    mapped = shared_catalog.load_or_publish(versioned.version, lambda: versioned)
+
+    assert mapped.shared_band_tables is not None and mapped.shared_band_tables.shared
+    grid_profiles = on_grid(profiles)
+    expected = ranks_live(grid_profiles, mapped, engine, monkeypatch)
+    assert ranks_from_tables(grid_profiles, mapped, engine) == expected
+    # Nothing was built or started in this process
+    assert not band_tables._tables and not band_tables._building
+
+
+def test_shared_tables_need_a_matching_grid(tables_enabled, versioned, tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_catalog, "CATALOG_SHARED_DIR", str(tmp_path))
+    path = shared_catalog.publish(versioned)
+    monkeypatch.setattr(band_tables, "BAND_EC_MAX", band_tables.BAND_EC_MAX + 1)
+    assert shared_catalog.open_catalog(path).shared_band_tables is None
+
+
+def test_off_grid_profiles_are_scored_live(tables_enabled, versioned, profiles):
+    band_tables.install_tables(band_tables.build_tables(versioned))
+    tables = band_tables.get_tables(versioned)
+    for average in (49.5, 87.25, 100.5):
+        matcher = UniversityMatcher(dict(profiles[0], average=average), catalog=versioned, engine="python")
+        assert band_tables.score_catalog(matcher, versioned, tables, False) is None
+
+
+def test_non_finite_averages_are_off_the_grid(tables_enabled, versioned, profiles):
+    band_tables.install_tables(band_tables.build_tables(versioned))
+    steps = band_tables.average_steps()
+    for average in (float("nan"), float("inf"), float("-inf")):
+        assert band_tables.step_index(average, steps) is None
+        # Scored live instead of failing
+        UniversityMatcher(dict(profiles[0], average=average), catalog=versioned, engine="python").rank_programs(limit=5)
+
+
+def test_api_rejects_non_finite_profile_numbers(profiles):
+    import app as app_module
+
+    body = json.dumps(dict(profiles[0], courses_taken=[["MCV4U", 90]])).replace("90]", "NaN]")
+    body = body.replace('"average": 100', '"average": Infinity')
+    response = app_module.app.test_client().post("/api/recommend", data=body, content_type="application/json")
+    assert response.status_code == 400
+    assert response.get_json()["invalid"] == ["average", "courses_taken"]
@@ -0,0 +1,65 @@
+"""
+Batch scoring on the process pool.
+"""
+
+import json
+
+from services import batch
+from services.catalog import compile_catalog
+from services.matcher import parse_ranking_options
+
+
+def test_pool_results_match_serial_scoring(catalog, profiles, monkeypatch):
+    monkeypatch.setattr(batch, "BATCH_WORKERS", 2)
+    monkeypatch.setattr(batch, "BATCH_CHUNK_SIZE", 3)
+    options = parse_ranking_options({"limit": 10})
+    jobs = profiles[:8] + [{"grade_level": 12}, "not a profile"]
+    try:
+        pooled = list(batch.stream_batch_results(jobs, options, catalog))
+        assert batch._pool._mp_context.get_start_method() != "fork"
+    finally:
+        batch.shutdown_pool()
+
+    serial = [batch.score_profile(index, job, options, catalog) for index, job in enumerate(jobs)]
+    assert pooled == serial
+    assert [result["index"] for result in pooled] == list(range(len(jobs)))
+
+
+def test_catalog_swap_does_not_cancel_running_batches(catalog, profiles, monkeypatch):
+    monkeypatch.setattr(batch, "BATCH_WORKERS", 2)
+    monkeypatch.setattr(batch, "BATCH_CHUNK_SIZE", 1)
+    options = parse_ranking_options({"limit": 5})
+    swapped = compile_catalog(catalog.source, version="swapped")
+    try:
+        first = batch.stream_batch_results(profiles[:12], options, catalog)
+        started = [next(first)]
+        old_pool = batch._pool
+
+        second = list(batch.stream_batch_results(profiles[:3], options, swapped))
+        assert batch._pool is not old_pool
+        finished = started + list(first)
+    finally:
+        batch.shutdown_pool()
+
+    assert finished == [batch.score_profile(index, p, options, catalog) for index, p in enumerate(profiles[:12])]
+    assert second == [batch.score_profile(index, p, options, swapped) for index, p in enumerate(profiles[:3])]
+    assert not batch._pool_streams
+
+
+def test_api_streams_one_line_per_profile(client, catalog, profiles, monkeypatch):
+    monkeypatch.setattr(batch, "BATCH_WORKERS", 0)
+    jobs = profiles[:3] + [{"average": 90}]
+
+    response = client.post("/api/recommend/batch", json={"profiles": jobs, "limit": 5})
+
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    options = parse_ranking_options({"limit": 5})
+    assert lines == [batch.score_profile(index, job, options, catalog) for index, job in enumerate(jobs)]
+    assert lines[3]["error"] == "Missing required fields"
+
+
+def test_api_rejects_oversized_batches(client, profiles, monkeypatch):
+    monkeypatch.setattr("app.BATCH_MAX_PROFILES", 2)
+    response = client.post("/api/recommend/batch", json={"profiles": profiles[:3]})
+    assert response.status_code == 400
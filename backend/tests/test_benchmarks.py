@@ -0,0 +1,48 @@
+"""
+Benchmark suite: seeded generators, a small run of every suite and a short
+load test.
+"""
+
+import json
+
+from benchmarks import load, run
+from benchmarks.synthetic import generate_catalog, generate_profiles
+from services.catalog import compile_catalog
+
+
+def test_generators_are_seeded():
+    assert generate_catalog(200, seed=3) == generate_catalog(200, seed=3)
+    assert generate_catalog(200, seed=3) != generate_catalog(200, seed=4)
+    assert generate_profiles(10, seed=3) == generate_profiles(10, seed=3)
+    assert len(compile_catalog(generate_catalog(200, seed=3, programs_per_university=30))) == 200
+
+
+def test_every_suite_runs_and_compares(tmp_path):
+    output = tmp_path / "bench.json"
+
+    assert run.main(["--sizes", "60", "--profiles", "2", "--repeat", "1", "--output", str(output)]) == 0
+
+    results = json.loads(output.read_text(encoding="utf-8"))
+    entry = results["sizes"]["60"]
+    assert "skipped" not in entry
+    rows = run.compare_results(results, results)
+    assert rows and all(ratio in (1.0, None) for _, _, _, _, ratio in rows)
+
+
+def test_load_summary_percentiles():
+    samples = [(i / 1000, 200) for i in range(1, 101)] + [(0.5, 500), (2.0, None)]
+    summary = load.summarize(samples, 2.0)
+
+    assert (summary["requests"], summary["errors"], summary["throughput_rps"]) == (102, 2, 51.0)
+    assert (summary["p50_ms"], summary["p99_ms"], summary["max_ms"]) == (51.0, 500.0, 2000.0)
+    assert summary["status_counts"] == {"200": 100, "500": 1, "failed": 1}
+    assert load.summarize([], 1.0)["p95_ms"] is None
+
+
+def test_short_load_run_reports_every_interval():
+    report = load.run_load_test(programs=60, duration=1.0, concurrency=2, limit=10, profile_count=5, interval=0.5)
+
+    summary = report["summary"]
+    assert summary["requests"] > 0 and summary["errors"] == 0
+    assert summary["status_counts"] == {"200": summary["requests"]}
+    assert report["timeline"] and all("rss_bytes" in entry for entry in report["timeline"])
@@ -0,0 +1,95 @@
+"""
+Compiled catalog: one validated row per program, bad documents rejected at
+load time, and indexes that score like a scan of the raw fields.
+"""
+
+import copy
+
+import pytest
+
+from services.catalog import compile_catalog, parse_requirement
+from services.matcher import UniversityMatcher
+
+
+def test_compiled_table_matches_the_source(university_db, catalog):
+    rows = [
+        (uni_name, prog_name, details)
+        for uni_name, uni_data in university_db.items()
+        for prog_name, details in uni_data["programs"].items()
+    ]
+    assert len(catalog) == len(rows)
+    assert catalog.university_names == list(university_db)
+
+    for i, (uni_name, prog_name, details) in enumerate(rows):
+        average = details["recommended_average"]
+        if len(average) == 1:
+            average = [average[0] - 2, average[0] + 2]
+        assert catalog.university_names[catalog.program_university[i]] == uni_name
+        assert catalog.program_names[i] == prog_name
+        assert (catalog.min_average[i], catalog.max_average[i]) == (average[0], average[1])
+        assert catalog.required_courses[i] == tuple(details["required_courses"])
+
+
+@pytest.mark.parametrize("field, value", [
+    ("ec_quality", None),
+    ("ec_quality", "high"),
+    ("co-op", "yes"),
+    ("programs", []),
+    ("recommended_average", []),
+    ("recommended_average", "90"),
+    ("required_courses", "MHF4U"),
+])
+def test_bad_documents_are_rejected(university_db, field, value):
+    broken = copy.deepcopy(university_db)
+    uni_data = next(iter(broken.values()))
+    if field in uni_data:
+        uni_data[field] = value
+    else:
+        details = next(iter(uni_data["programs"].values()))
+        details[field] = value
+
+    with pytest.raises(ValueError):
+        compile_catalog(broken)
+
+
+def test_every_program_is_ranked(catalog, profiles):
+    for profile in profiles[:4]:
+        rankings = UniversityMatcher(profile, catalog=catalog).get_ranked_programs()
+        assert len(rankings) == len(catalog)
+        scores = [row["score"] for row in rankings]
+        assert scores == sorted(scores, reverse=True)
+        assert scores[0] <= 100
+
+
+@pytest.mark.parametrize("requirement, alternatives", [
+    ("MHF4U", ("MHF4U",)),
+    ("ENG4U / EAE4U", ("ENG4U", "EAE4U")),
+    ("One more U or M course", None),
+    ("Two additional U or M courses", None),
+])
+def test_requirements_are_parsed_into_alternatives(requirement, alternatives):
+    assert parse_requirement(requirement) == alternatives
+
+
+def test_requirement_index_matches_the_course_scan(catalog, profiles):
+    for profile in profiles:
+        matcher = UniversityMatcher(profile, catalog=catalog, engine="python")
+        penalties = matcher._requirement_group_penalties(catalog)
+        for i, courses in enumerate(catalog.required_courses):
+            assert penalties[catalog.requirement_group[i]] == matcher._course_penalty(courses)
+
+
+def test_interest_index_matches_the_tag_scan(catalog, profiles):
+    for profile in profiles:
+        matcher = UniversityMatcher(profile, catalog=catalog, engine="python")
+        scores = matcher._interest_scores(catalog)
+        assert scores == [matcher._calculate_interest_score(tags) for tags in catalog.interests]
+    assert any(UniversityMatcher(profiles[0], catalog=catalog)._interest_scores(catalog))
+
+
+def test_interest_tags_come_from_both_fields():
+    program = {"recommended_average": [80, 85], "interests": ["ai", "math"], "interest_fields": ["math", "data"]}
+    catalog = compile_catalog({"U": {"ec_quality": 3, "co-op": ["yes"], "programs": {"P": program}}})
+
+    assert catalog.interests[0] == ("ai", "math", "data")
+    assert catalog.tag_count[0] == 3
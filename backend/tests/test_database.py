@@ -0,0 +1,210 @@
+"""
+Process catalog cache: served from memory within the TTL, refetched only
+when the version probe reports a change, by a single thread at a time, and
+behaviour while MongoDB is down.
+"""
+
+import threading
+import time
+
+import pytest
+from pymongo.errors import PyMongoError
+
+from services import database
+from services.catalog import compile_catalog
+from services.snapshot import write_snapshot
+
+PROBE_SECONDS = 0.2
+
+
+@pytest.fixture
+def counting_mongo(university_db, monkeypatch):
+    """
+    A MongoDB serving university_db under a version the test can bump.
+    Returns a dict with the current "version" and the "probes" and "fetches"
+    counts.
+    """
+    state = {"version": "v1", "probes": 0, "fetches": 0}
+
+    def probe():
+        state["probes"] += 1
+        return state["version"]
+
+    def fetch():
+        state["fetches"] += 1
+        time.sleep(state.get("fetch_seconds", 0))
+        return university_db
+
+    monkeypatch.setattr(database, "MONGODB_URI", "mongodb://unreachable")
+    monkeypatch.setattr(database, "get_catalog_version", probe)
+    monkeypatch.setattr(database, "fetch_university_data", fetch)
+    database.invalidate_catalog_cache()
+    yield state
+    database.invalidate_catalog_cache()
+
+
+@pytest.fixture
+def failing_mongo(monkeypatch):
+    """
+    A MongoDB whose version probe takes PROBE_SECONDS and then fails.
+    Returns the list of probe start times.
+    """
+    probes = []
+
+    def probe():
+        probes.append(time.monotonic())
+        time.sleep(PROBE_SECONDS)
+        raise PyMongoError("server selection timeout")
+
+    monkeypatch.setattr(database, "MONGODB_URI", "mongodb://unreachable")
+    monkeypatch.setattr(database, "CATALOG_SNAPSHOT_PATH", None)
+    monkeypatch.setattr(database, "get_catalog_version", probe)
+    database.invalidate_catalog_cache()
+    yield probes
+    database.invalidate_catalog_cache()
+
+
+def _concurrent_reads(count, read_catalog=database.get_cached_university_data):
+    """
+    read_catalog() from count threads at once: [(seconds, result or exception)].
+    """
+    results = []
+    barrier = threading.Barrier(count)
+
+    def read():
+        barrier.wait()
+        started = time.monotonic()
+        try:
+            result = read_catalog()
+        except Exception as e:
+            result = e
+        results.append((time.monotonic() - started, result))
+
+    threads = [threading.Thread(target=read) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_catalog_is_served_from_memory_within_the_ttl(counting_mongo, university_db, monkeypatch):
+    monkeypatch.setattr(database, "CATALOG_CACHE_TTL", 60)
+
+    assert database.get_cached_university_data() == university_db
+    assert database.get_cached_university_data() == university_db
+
+    assert (counting_mongo["probes"], counting_mongo["fetches"]) == (1, 1)
+
+
+def test_catalog_is_refetched_only_when_the_version_changes(counting_mongo, monkeypatch):
+    monkeypatch.setattr(database, "CATALOG_CACHE_TTL", 0)
+    monkeypatch.setattr(database, "CATALOG_MAX_STALENESS", 0)
+
+    database.get_cached_university_data()
+    database.get_cached_university_data()
+    assert (counting_mongo["probes"], counting_mongo["fetches"]) == (2, 1)
+
+    counting_mongo["version"] = "v2"
+    database.get_cached_university_data()
+    assert (counting_mongo["probes"], counting_mongo["fetches"]) == (3, 2)
+
+
+def test_invalidation_forces_a_fetch(counting_mongo, monkeypatch):
+    monkeypatch.setattr(database, "CATALOG_CACHE_TTL", 60)
+
+    database.get_cached_university_data()
+    database.invalidate_catalog_cache()
+    database.get_cached_university_data()
+
+    assert counting_mongo["fetches"] == 2
+    with database._refresh_lock:
+        pass  # Let the refresh finish before the cache is invalidated
+
+
+def test_cold_start_is_fetched_once_for_concurrent_readers(counting_mongo, university_db):
+    counting_mongo["fetch_seconds"] = 0.2
+
+    results = _concurrent_reads(8)
+
+    assert counting_mongo["fetches"] == 1
+    assert all(result == university_db for _, result in results)
+
+
+def test_stale_catalog_is_served_while_one_background_refresh_runs(counting_mongo, university_db, monkeypatch):
+    monkeypatch.setattr(database, "CATALOG_CACHE_TTL", 0)
+    database.get_cached_university_data()
+    counting_mongo["version"] = "v2"
+    counting_mongo["fetch_seconds"] = 0.5
+
+    results = _concurrent_reads(8)
+
+    assert all(result == university_db for _, result in results)
+    assert max(seconds for seconds, _ in results) < 0.25
+    deadline = time.monotonic() + 5
+    while counting_mongo["fetches"] < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert counting_mongo["fetches"] == 2
+    with database._refresh_lock:
+        pass  # Let the refresh finish before the cache is invalidated
+
+
+def test_bad_catalog_keeps_the_last_good_one(counting_mongo, university_db, monkeypatch):
+    monkeypatch.setattr(database, "CATALOG_CACHE_TTL", 0)
+    monkeypatch.setattr(database, "CATALOG_MAX_STALENESS", 0)
+    good = database.get_cached_catalog()
+
+    monkeypatch.setattr(database, "fetch_university_data", lambda: {"Broken University": {"programs": {}}})
+    counting_mongo["version"] = "v2"
+
+    assert database.get_cached_catalog() is good
+
+
+def test_too_stale_catalog_probes_once_while_mongo_is_down(failing_mongo, university_db):
+    catalog = compile_catalog(university_db, version="v1")
+    database.install_catalog(catalog, database.catalog_state()[2])
+    database._catalog_checked_at = time.monotonic() - database.CATALOG_MAX_STALENESS - 1
+
+    results = _concurrent_reads(8, database.get_cached_catalog)
+
+    assert len(failing_mongo) == 1
+    assert all(result is catalog for _, result in results)
+    assert max(seconds for seconds, _ in results) < 2 * PROBE_SECONDS
+
+
+def test_catalog_past_stale_if_error_falls_back_to_the_snapshot(failing_mongo, university_db, tmp_path, monkeypatch):
+    catalog = compile_catalog(university_db, version="v1")
+    database.install_catalog(catalog, database.catalog_state()[2])
+    database._catalog_checked_at = time.monotonic() - database.CATALOG_STALE_IF_ERROR - 1
+
+    with pytest.raises(PyMongoError):
+        database.get_cached_catalog()
+
+    path = tmp_path / "catalog.jsonl"
+    write_snapshot(university_db, path, catalog_version=1)
+    monkeypatch.setattr(database, "CATALOG_SNAPSHOT_PATH", str(path))
+    results = _concurrent_reads(4, database.get_cached_catalog)
+
+    assert len(failing_mongo) == 1
+    fallback = results[0][1]
+    assert fallback.version.startswith("snapshot:")
+    assert fallback.source == university_db
+    assert all(result is fallback for _, result in results)
+
+
+def test_cold_start_fails_fast_after_a_failed_probe(failing_mongo):
+    results = _concurrent_reads(8, database.get_cached_catalog)
+
+    assert len(failing_mongo) == 1
+    assert all(isinstance(result, PyMongoError) for _, result in results)
+    assert max(seconds for seconds, _ in results) < 2 * PROBE_SECONDS
+
+
+def test_probe_is_retried_after_the_retry_interval(failing_mongo, monkeypatch):
+    monkeypatch.setattr(database, "CATALOG_RETRY_INTERVAL", 0.05)
+    with pytest.raises(PyMongoError):
+        database.get_cached_catalog()
+    time.sleep(0.1)
+    with pytest.raises(PyMongoError):
+        database.get_cached_catalog()
+    assert len(failing_mongo) == 2
@@ -0,0 +1,109 @@
+"""
+Response encoding: the columnar ranking format, streamed NDJSON rankings,
+Accept-Encoding negotiation and compressed API responses.
+"""
+
+import gzip
+import json
+
+import pytest
+
+from services import encoding
+from services.matcher import UniversityMatcher
+
+
+def rows_from_columnar(payload):
+    columns = payload["columns"]
+    return [
+        {
+            "university": payload["universities"][columns["university"][i]],
+            "program": payload["programs"][columns["program"][i]],
+            "score": columns["score"][i],
+            "breakdown": {field: columns[field][i] for field in encoding.BREAKDOWN_FIELDS},
+        }
+        for i in range(len(columns["score"]))
+    ]
+
+
+def test_columnar_round_trips_to_rows(catalog, profiles):
+    for profile in profiles:
+        rows, _ = UniversityMatcher(profile, catalog=catalog).rank_programs(limit=40)
+        columnar = encoding.columnar_rankings(rows)
+        assert len(columnar["universities"]) == len({row["university"] for row in rows})
+        assert rows_from_columnar(columnar) == rows
+
+
+def test_dumps_is_compact_json():
+    value = {"name": "École Polytechnique", "scores": [1, 2.5]}
+    assert json.loads(encoding.dumps(value)) == value
+    assert b": " not in encoding.dumps(value)
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("gzip;q=0", None),
+    ("br;q=0.5, gzip;q=0.8", "gzip"),
+    ("*", "br"),
+    ("*;q=0.2, gzip;q=0", "br"),
+])
+def test_choose_encoding_honours_q_values(monkeypatch, header, expected):
+    monkeypatch.setattr(encoding, "brotli", object())
+    assert encoding.choose_encoding(header) == expected
+
+
+def test_brotli_is_skipped_when_it_is_not_installed(monkeypatch):
+    monkeypatch.setattr(encoding, "brotli", None)
+    assert encoding.choose_encoding("br, gzip;q=0.5") == "gzip"
+    assert encoding.choose_encoding("br") is None
+
+
+def test_small_bodies_are_sent_uncompressed():
+    body = b"x" * (encoding.COMPRESS_MIN_BYTES - 1)
+    assert encoding.compress(body, "gzip") == (body, None)
+
+
+def test_api_gzips_columnar_responses(client, catalog, profiles, monkeypatch):
+    monkeypatch.setattr(encoding, "brotli", None)
+    profile = dict(profiles[0], limit=50)
+    response = client.post("/api/recommend?format=columnar", json=profile, headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    body = json.loads(gzip.decompress(response.get_data()))
+    expected, _ = UniversityMatcher(profiles[0], catalog=catalog).rank_programs(limit=50)
+    assert rows_from_columnar(body["rankings"]) == expected
+
+
+def test_api_rejects_unknown_formats(client, profiles):
+    response = client.post("/api/recommend?format=xml", json=profiles[0])
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("chunk_bytes", [1, 200, 1 << 20])
+def test_ndjson_chunks_hold_whole_lines(chunk_bytes):
+    header, rows = {"success": True}, [{"rank": i} for i in range(25)]
+    chunks = list(encoding.ndjson_lines(header, iter(rows), chunk_bytes=chunk_bytes))
+
+    assert chunks[0] == b'{"success":true}\n'
+    assert all(chunk.endswith(b"\n") for chunk in chunks)
+    assert [json.loads(line) for line in b"".join(chunks[1:]).splitlines()] == rows
+
+
+@pytest.mark.parametrize("query, headers", [
+    ("?format=ndjson", {}),
+    ("", {"Accept": "application/x-ndjson"}),
+])
+def test_api_streams_ndjson_rankings(client, catalog, profiles, query, headers):
+    for profile in profiles[:4]:
+        response = client.post("/api/recommend" + query, json=dict(profile, limit=30, offset=5), headers=headers)
+
+        assert response.status_code == 200
+        assert response.mimetype == "application/x-ndjson"
+        header, *rows = [json.loads(line) for line in response.get_data().splitlines()]
+        expected, total = UniversityMatcher(profile, catalog=catalog).rank_programs(limit=30, offset=5)
+        assert rows == expected
+        assert (header["success"], header["total_programs"], header["offset"], header["limit"]) == (True, total, 5, 30)
@@ -0,0 +1,102 @@
+"""
+Catalog narrowing: a filtered (and prefiltered) ranking equals ranking a
+catalog that only holds the passing programs.
+"""
+
+import pytest
+
+from services import filters
+from services.catalog import compile_catalog
+from services.matcher import UniversityMatcher, parse_ranking_options
+
+FILTERS = [
+    {"coop": True},
+    {"coop": False, "average_band": 4},
+    {"interests": ["software", "history", "no-such-tag"]},
+    {"average_band": 2.5},
+    {"universities": ["nowhere"]},
+]
+
+
+def passes(catalog, i, profile, prefilter, catalog_filters):
+    """
+    Reference predicate for program i, straight from the compiled columns.
+    """
+    uni_index = catalog.program_university[i]
+    average = profile['average']
+    tags = set(catalog.interests[i])
+    if prefilter.get('reachable') and catalog.min_average[i] > average + 5:
+        return False
+    if prefilter.get('interests') and tags.isdisjoint(profile['major_interests']):
+        return False
+    if 'universities' in catalog_filters and catalog.university_names[uni_index] not in catalog_filters['universities']:
+        return False
+    if 'coop' in catalog_filters:
+        offers = catalog.university_coop_yes if catalog_filters['coop'] else catalog.university_coop_no
+        if not offers[uni_index]:
+            return False
+    if 'interests' in catalog_filters and tags.isdisjoint(catalog_filters['interests']):
+        return False
+    if 'average_band' in catalog_filters:
+        band = catalog_filters['average_band']
+        if catalog.min_average[i] > average + band or catalog.max_average[i] < average - band:
+            return False
+    return True
+
+
+def narrowed_source(university_db, catalog, profile, prefilter, catalog_filters):
+    keep = {
+        (catalog.university_names[catalog.program_university[i]], catalog.program_names[i])
+        for i in range(len(catalog)) if passes(catalog, i, profile, prefilter, catalog_filters)
+    }
+    source = {}
+    for uni_name, uni_data in university_db.items():
+        programs = {name: details for name, details in uni_data['programs'].items() if (uni_name, name) in keep}
+        if programs:
+            source[uni_name] = dict(uni_data, programs=programs)
+    return source
+
+
+@pytest.mark.parametrize("prefilter", [{}, {"reachable": True}, {"reachable": True, "interests": True}])
+@pytest.mark.parametrize("catalog_filters", FILTERS)
+def test_narrowed_ranking_equals_ranking_the_narrowed_catalog(university_db, catalog, profiles, prefilter,
+                                                             catalog_filters):
+    universities = list(university_db)
+    catalog_filters = dict(catalog_filters)
+    if catalog_filters.get("universities"):
+        catalog_filters["universities"] = catalog_filters["universities"] + universities[3:40:3]
+    options = parse_ranking_options({
+        "limit": 25, "prefilter": prefilter, "filters": dict(catalog_filters, min_score=20)})
+
+    for profile in profiles[:10]:
+        reference = compile_catalog(narrowed_source(university_db, catalog, profile, prefilter, catalog_filters))
+        expected = UniversityMatcher(profile, catalog=reference).rank_programs(limit=25, min_score=20)
+        assert UniversityMatcher(profile, catalog=catalog).rank_programs(**options) == expected
+
+
+def test_narrowed_catalogs_are_cached_per_version(catalog, profiles):
+    versioned = compile_catalog(catalog.source, version="v1")
+    prefilter, catalog_filters = {"interests": True}, {"coop": True}
+    profile = profiles[5]
+
+    first = filters.narrow_catalog(versioned, profile, prefilter, catalog_filters)
+    reordered = dict(profile, major_interests=list(reversed(profile['major_interests'])))
+    assert filters.narrow_catalog(versioned, reordered, prefilter, catalog_filters) is first
+    assert filters.narrow_catalog(versioned, profile, {}, catalog_filters) is not first
+    assert filters.narrow_catalog(versioned, profile, None, None) is versioned
+
+
+def test_prefilter_and_filters_are_parsed_together():
+    options = parse_ranking_options({"prefilter": {"reachable": False}, "filters": {"min_score": 40}})
+    assert options["prefilter"] is None and options["filters"] is None and options["min_score"] == 40
+    with pytest.raises(ValueError):
+        parse_ranking_options({"prefilter": {"reachable": "yes"}})
+
+
+def test_filters_are_parsed_into_canonical_form():
+    options = parse_ranking_options({"min_score": 30, "filters": {"universities": ["b", "a", "b"], "min_score": 40}})
+    assert options["filters"] == {"universities": ["a", "b"]} and options["min_score"] == 40
+    assert parse_ranking_options({"filters": {"min_score": 40}})["filters"] is None
+    for bad in ({"coop": "yes"}, {"universities": "a"}, {"average_band": -1}, {"region": "east"}):
+        with pytest.raises(ValueError):
+            parse_ranking_options({"filters": bad})
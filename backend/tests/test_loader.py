@@ -0,0 +1,119 @@
+"""
+Catalog loader and snapshots: round trips through MongoDB and the snapshot file.
+"""
+
+import json
+import os
+
+import pytest
+from pymongo.errors import PyMongoError
+
+from services import database, loader
+from services.catalog import compile_catalog
+from services.snapshot import read_snapshot, write_snapshot
+
+mongomock = pytest.importorskip("mongomock")
+
+MOCK_CATALOG = os.path.join(os.path.dirname(__file__), os.pardir, "data", "mock_universities.py")
+
+
+@pytest.fixture
+def mock_mongo(monkeypatch):
+    """
+    Point services.database at an empty in-memory MongoDB.
+    """
+    database.close_connection()
+    monkeypatch.setattr(database, "MONGODB_URI", "mongomock://tests")
+    monkeypatch.setattr(database, "CATALOG_SNAPSHOT_PATH", None)
+    yield database.get_database()
+    database.close_connection()
+
+
+def test_snapshot_round_trip(university_db, tmp_path):
+    path = tmp_path / "catalog.jsonl"
+    write_snapshot(university_db, path, catalog_version=3)
+    restored, header = read_snapshot(path)
+
+    assert restored == university_db
+    assert list(restored) == list(university_db)
+    assert header["catalog_version"] == 3
+
+
+def test_truncated_snapshot_is_rejected(university_db, tmp_path):
+    path = tmp_path / "catalog.jsonl"
+    write_snapshot(university_db, path)
+    lines = path.read_text(encoding="utf-8").splitlines(keepends=True)
+    path.write_text("".join(lines[:-1]), encoding="utf-8")
+    with pytest.raises(ValueError, match="truncated"):
+        read_snapshot(path)
+
+
+@pytest.mark.parametrize("record", [{"data": {}}, {"university": "Nowhere"}, ["Nowhere", {}]])
+def test_malformed_snapshot_is_rejected(university_db, tmp_path, capsys, record):
+    path = tmp_path / "catalog.jsonl"
+    write_snapshot(university_db, path)
+    lines = path.read_text(encoding="utf-8").splitlines(keepends=True)
+    lines[3] = json.dumps(record) + "\n"
+    path.write_text("".join(lines), encoding="utf-8")
+
+    with pytest.raises(ValueError, match="line 4"):
+        read_snapshot(path)
+    assert loader.main([str(path), "--snapshot-only", "--snapshot", str(tmp_path / "out.jsonl")]) == 1
+    assert "line 4" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("layout", ["university", "program"])
+def test_load_round_trip(mock_mongo, university_db, tmp_path, monkeypatch, layout):
+    monkeypatch.setattr(database, "CATALOG_LAYOUT", layout)
+    path = tmp_path / "catalog.jsonl"
+    write_snapshot(university_db, path)
+
+    summary = loader.load_catalog(str(path), batch_size=64)
+    again = loader.load_catalog(str(path), batch_size=64)
+
+    assert summary["programs"] == sum(len(u["programs"]) for u in university_db.values())
+    assert (summary["catalog_version"], again["catalog_version"]) == (1, 2)
+    assert again["written"] == 0  # Unchanged documents aren't rewritten
+    assert database.fetch_university_data() == university_db
+    assert database.get_cached_catalog().version == database.get_catalog_version()
+
+
+def test_snapshot_cold_start_without_mongo(university_db, tmp_path, monkeypatch):
+    path = tmp_path / "catalog.jsonl"
+    loader.main([MOCK_CATALOG,
+                 "--snapshot", str(path), "--snapshot-only"])
+    monkeypatch.setattr(database, "MONGODB_URI", None)
+    monkeypatch.setattr(database, "CATALOG_SNAPSHOT_PATH", str(path))
+    database.invalidate_catalog_cache()
+    try:
+        catalog = database.get_cached_catalog()
+        expected = compile_catalog(loader.read_catalog_file(MOCK_CATALOG))
+        assert catalog.version.startswith("snapshot:")
+        assert list(catalog.program_names) == list(expected.program_names)
+        assert catalog.source == expected.source
+    finally:
+        database.invalidate_catalog_cache()
+
+
+def test_prune_keeps_legacy_documents(mock_mongo, university_db, monkeypatch):
+    monkeypatch.setattr(database, "CATALOG_LAYOUT", "university")
+    names = list(university_db)
+    legacy = {name: university_db[name] for name in names[:2]}
+    collection = database.get_universities_collection()
+    collection.insert_one(dict(legacy))
+
+    loader.write_catalog({name: university_db[name] for name in names[2:6]})
+    loader.write_catalog({name: university_db[name] for name in names[2:4]})
+
+    assert collection.count_documents({"university": {"$exists": False}}) == 1
+    assert sorted(collection.distinct("university")) == sorted(names[2:4])
+    assert database.fetch_university_data() == {name: university_db[name] for name in names[:4]}
+
+
+def test_cli_reports_mongo_errors(monkeypatch, capsys):
+    def unreachable(*args, **kwargs):
+        raise PyMongoError("server selection timeout")
+
+    monkeypatch.setattr(loader, "write_catalog", unreachable)
+    assert loader.main([MOCK_CATALOG, "--snapshot", ""]) == 1
+    assert "server selection timeout" in capsys.readouterr().err
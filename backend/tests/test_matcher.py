@@ -0,0 +1,76 @@
+"""
+Ranking pages: limit/offset/min_score pages and the bounded top-k ranker
+against a full sort.
+"""
+
+import pytest
+
+from services import matcher as matcher_module
+from services.matcher import UniversityMatcher
+
+PAGES = [(1, 0), (10, 0), (20, 5), (50, 30), (7, 590), (5, 1000)]
+
+
+@pytest.mark.parametrize("limit, offset", PAGES)
+def test_pages_are_slices_of_the_full_ranking(catalog, profiles, limit, offset):
+    for profile in profiles:
+        full = UniversityMatcher(profile, catalog=catalog).get_ranked_programs()
+        rows, total = UniversityMatcher(profile, catalog=catalog).rank_programs(limit=limit, offset=offset)
+        assert rows == full[offset:offset + limit]
+        assert total == len(catalog)
+
+
+@pytest.mark.parametrize("min_score", [0, 40, 75.5, 101])
+def test_min_score_drops_lower_rows(catalog, profiles, min_score):
+    for profile in profiles:
+        full = UniversityMatcher(profile, catalog=catalog).get_ranked_programs()
+        rows, total = UniversityMatcher(profile, catalog=catalog).rank_programs(limit=10, min_score=min_score)
+        passing = [row for row in full if row["score"] >= min_score]
+        assert rows == passing[:10]
+        assert total == len(passing)
+
+
+def test_api_returns_one_page(client, catalog, profiles):
+    response = client.post("/api/recommend", json=dict(profiles[0], limit=5, offset=10))
+
+    assert response.status_code == 200
+    body = response.get_json()
+    expected, total = UniversityMatcher(profiles[0], catalog=catalog).rank_programs(limit=5, offset=10)
+    assert body["rankings"] == expected
+    assert (body["total_programs"], body["limit"], body["offset"]) == (total, 5, 10)
+
+
+@pytest.mark.parametrize("options", [{"limit": -1}, {"offset": "2"}, {"limit": True}, {"min_score": "high"}])
+def test_api_rejects_bad_paging_options(client, profiles, options):
+    response = client.post("/api/recommend", json=dict(profiles[0], **options))
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("limit, offset", PAGES)
+def test_bounded_top_k_equals_full_sort(catalog, profiles, monkeypatch, limit, offset):
+    bounded_calls = []
+    rank_bounded = UniversityMatcher._rank_bounded
+
+    def spy(self, *args):
+        bounded_calls.append(args)
+        return rank_bounded(self, *args)
+
+    monkeypatch.setattr(UniversityMatcher, "_rank_bounded", spy)
+    grade_12 = [dict(profile, grade_level=12) for profile in profiles]
+    for profile in grade_12:
+        full = UniversityMatcher(profile, catalog=catalog, engine="python").get_ranked_programs()
+        rows, total = UniversityMatcher(profile, catalog=catalog, engine="python").rank_programs(
+            limit=limit, offset=offset)
+        assert rows == full[offset:offset + limit]
+        assert total == len(catalog)
+    assert len(bounded_calls) == len(grade_12)
+
+
+def test_bounded_ranking_matches_unbounded_selection(catalog, profiles, monkeypatch):
+    grade_12 = [dict(profile, grade_level=12) for profile in profiles]
+    bounded = [UniversityMatcher(p, catalog=catalog, engine="python").rank_programs(limit=25, offset=3)
+               for p in grade_12]
+    monkeypatch.setattr(matcher_module, "BOUNDED_RANKING", False)
+    unbounded = [UniversityMatcher(p, catalog=catalog, engine="python").rank_programs(limit=25, offset=3)
+                 for p in grade_12]
+    assert bounded == unbounded
@@ -0,0 +1,65 @@
+"""
+Stage timers (nested stages are only counted once, so a request's stages
+add up), the Server-Timing header, /metrics and sampled profiles.
+"""
+
+import time
+
+from services import metrics, profiling
+
+
+def test_stage_durations_add_up_per_request():
+    timings, token = metrics.begin_request()
+    try:
+        with metrics.stage("score"):
+            time.sleep(0.02)
+        with metrics.stage("score"):
+            time.sleep(0.01)
+    finally:
+        metrics.end_request(token)
+
+    assert timings.stages["score"] >= 0.03
+    header = timings.server_timing()
+    assert header.startswith("score;dur=")
+    assert ", total;dur=" in header
+
+
+def test_nested_stages_record_exclusive_time():
+    timings, token = metrics.begin_request()
+    try:
+        with metrics.stage("serialize"):
+            time.sleep(0.02)
+            with metrics.stage("compress"):
+                time.sleep(0.05)
+        with metrics.stage("compress"):
+            time.sleep(0.01)
+    finally:
+        metrics.end_request(token)
+
+    stages = timings.stages
+    assert 0.02 <= stages["serialize"] < 0.05
+    assert stages["compress"] >= 0.06
+    assert sum(stages.values()) <= timings.elapsed()
+
+
+def test_api_reports_server_timing_and_metrics(client, profiles):
+    response = client.post("/api/recommend", json=dict(profiles[0], limit=5))
+
+    assert response.status_code == 200
+    server_timing = response.headers["Server-Timing"]
+    assert "score;dur=" in server_timing and "total;dur=" in server_timing
+
+    exposition = client.get("/metrics").get_data(as_text=True)
+    assert 'http_requests_total{endpoint="recommend",status="200"}' in exposition
+    assert 'recommend_stage_seconds_count{stage="score"}' in exposition
+
+
+def test_sampled_requests_write_profiles(client, profiles, tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_EVERY", 1)
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "PROFILE_MODE", {"cprofile", "tracemalloc"})
+
+    assert client.post("/api/recommend", json=dict(profiles[0], limit=5)).status_code == 200
+
+    reports = sorted(path.name.split(".", 1)[1] for path in tmp_path.iterdir())
+    assert reports == ["mem.txt", "prof", "txt"]
@@ -0,0 +1,105 @@
+"""
+Coarse prefilters: resolved from the catalog indexes, or pushed down to
+MongoDB with the program layout, and the per-program catalog layout.
+"""
+
+import json
+
+import pytest
+
+from services import database, filters
+from services.catalog import compile_catalog
+from services.matcher import UniversityMatcher
+
+PREFILTERS = [{"reachable": True}, {"interests": True}, {"reachable": True, "interests": True}]
+
+
+def prefiltered_source(university_db, average=None, interests=None):
+    """
+    Reference: the raw catalog with only the programs passing the prefilters.
+    """
+    filtered = {}
+    for uni_name, uni_data in university_db.items():
+        programs = {}
+        for prog_name, details in uni_data['programs'].items():
+            recommended_avg = details['recommended_average']
+            min_avg = recommended_avg[0] - 2 if len(recommended_avg) == 1 else recommended_avg[0]
+            if average is not None and min_avg > average + 5:
+                continue
+            tags = set(details.get('interests', [])) | set(details.get('interest_fields', []))
+            if interests is not None and tags.isdisjoint(interests):
+                continue
+            programs[prog_name] = details
+        if programs:
+            filtered[uni_name] = dict(uni_data, programs=programs)
+    return filtered
+
+
+@pytest.mark.parametrize("prefilter", PREFILTERS)
+def test_prefilter_equals_ranking_the_prefiltered_catalog(catalog, university_db, profiles, prefilter):
+    for profile in profiles:
+        average = profile['average'] if prefilter.get('reachable') else None
+        interests = profile['major_interests'] if prefilter.get('interests') else None
+        reference = compile_catalog(prefiltered_source(university_db, average, interests))
+
+        rows, total = UniversityMatcher(profile, catalog=catalog).rank_programs(limit=30, prefilter=prefilter)
+        assert (rows, total) == UniversityMatcher(profile, catalog=reference).rank_programs(limit=30)
+
+
+def test_program_layout_round_trips(university_db):
+    documents = database.university_to_program_documents(university_db)
+
+    assert len(documents) == sum(len(uni_data["programs"]) for uni_data in university_db.values())
+    assert database.programs_to_university_db(documents) == university_db
+
+
+@pytest.fixture
+def program_layout_mongo(university_db, monkeypatch):
+    """
+    The API against an in-memory MongoDB in the program layout. Returns the
+    filters of every find() on the programs collection.
+    """
+    pytest.importorskip("mongomock")
+    import mongomock
+    from benchmarks.run import local_database
+    from services.result_cache import recommendation_cache
+
+    queries = []
+    find = mongomock.collection.Collection.find
+
+    def recording_find(self, filter=None, *args, **kwargs):
+        if self.name == database.PROGRAMS_COLLECTION_NAME:
+            queries.append(filter)
+        return find(self, filter, *args, **kwargs)
+
+    monkeypatch.setattr(mongomock.collection.Collection, "find", recording_find)
+    with local_database(university_db, layout="program"):
+        recommendation_cache.clear()
+        yield queries
+    recommendation_cache.clear()
+
+
+@pytest.mark.parametrize("response_format", ["rows", "ndjson"])
+def test_prefilter_query_reaches_mongo(program_layout_mongo, catalog, profiles, monkeypatch, response_format):
+    import app as app_module
+
+    profile = profiles[0]
+    payload = dict(profile, limit=10, prefilter={"reachable": True, "interests": True})
+    response = app_module.app.test_client().post(f"/api/recommend?format={response_format}", json=payload)
+    assert response.status_code == 200
+
+    expected_query = database.program_query(profile['average'], profile['major_interests'])
+    assert expected_query in program_layout_mongo
+
+    # Same page as resolving the prefilter from the catalog indexes
+    monkeypatch.setattr(filters, "prefilter_pushdown_available", lambda: False)
+    filters._selections.clear()
+    expected, total = UniversityMatcher(profile, catalog=database.get_cached_catalog()).rank_programs(
+        limit=10, prefilter=payload["prefilter"])
+    if response_format == "ndjson":
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert lines[0]["total_programs"] == total
+        assert lines[1:] == expected
+    else:
+        assert response.get_json()["rankings"] == expected
+        assert response.get_json()["total_programs"] == total
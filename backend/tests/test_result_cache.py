@@ -0,0 +1,55 @@
+"""
+Result cache: hits for identical profiles, invalidation on a catalog version bump.
+"""
+
+import pytest
+
+from benchmarks.synthetic import generate_catalog
+from services import result_cache
+from services.catalog import compile_catalog
+from services.matcher import UniversityMatcher, parse_ranking_options
+from services.result_cache import ResultCache, profile_cache_key, rank_programs_cached
+
+
+@pytest.fixture
+def served_catalog(monkeypatch):
+    """
+    Makes rank_programs_cached() see the catalog set in the returned dict.
+    """
+    current = {}
+    monkeypatch.setattr(result_cache, "get_catalog", lambda: current["catalog"])
+    return current
+
+
+def test_identical_profiles_are_served_from_the_cache(served_catalog, catalog, profiles):
+    served_catalog["catalog"] = compile_catalog(catalog.source, version="v1")
+    cache = ResultCache(max_entries=16, ttl=60)
+    options = parse_ranking_options({"limit": 10})
+
+    first = rank_programs_cached(profiles[4], options, cache=cache)
+    reordered = dict(profiles[4], major_interests=list(reversed(profiles[4]["major_interests"])))
+    second = rank_programs_cached(reordered, options, cache=cache)
+
+    assert second is first
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1}
+
+
+def test_version_bump_invalidates_cached_rankings(served_catalog, profiles):
+    v1 = compile_catalog(generate_catalog(120, seed=1), version="v1")
+    v2 = compile_catalog(generate_catalog(120, seed=2), version="v2")
+    cache = ResultCache(max_entries=16, ttl=60)
+    options = parse_ranking_options({"limit": 10})
+    profile = profiles[5]
+
+    served_catalog["catalog"] = v1
+    old = rank_programs_cached(profile, options, cache=cache)
+    rank_programs_cached(profiles[6], options, cache=cache)
+    assert len(cache) == 2
+
+    served_catalog["catalog"] = v2
+    new = rank_programs_cached(profile, options, cache=cache)
+
+    assert new == UniversityMatcher(profile, catalog=v2).rank_programs(**options)
+    assert new != old
+    assert len(cache) == 1  # Entries for v1 were flushed
+    assert profile_cache_key(profile, options, "v1") != profile_cache_key(profile, options, "v2")
@@ -0,0 +1,123 @@
+"""
+Re-ranking sessions: an edited session ranks exactly like a fresh ranking of
+the edited profile, failed edits leave it untouched, and the store is bounded.
+"""
+
+import pytest
+
+from services import matcher as matcher_module
+from services import sessions as sessions_module
+from services.catalog import compile_catalog
+from services.matcher import UniversityMatcher
+from services.sessions import RankingSession, SessionStore
+
+EDITS = [
+    {"average": 83.5},
+    {"courses_taken": [["MHF4U", 70]]},
+    {"grade_level": 11},
+    {"major_interests": ["history", "ai"]},
+    {"extra_curriculars": [["debate", 3]]},
+    {"wants_coop": True},
+    {"grade_level": 12, "average": 97},
+    {"average": 97},
+]
+PAGES = [{}, {"limit": 25, "offset": 10}, {"min_score": 55}]
+
+
+@pytest.mark.parametrize("engine", ["python", "numpy"])
+def test_session_edits_equal_fresh_rankings(catalog, profiles, monkeypatch, engine):
+    if engine == "numpy":
+        pytest.importorskip("numpy")
+    monkeypatch.setattr(matcher_module, "SCORING_ENGINE", engine)
+    for profile in profiles[:5]:
+        session = RankingSession("test", profile, catalog)
+        expected_profile = dict(profile)
+        for changes in EDITS:
+            session.update(changes, catalog)
+            expected_profile.update(changes)
+            fresh = UniversityMatcher(expected_profile, catalog=catalog, engine=engine)
+            for page in PAGES:
+                assert session.rank(**page) == fresh.rank_programs(**page)
+
+
+def test_unchanged_fields_recompute_nothing(catalog, profiles):
+    session = RankingSession("test", profiles[0], catalog)
+    assert session.update({"average": profiles[0]["average"]}, catalog) == []
+    assert session.update({"wants_coop": not profiles[0]["wants_coop"]}, catalog) == ["coop"]
+
+
+def test_failed_update_leaves_the_session_unchanged(catalog, profiles):
+    session = RankingSession("test", profiles[2], catalog)
+    before = session.rank(limit=20)
+    profile = dict(session.profile)
+
+    with pytest.raises(TypeError):
+        session.update({"average": "high", "wants_coop": True}, catalog)
+
+    assert session.profile == profile
+    assert session.rank(limit=20) == before
+    assert session.update({"wants_coop": True}, catalog) == ["coop"]
+
+
+def test_store_evicts_the_least_recently_used_session(catalog, profiles):
+    store = SessionStore(max_sessions=2, ttl=60)
+
+    first, second = (store.create(profile, catalog=catalog) for profile in profiles[:2])
+    assert store.get(first.session_id) is first
+    third = store.create(profiles[2], catalog=catalog)
+
+    assert len(store) == 2
+    assert store.get(second.session_id) is None
+    assert store.get(first.session_id) is first
+    assert store.get(third.session_id) is third
+
+
+def test_store_is_bounded_by_programs_held(university_db, profiles):
+    small = compile_catalog(dict(list(university_db.items())[:10]))
+    store = SessionStore(max_sessions=10, ttl=60, max_programs=2 * len(small))
+
+    first, second, third = (store.create(profile, catalog=small) for profile in profiles[:3])
+
+    assert len(store) == 2
+    assert store.programs() == 2 * len(small)
+    assert store.get(first.session_id) is None
+    assert store.get(second.session_id) is second
+    assert store.get(third.session_id) is third
+
+
+def test_api_patch_reranks_the_edited_profile(catalog, profiles, monkeypatch):
+    import app as app_module
+
+    monkeypatch.setattr(app_module, "get_catalog", lambda: catalog)
+    monkeypatch.setattr(sessions_module, "get_catalog", lambda: catalog)
+    client = app_module.app.test_client()
+    created = client.post("/api/sessions", json=dict(profiles[1], limit=5))
+    assert created.status_code == 201
+    session_id = created.get_json()["session_id"]
+
+    response = client.patch(f"/api/sessions/{session_id}", json={"average": 88, "limit": 5})
+
+    assert response.status_code == 200
+    assert response.get_json()["recomputed"] == ["grade"]
+    expected, _ = UniversityMatcher(dict(profiles[1], average=88), catalog=catalog).rank_programs(limit=5)
+    assert response.get_json()["rankings"] == expected
+    assert client.delete(f"/api/sessions/{session_id}").status_code == 200
+    assert client.patch(f"/api/sessions/{session_id}", json={"average": 90}).status_code == 404
+
+
+def test_paging_only_patch_reranks_the_current_profile(catalog, profiles, monkeypatch):
+    import app as app_module
+
+    monkeypatch.setattr(app_module, "get_catalog", lambda: catalog)
+    monkeypatch.setattr(sessions_module, "get_catalog", lambda: catalog)
+    client = app_module.app.test_client()
+    created = client.post("/api/sessions", json=dict(profiles[1], limit=5))
+    assert created.status_code == 201
+
+    response = client.patch(f"/api/sessions/{created.get_json()['session_id']}", json={"limit": 5, "offset": 5})
+
+    assert response.status_code == 200
+    assert response.get_json()["recomputed"] == []
+    expected, total = UniversityMatcher(profiles[1], catalog=catalog).rank_programs(limit=5, offset=5)
+    assert response.get_json()["rankings"] == expected
+    assert response.get_json()["total_programs"] == total
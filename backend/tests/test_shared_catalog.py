@@ -0,0 +1,156 @@
+"""
+Shared catalog generations: mapped tables score like compiled ones, one
+publisher per version, cold start from the current pointer, and pruning
+that leaves mapped generations alone.
+"""
+
+import gc
+import os
+import pickle
+import threading
+import time
+
+import pytest
+from pymongo.errors import PyMongoError
+
+from services import database, shared_catalog
+from services.catalog import compile_catalog
+from services.matcher import UniversityMatcher
+
+
+@pytest.fixture
+def shared_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_catalog, "CATALOG_SHARED_DIR", str(tmp_path))
+    monkeypatch.setattr(shared_catalog, "CATALOG_SHARED_KEEP", 1)
+    return tmp_path
+
+
+def publish_versions(source, *versions):
+    for version in versions:
+        shared_catalog.publish(compile_catalog(source, version=version))
+
+
+@pytest.mark.parametrize("engine", ["python", "numpy"])
+def test_mapped_catalog_ranks_like_the_compiled_one(shared_dir, catalog, profiles, engine):
+    if engine == "numpy":
+        pytest.importorskip("numpy")
+    publish_versions(catalog.source, "v1")
+    mapped = shared_catalog.open_catalog(shared_catalog.generation_path("v1"))
+
+    assert list(mapped.program_names) == list(catalog.program_names)
+    assert mapped.source == catalog.source
+    for profile in profiles[:8]:
+        for page in ({}, {"limit": 20, "offset": 5}):
+            expected = UniversityMatcher(profile, catalog=catalog, engine=engine).rank_programs(**page)
+            assert UniversityMatcher(profile, catalog=mapped, engine=engine).rank_programs(**page) == expected
+
+
+def test_published_version_is_mapped_instead_of_rebuilt(shared_dir, catalog):
+    builds = []
+
+    def build():
+        builds.append(True)
+        return compile_catalog(catalog.source, version="v1")
+
+    first = shared_catalog.load_or_publish("v1", build)
+    second = shared_catalog.load_or_publish("v1", build)
+
+    assert len(builds) == 1
+    assert first.shared_path == second.shared_path == shared_catalog.generation_path("v1")
+    assert shared_catalog.current_generation() == ("v1", first.shared_path)
+
+
+def test_mapped_catalog_pickles_as_its_path(shared_dir, catalog):
+    publish_versions(catalog.source, "v1")
+    mapped = shared_catalog.open_catalog(shared_catalog.generation_path("v1"))
+
+    restored = pickle.loads(pickle.dumps(mapped))
+
+    assert len(pickle.dumps(mapped)) < 1024
+    assert restored.shared_path == mapped.shared_path
+    assert list(restored.program_names) == list(catalog.program_names)
+
+
+def test_concurrent_loads_build_a_version_once(shared_dir, catalog):
+    builds = []
+
+    def build():
+        builds.append(threading.get_ident())
+        time.sleep(0.2)
+        return compile_catalog(catalog.source, version="v1")
+
+    loaded = []
+    workers = [
+        threading.Thread(target=lambda: loaded.append(shared_catalog.load_or_publish("v1", build)))
+        for _ in range(6)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert len(builds) == 1
+    assert len(loaded) == 6
+    assert {c.shared_path for c in loaded} == {shared_catalog.generation_path("v1")}
+    assert all(c.min_average == catalog.min_average for c in loaded)
+
+
+def test_prune_keeps_generations_that_are_still_mapped(shared_dir, catalog):
+    publish_versions(catalog.source, "v1")
+    mapped = shared_catalog.open_catalog(shared_catalog.generation_path("v1"))
+
+    publish_versions(catalog.source, "v2", "v3")
+    assert os.path.exists(shared_catalog.generation_path("v1"))
+    assert not os.path.exists(shared_catalog.generation_path("v2"))
+    assert list(mapped.program_names) == list(catalog.program_names)
+
+    del mapped
+    gc.collect()
+    publish_versions(catalog.source, "v4")
+    assert not os.path.exists(shared_catalog.generation_path("v1"))
+    assert os.path.exists(shared_catalog.generation_path("v4"))
+
+
+def test_cold_start_maps_the_current_generation(shared_dir, catalog, monkeypatch):
+    publish_versions(catalog.source, "v1", "v2")
+    monkeypatch.setattr(database, "CATALOG_SNAPSHOT_PATH", None)
+
+    started = database._cold_start_catalog(PyMongoError("unreachable"))
+
+    assert started.version == "v2"
+    assert started.shared_path == shared_catalog.generation_path("v2")
+
+    os.unlink(os.path.join(shared_dir, shared_catalog.POINTER_NAME))
+    with pytest.raises(PyMongoError):
+        database._cold_start_catalog(PyMongoError("unreachable"))
+
+
+@pytest.mark.parametrize("keep", [0, 8, 200, -64])
+def test_corrupt_generations_are_rejected_and_released(shared_dir, catalog, keep):
+    fcntl = pytest.importorskip("fcntl")
+    publish_versions(catalog.source, "v1")
+    path = shared_catalog.generation_path("v1")
+    with open(path, "r+b") as f:
+        f.truncate(keep if keep >= 0 else os.path.getsize(path) + keep)
+
+    with pytest.raises(ValueError):
+        shared_catalog.open_catalog(path)
+
+    # No shared lock was left behind, so the generation can still be pruned
+    with open(path, "rb") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def test_publish_survives_generations_vanishing_during_prune(shared_dir, catalog, monkeypatch):
+    publish_versions(catalog.source, "v1", "v2")
+    getmtime = os.path.getmtime
+
+    def racing_getmtime(path):
+        if path == shared_catalog.generation_path("v2") and os.path.exists(path):
+            os.unlink(path)  # Another worker prunes it between listdir and stat
+        return getmtime(path)
+
+    monkeypatch.setattr(os.path, "getmtime", racing_getmtime)
+    path = shared_catalog.publish(compile_catalog(catalog.source, version="v3"))
+
+    assert shared_catalog.current_generation() == ("v3", path)
@@ -0,0 +1,48 @@
+"""
+What-if sweeps: every point's scores and ranks equal re-ranking the profile
+with that grade and average.
+"""
+
+import pytest
+
+from services.matcher import UniversityMatcher
+from services.whatif import sweep_profile
+
+AVERAGES = [50, 63.5, 78.25, 87.35, 94, 100]
+GRADE_LEVELS = [9, 10, 11, 12]
+
+
+def fresh_ranking(profile, catalog, engine):
+    """
+    {(university, program): (score, rank)} from a full re-ranking.
+    """
+    rows = UniversityMatcher(profile, catalog=catalog, engine=engine).get_ranked_programs()
+    return {(row["university"], row["program"]): (row["score"], rank) for rank, row in enumerate(rows, start=1)}
+
+
+@pytest.mark.parametrize("engine", ["python", "numpy"])
+def test_sweep_points_equal_rescoring(catalog, profiles, engine):
+    if engine == "numpy":
+        pytest.importorskip("numpy")
+    for profile in profiles[:6]:
+        result = sweep_profile(profile, AVERAGES, GRADE_LEVELS, catalog=catalog, engine=engine)
+        assert result["total_programs"] == len(catalog)
+
+        base = fresh_ranking(profile, catalog, engine)
+        for program in result["programs"]:
+            assert (program["base_score"], program["base_rank"]) == base[(program["university"], program["program"])]
+
+        for j, point in enumerate(result["points"]):
+            expected = fresh_ranking(dict(profile, **point), catalog, engine)
+            actual = {
+                (program["university"], program["program"]): (program["scores"][j], program["ranks"][j])
+                for program in result["programs"]
+            }
+            assert actual == expected, point
+
+
+def test_sweep_limit_keeps_the_top_programs(catalog, profiles):
+    full = sweep_profile(profiles[5], AVERAGES, [12], catalog=catalog, engine="python")
+    top = sweep_profile(profiles[5], AVERAGES, [12], limit=10, catalog=catalog, engine="python")
+    assert top["programs"] == full["programs"][:10]
+    assert [program["base_rank"] for program in top["programs"]] == list(range(1, 11))